@@ -1,13 +1,42 @@
 
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routers import user, subscription, fund
+from app.routers import user, subscription, fund, notification, metrics, admin
 from fastapi.middleware.cors import CORSMiddleware
-from app.utils.database import connect_db
+from app.migrations.migrations import apply_migrations
+from app.services.announcement_service import (
+    start_announcements,
+    stop_announcements
+)
+from app.utils.notification.notification_factory import channel_registry
+from app.utils.notification.outbox import outbox_worker
+from app.utils.notification.smtp_pool import close_pools
+from app.utils.database import close_client, connect_db, get_client
+from app.utils.metrics import MetricsMiddleware
+from app.utils.query_accounting import QueryAccountingMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared database client once per process
+    get_client()
+    # Indexes and pending migrations; disable when a deploy step runs them
+    if os.getenv("APPLY_MIGRATIONS_ON_STARTUP", "true").lower() == "true":
+        await apply_migrations(connect_db())
+    # Notifications are sent from the outbox by a background worker
+    outbox_worker.start()
+    start_announcements()
+    yield
+    await stop_announcements()
+    await outbox_worker.stop()
+    channel_registry.shutdown()
+    close_pools()
+    await close_client()
 
-app = FastAPI()
 
-# Connect to the database
-connect_db()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 origins = ["*"]
@@ -19,11 +48,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(QueryAccountingMiddleware)
+# Outermost, so the time includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(fund.router)
 app.include_router(user.router)
 app.include_router(subscription.router)
+app.include_router(notification.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
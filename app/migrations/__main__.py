@@ -0,0 +1,55 @@
+# __main__.py
+"""Apply or inspect database migrations.
+
+Usage:
+    python -m app.migrations apply
+    python -m app.migrations status
+    python -m app.migrations check
+"""
+import argparse
+import asyncio
+import json
+
+from app.migrations.indexes import check_indexes
+from app.migrations.migrations import (
+    MigrationError,
+    apply_migrations,
+    migration_status
+)
+from app.utils.database import close_client, connect_db
+
+
+async def run(command: str):
+    db = connect_db()
+    try:
+        if command == "apply":
+            try:
+                applied = await apply_migrations(db)
+            except MigrationError as error:
+                print(f"Migrations stopped: {error}")
+                return 1
+            print(f"Applied migrations: {applied or 'none pending'}")
+        elif command == "status":
+            for migration in await migration_status(db):
+                print(
+                    f"{migration['version']:>4}  {migration['status']:<8}  "
+                    f"{migration['description']}"
+                )
+        elif command == "check":
+            report = await check_indexes(db)
+            print(json.dumps(report, indent=2))
+            return 1 if any(item["missing"] for item in report.values()) else 0
+        return 0
+    finally:
+        await close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["apply", "status", "check"])
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args.command)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# indexes.py
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.utils.constants import FundStatus
+
+# Indexes every collection must have. Each one matches a query shape used by
+# the services; keep the names stable, they are how check_indexes compares the
+# declared indexes with the ones present in the database.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="users_id_unique", unique=True),
+    ],
+    "funds": [
+        IndexModel([("id", ASCENDING)], name="funds_id_unique", unique=True),
+    ],
+    "subscriptions": [
+        IndexModel(
+            [("id", ASCENDING)], name="subscriptions_id_unique", unique=True
+        ),
+        # find({"user_id"}) and find({"user_id", "fund_id", "status"})
+        IndexModel(
+            [("user_id", ASCENDING), ("fund_id", ASCENDING), ("status", ASCENDING)],
+            name="subscriptions_user_fund_status"
+        ),
+        # At most one active subscription per user and fund; create_subscription
+        # relies on it instead of checking before the insert
+        IndexModel(
+            [("user_id", ASCENDING), ("fund_id", ASCENDING)],
+            name="subscriptions_user_fund_active_unique",
+            unique=True,
+            partialFilterExpression={"status": FundStatus.ACTIVE}
+        ),
+        # Keyset pages of find({"user_id"}) in _id order
+        IndexModel(
+            [("user_id", ASCENDING), ("_id", ASCENDING)],
+            name="subscriptions_user_id"
+        ),
+        # Announcement batches, find({"fund_id", "status", "_id": {"$gt"}})
+        IndexModel(
+            [("fund_id", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)],
+            name="subscriptions_fund_status_id"
+        ),
+    ],
+    "announcement_jobs": [
+        IndexModel(
+            [("id", ASCENDING)], name="announcement_jobs_id_unique", unique=True
+        ),
+    ],
+    "transaction_history": [
+        # find({"subscription_id": ...}, sort=[("timestamp", -1)])
+        IndexModel(
+            [("subscription_id", ASCENDING), ("timestamp", DESCENDING)],
+            name="transaction_history_subscription_timestamp"
+        ),
+    ],
+    # app/utils/notification/outbox.py
+    "notification_outbox": [
+        # Due entries, find({"status": {"$in": ...}, "next_attempt_at": {"$lte"}})
+        IndexModel(
+            [("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+            name="notification_outbox_status_due"
+        ),
+        # find({"claim_id"}) after a claim
+        IndexModel([("claim_id", ASCENDING)], name="notification_outbox_claim_id"),
+        # Sent entries are kept a week
+        IndexModel(
+            [("sent_at", ASCENDING)],
+            name="notification_outbox_sent_at_ttl",
+            expireAfterSeconds=7 * 24 * 3600
+        ),
+    ],
+    # Shared backend of app/utils/response_cache.py
+    "response_cache": [
+        # Entries are deleted once expired
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            name="response_cache_expires_at_ttl",
+            expireAfterSeconds=0
+        ),
+        # delete_many({"scopes": {"$in": ...}}) on invalidation
+        IndexModel([("scopes", ASCENDING)], name="response_cache_scopes"),
+    ],
+}
+
+
+def _normalize_key(key) -> list:
+    if isinstance(key, dict):
+        key = key.items()
+    return [(field, int(direction)) for field, direction in key]
+
+
+async def ensure_indexes(db, collections=None):
+    """_summary_
+    Create the declared indexes that do not exist yet. createIndexes is
+    idempotent, so this is safe to run on every startup and from every worker.
+    Args:
+        db (AsyncDatabase): the application database
+        collections (list): restrict to these collections, all by default
+    Returns:
+        dict: index names requested per collection
+    """
+    created = {}
+    for collection_name, indexes in INDEXES.items():
+        if collections and collection_name not in collections:
+            continue
+        created[collection_name] = await db[collection_name].create_indexes(indexes)
+    return created
+
+
+async def _index_usage(collection) -> dict:
+    try:
+        cursor = await collection.aggregate([{"$indexStats": {}}])
+        stats = await cursor.to_list(length=None)
+    except Exception:
+        # $indexStats needs a real server and the clusterMonitor role
+        return None
+    return {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+
+
+async def check_indexes(db) -> dict:
+    """_summary_
+    Compare the declared indexes with the ones present in the database.
+    Returns:
+        dict: per collection, the declared indexes that are ``missing``
+        (absent or with a different key), the ``undeclared`` ones present
+        in the database, and the ``unused`` ones with no recorded access
+        since the last restart (None when $indexStats is not available).
+    """
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        missing = [
+            index.document["name"]
+            for index in indexes
+            if index.document["name"] not in existing
+            or _normalize_key(existing[index.document["name"]]["key"])
+            != _normalize_key(index.document["key"])
+        ]
+        declared = {index.document["name"] for index in indexes}
+        undeclared = sorted(
+            name for name in existing if name != "_id_" and name not in declared
+        )
+        usage = await _index_usage(collection)
+        unused = None
+        if usage is not None:
+            unused = sorted(
+                name for name, ops in usage.items() if name != "_id_" and ops == 0
+            )
+        report[collection_name] = {
+            "missing": missing,
+            "undeclared": undeclared,
+            "unused": unused,
+        }
+    return report
@@ -0,0 +1,274 @@
+# migrations.py
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.migrations.indexes import ensure_indexes
+from app.utils.constants import FundStatus
+
+# Collection recording which migration versions have been applied
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+# A "running" record older than this belongs to an instance that died while
+# applying it, and is taken over by the next one
+MIGRATION_LEASE_SECONDS = float(os.getenv("MIGRATION_LEASE_SECONDS", "600"))
+
+# How long an instance waits for a version another one is applying before
+# giving up, and how often it checks
+MIGRATION_WAIT_SECONDS = float(os.getenv("MIGRATION_WAIT_SECONDS", "120"))
+MIGRATION_POLL_SECONDS = 1.0
+
+# Duplicates listed in the error raised before the unique active index
+DUPLICATES_REPORTED = 10
+
+# Updates sent per bulk_write by the backfills
+BACKFILL_BATCH_SIZE = 1000
+
+
+class MigrationError(Exception):
+    """A migration cannot be applied; the message says why and what to do."""
+
+
+class Migration:
+    """_summary_
+    A versioned, one-off change to the database: index changes the registry
+    cannot express on its own (drops, renames) or data backfills.
+    Args:
+        version (int): strictly increasing version number
+        description (str): what the migration does
+        apply (callable): coroutine function receiving the database
+    """
+    def __init__(self, version: int, description: str, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+async def check_duplicate_active_subscriptions(db):
+    """_summary_
+    Look for users with more than one active subscription to the same fund,
+    which subscriptions_user_fund_active_unique cannot be built over. Once
+    the index exists no new duplicates can be written, so the check is
+    skipped.
+    Args:
+        db (AsyncDatabase): the application database
+    Raises:
+        MigrationError: listing the duplicated (user_id, fund_id) pairs
+    """
+    existing = await db.subscriptions.index_information()
+    if "subscriptions_user_fund_active_unique" in existing:
+        return
+    cursor = await db.subscriptions.aggregate([
+        {"$match": {"status": FundStatus.ACTIVE}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "fund_id": "$fund_id"},
+            "ids": {"$push": "$id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"_id.user_id": 1, "_id.fund_id": 1}}
+    ], allowDiskUse=True)
+    duplicates = await cursor.to_list(length=None)
+    if not duplicates:
+        return
+    listed = "; ".join(
+        f"user {item['_id']['user_id']} / fund {item['_id']['fund_id']}: "
+        f"subscriptions {', '.join(str(id) for id in item['ids'])}"
+        for item in duplicates[:DUPLICATES_REPORTED]
+    )
+    more = len(duplicates) - DUPLICATES_REPORTED
+    if more > 0:
+        listed += f"; and {more} more"
+    raise MigrationError(
+        f"{len(duplicates)} users hold more than one active subscription to "
+        f"the same fund ({listed}). Cancel the extra subscriptions before "
+        "creating the subscriptions_user_fund_active_unique index, then run "
+        "python -m app.migrations apply again."
+    )
+
+
+async def _ensure_indexes(db):
+    await check_duplicate_active_subscriptions(db)
+    await ensure_indexes(db)
+
+
+async def _create_initial_indexes(db):
+    await _ensure_indexes(db)
+
+
+async def _backfill_last_transaction(db):
+    """_summary_
+    Copy the latest transaction of every subscription to its
+    last_transaction_at and last_action fields, leaving alone the
+    subscriptions that already have them.
+    """
+    cursor = await db.transaction_history.aggregate([
+        {"$sort": {"subscription_id": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": "$subscription_id",
+            "timestamp": {"$first": "$timestamp"},
+            "action": {"$first": "$action"}
+        }}
+    ], allowDiskUse=True)
+    updates = []
+    async for latest in cursor:
+        updates.append(UpdateOne(
+            {"id": latest["_id"], "last_transaction_at": {"$exists": False}},
+            {"$set": {
+                "last_transaction_at": latest["timestamp"],
+                "last_action": latest["action"]
+            }}
+        ))
+        if len(updates) >= BACKFILL_BATCH_SIZE:
+            await db.subscriptions.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.subscriptions.bulk_write(updates, ordered=False)
+
+
+async def _unset_empty_pending_debits(db):
+    """_summary_
+    Remove the empty pending_debits arrays that bulk debits used to leave on
+    the users they touched.
+    """
+    await db.users.update_many(
+        {"pending_debits": {"$size": 0}}, {"$unset": {"pending_debits": ""}}
+    )
+
+
+# Append new migrations at the end with the next version number
+MIGRATIONS = [
+    Migration(1, "Create the initial index set", _create_initial_indexes),
+    Migration(
+        2,
+        "Backfill last_transaction_at and last_action on subscriptions",
+        _backfill_last_transaction
+    ),
+    Migration(
+        3,
+        "Remove empty pending_debits arrays from users",
+        _unset_empty_pending_debits
+    ),
+]
+
+
+async def applied_versions(db) -> dict:
+    cursor = db[MIGRATIONS_COLLECTION].find({})
+    return {record["_id"]: record async for record in cursor}
+
+
+async def _claim(db, migration: Migration, lease: float) -> bool:
+    """_summary_
+    Claim a version for this instance by inserting its "running" record, or
+    by taking over a "running" record whose lease has expired.
+    Returns:
+        bool: True when this instance now holds the version
+    """
+    now = datetime.utcnow()
+    try:
+        await db[MIGRATIONS_COLLECTION].insert_one({
+            "_id": migration.version,
+            "description": migration.description,
+            "status": "running",
+            "started_at": now
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+    retaken = await db[MIGRATIONS_COLLECTION].find_one_and_update(
+        {
+            "_id": migration.version,
+            "status": "running",
+            "started_at": {"$lte": now - timedelta(seconds=lease)}
+        },
+        {"$set": {"started_at": now, "retaken_at": now}}
+    )
+    return retaken is not None
+
+
+async def _wait_for_claim(db, migration: Migration, wait: float, lease: float):
+    """_summary_
+    Claim a version, waiting while another instance applies it.
+    Returns:
+        bool: True when this instance holds the version, False when another
+        one applied it in the meantime
+    Raises:
+        MigrationError: the version is still running elsewhere after the wait
+    """
+    deadline = time.monotonic() + wait
+    while not await _claim(db, migration, lease):
+        record = await db[MIGRATIONS_COLLECTION].find_one({"_id": migration.version})
+        if record is not None and record.get("status") == "applied":
+            return False
+        if time.monotonic() >= deadline:
+            started_at = record.get("started_at") if record else None
+            raise MigrationError(
+                f"Migration {migration.version} is being applied by another "
+                f"instance since {started_at}; later migrations are not applied "
+                "before it finishes. Retry once it is applied, or after its "
+                f"claim expires ({lease:g}s, MIGRATION_LEASE_SECONDS)."
+            )
+        await asyncio.sleep(MIGRATION_POLL_SECONDS)
+    return True
+
+
+async def apply_migrations(db, wait: float = None, lease: float = None) -> list:
+    """_summary_
+    Run the pending migrations in version order, then create any declared
+    index that is still missing.
+    Each version is claimed by inserting its record before running it, so
+    several workers starting at the same time apply it only once. A version
+    claimed by another instance is waited for: later versions never run
+    before an earlier one is applied. A claim older than the lease belongs
+    to an instance that died and is taken over.
+    Args:
+        db (AsyncDatabase): the application database
+        wait (float): seconds to wait for a version another instance is
+            applying, MIGRATION_WAIT_SECONDS by default
+        lease (float): age after which a "running" claim is taken over,
+            MIGRATION_LEASE_SECONDS by default
+    Returns:
+        list: versions applied by this call
+    Raises:
+        MigrationError: a version is still running elsewhere after the wait,
+            or active subscriptions block the unique index
+    """
+    wait = MIGRATION_WAIT_SECONDS if wait is None else wait
+    lease = MIGRATION_LEASE_SECONDS if lease is None else lease
+    applied = []
+    done = await applied_versions(db)
+    for migration in sorted(MIGRATIONS, key=lambda item: item.version):
+        if done.get(migration.version, {}).get("status") == "applied":
+            continue
+        if not await _wait_for_claim(db, migration, wait, lease):
+            # Another instance applied it while this one waited
+            continue
+        try:
+            await migration.apply(db)
+        except Exception:
+            await db[MIGRATIONS_COLLECTION].delete_one({"_id": migration.version})
+            raise
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": migration.version},
+            {"$set": {"status": "applied", "applied_at": datetime.utcnow()}}
+        )
+        applied.append(migration.version)
+
+    await _ensure_indexes(db)
+    return applied
+
+
+async def migration_status(db) -> list:
+    done = await applied_versions(db)
+    return [
+        {
+            "version": migration.version,
+            "description": migration.description,
+            "status": done.get(migration.version, {}).get("status", "pending")
+        }
+        for migration in sorted(MIGRATIONS, key=lambda item: item.version)
+    ]
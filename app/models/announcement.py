@@ -0,0 +1,7 @@
+# announcement.py
+from pydantic import BaseModel
+
+
+class Announcement(BaseModel):
+    subject: str
+    body: str
@@ -8,3 +8,4 @@ class User(BaseModel):
     email: str
     investment_capital: float = None  # Field to store Colombian pesos
     phone_number: str = None
+    locale: str = None  # Language of the notifications, "es" when not set
@@ -0,0 +1,73 @@
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.models.fund import Fund
+from app.repositories.fund_repository import FundRepository
+from app.repositories.mongo_fund_repository import MongoFundRepository
+from app.utils.cache import TTLCache
+from app.utils.etag import compute_etag
+from app.utils.pagination import DEFAULT_PAGE_SIZE
+
+FUND_CACHE_TTL_SECONDS = float(os.getenv("FUND_CACHE_TTL_SECONDS", "60"))
+FUND_CACHE_MAX_SIZE = int(os.getenv("FUND_CACHE_MAX_SIZE", "1000"))
+
+# Fund catalog shared by the fund routes and the subscription service.
+# Keys are ("fund", fund_id) for single funds, with ``_id`` as a string, and
+# ("page", limit, after) for pages of GET /funds/.
+fund_cache = TTLCache(max_size=FUND_CACHE_MAX_SIZE, ttl=FUND_CACHE_TTL_SECONDS)
+
+
+def fund_key(fund_id: str) -> tuple:
+    return ("fund", fund_id)
+
+
+def page_key(limit: int, after: Optional[str]) -> tuple:
+    return ("page", limit, after)
+
+
+class CachedFundRepository(FundRepository):
+    """_summary_
+    Read-through cache in front of another fund repository. Funds are
+    created through it, so every write clears the cached pages; an update
+    made outside the application is picked up when the entries expire.
+    Args:
+        repository (FundRepository): repository holding the funds
+        cache (TTLCache): cache to use, the shared fund_cache by default
+    """
+
+    def __init__(self, repository: FundRepository, cache: TTLCache = fund_cache):
+        self.repository = repository
+        self.cache = cache
+
+    async def create_fund(self, fund: Fund) -> str:
+        fund_id = await self.repository.create_fund(fund)
+        self.cache.clear()
+        return fund_id
+
+    async def get_fund(self, fund_id: str) -> Dict:
+        return await self.cache.get_or_load(
+            fund_key(fund_id), lambda: self.repository.get_fund(fund_id)
+        )
+
+    async def list_funds(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None
+    ) -> List[Dict]:
+        return await self.cache.get_or_load(
+            page_key(limit, after),
+            lambda: self.repository.list_funds(limit=limit, after=after)
+        )
+
+    def fund_etag(self, fund_id: str) -> Optional[str]:
+        return self.cache.tag(fund_key(fund_id), compute_etag)
+
+    def page_etag(self, limit: int, after: Optional[str]) -> Optional[str]:
+        return self.cache.tag(page_key(limit, after), compute_etag)
+
+    def iter_funds(self) -> AsyncIterator[Dict]:
+        # Full exports stream from the database, they would flood the cache
+        return self.repository.iter_funds()
+
+
+fund_repository = CachedFundRepository(MongoFundRepository())
@@ -0,0 +1,76 @@
+import os
+from typing import Dict, Iterable, Optional, Set
+
+from app.repositories.mongo_user_repository import (
+    VERSION_FIELD,
+    MongoUserRepository
+)
+from app.repositories.user_repository import UserRepository
+from app.utils.cache import TTLCache
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# Users keyed by id, with ``_id`` as a string
+user_cache = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+class CachedUserRepository(UserRepository):
+    """_summary_
+    Read-through LRU cache in front of another user repository.
+    Capital changes stay conditional updates in the database, so a cached
+    copy is never what authorizes a debit. Single-user writes put the updated
+    user back in the cache, and an entry is only replaced by a copy with an
+    equal or higher version. When writes finish out of order, the older copy
+    never wins. Bulk writes, which do not return the users, evict them.
+    Args:
+        repository (UserRepository): repository holding the users
+        cache (TTLCache): cache to use, the shared user_cache by default
+    """
+
+    def __init__(self, repository: UserRepository, cache: TTLCache = user_cache):
+        self.repository = repository
+        self.cache = cache
+
+    @staticmethod
+    def _version(user: Dict) -> int:
+        return user.get(VERSION_FIELD, 0)
+
+    def _store(self, user: Optional[Dict]) -> Optional[Dict]:
+        if user:
+            self.cache.set(user["id"], user, version=self._version(user))
+        return user
+
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        return await self.cache.get_or_load(
+            user_id, lambda: self.repository.get_user(user_id), self._version
+        )
+
+    async def debit_capital(self, user_id: str, amount: float) -> Optional[Dict]:
+        user = await self.repository.debit_capital(user_id, amount)
+        if not user:
+            # Missing or short of capital: whatever is cached is out of date
+            self.cache.delete(user_id)
+        return self._store(user)
+
+    async def credit_capital(self, user_id: str, amount: float) -> Optional[Dict]:
+        return self._store(await self.repository.credit_capital(user_id, amount))
+
+    async def debit_capital_many(self, debits: Dict[str, float]) -> Set[str]:
+        try:
+            return await self.repository.debit_capital_many(debits)
+        finally:
+            self.invalidate(debits)
+
+    async def credit_capital_many(self, credits: Dict[str, float]):
+        try:
+            await self.repository.credit_capital_many(credits)
+        finally:
+            self.invalidate(credits)
+
+    def invalidate(self, user_ids: Iterable[str]):
+        for user_id in user_ids:
+            self.cache.delete(user_id)
+
+
+user_repository = CachedUserRepository(MongoUserRepository())
@@ -1,17 +1,34 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 from app.models.fund import Fund
+from app.utils.pagination import DEFAULT_PAGE_SIZE
 
 
 class FundRepository(ABC):
     @abstractmethod
-    def create_fund(self, fund: Fund) -> str:
+    async def create_fund(self, fund: Fund) -> str:
         pass
 
     @abstractmethod
-    def get_fund(self, fund_id: str) -> Dict:
+    async def get_fund(self, fund_id: str) -> Dict:
         pass
 
     @abstractmethod
-    def list_funds(self) -> List[Dict]:
+    async def list_funds(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None
+    ) -> List[Dict]:
         pass
+
+    @abstractmethod
+    def iter_funds(self) -> AsyncIterator[Dict]:
+        pass
+
+    def fund_etag(self, fund_id: str) -> Optional[str]:
+        """ETag of the fund if known without reading it, None by default."""
+        return None
+
+    def page_etag(self, limit: int, after: Optional[str]) -> Optional[str]:
+        """ETag of the page if known without reading it, None by default."""
+        return None
@@ -1,22 +1,24 @@
 import uuid
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 from app.utils.constants import DataBaseError
-from app.utils.database import connect_db
+from app.utils.database import shared_db
 from app.models.fund import Fund
 from pymongo.errors import PyMongoError
 from fastapi import HTTPException
 from app.repositories.fund_repository import FundRepository
+from app.utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from app.utils.streaming import STREAM_BATCH_SIZE
 
-db = connect_db()
+db = shared_db()
 
 
 class MongoFundRepository(FundRepository):
-    def create_fund(self, fund: Fund) -> str:
+    async def create_fund(self, fund: Fund) -> str:
         try:
             fund_id = str(uuid.uuid4())
             fund_dict = fund.dict()
             fund_dict["id"] = fund_id
-            db.funds.insert_one(fund_dict)
+            await db.funds.insert_one(fund_dict)
             return fund_id
         except PyMongoError:
             raise HTTPException(
@@ -29,9 +31,9 @@ class MongoFundRepository(FundRepository):
                 detail="An unexpected error occurred: " + str(e)
             )
 
-    def get_fund(self, fund_id: str) -> Dict:
+    async def get_fund(self, fund_id: str) -> Dict:
         try:
-            fund = db.funds.find_one({"id": fund_id})
+            fund = await db.funds.find_one({"id": fund_id})
             if not fund:
                 raise HTTPException(status_code=404, detail="Fund not found")
             fund["_id"] = str(fund["_id"])  # Convert ObjectId to string
@@ -42,9 +44,13 @@ class MongoFundRepository(FundRepository):
                 detail=DataBaseError.ERROR_DB_CONNECTION
             )
 
-    def list_funds(self) -> List[Dict]:
+    async def list_funds(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None
+    ) -> List[Dict]:
         try:
-            funds = list(db.funds.find())
+            funds = await fetch_page(db.funds, limit=limit, after=after)
             for fund in funds:
                 fund["_id"] = str(fund["_id"])  # Convert ObjectId to string
             return funds
@@ -53,3 +59,9 @@ class MongoFundRepository(FundRepository):
                 status_code=500,
                 detail=DataBaseError.ERROR_DB_CONNECTION
             )
+
+    async def iter_funds(self) -> AsyncIterator[Dict]:
+        cursor = db.funds.find().sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+        async for fund in cursor:
+            fund["_id"] = str(fund["_id"])  # Convert ObjectId to string
+            yield fund
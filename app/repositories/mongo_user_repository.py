@@ -0,0 +1,118 @@
+import uuid
+from typing import Dict, Optional, Set
+
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+
+from app.repositories.user_repository import UserRepository
+from app.utils.database import shared_db
+
+db = shared_db()
+
+# Bulk debits not settled yet, tagged with the id of their batch
+PENDING_DEBITS_FIELD = "pending_debits"
+
+# Incremented by every change of investment_capital; caches use it to never
+# replace a user with an older copy
+VERSION_FIELD = "version"
+
+# Bookkeeping kept on the user documents, never returned by the API
+INTERNAL_FIELDS = (PENDING_DEBITS_FIELD, VERSION_FIELD)
+# Projection of the users shown to clients, in listings and joins
+PUBLIC_USER_PROJECTION = {field: 0 for field in INTERNAL_FIELDS}
+
+
+def _stringify_id(user: Optional[Dict]) -> Optional[Dict]:
+    if user and "_id" in user:
+        user["_id"] = str(user["_id"])
+    return user
+
+
+def public_user(user: Optional[Dict]) -> Optional[Dict]:
+    """_summary_
+    Copy of a user read with its bookkeeping fields, as shown to clients.
+    """
+    if not user:
+        return user
+    return {key: value for key, value in user.items() if key not in INTERNAL_FIELDS}
+
+
+class MongoUserRepository(UserRepository):
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        return _stringify_id(await db.users.find_one({"id": user_id}))
+
+    async def debit_capital(self, user_id: str, amount: float) -> Optional[Dict]:
+        """_summary_
+        Debit amount if the user has that much capital, checking and writing
+        in one conditional update so concurrent debits cannot overspend.
+        Returns:
+            dict: the user after the debit, None if the user does not exist or
+                has not enough capital
+        """
+        return _stringify_id(await db.users.find_one_and_update(
+            {"id": user_id, "investment_capital": {"$gte": amount}},
+            {"$inc": {"investment_capital": -amount, VERSION_FIELD: 1}},
+            return_document=ReturnDocument.AFTER
+        ))
+
+    async def credit_capital(self, user_id: str, amount: float) -> Optional[Dict]:
+        return _stringify_id(await db.users.find_one_and_update(
+            {"id": user_id},
+            {"$inc": {"investment_capital": amount, VERSION_FIELD: 1}},
+            return_document=ReturnDocument.AFTER
+        ))
+
+    async def debit_capital_many(self, debits: Dict[str, float]) -> Set[str]:
+        """_summary_
+        Debit several users in one bulk_write. Each debit is guarded by the
+        balance, as in debit_capital, and tags the user with the batch so
+        that, when some guard fails, the users actually debited can be told
+        apart.
+        Args:
+            debits (dict): amount to debit keyed by user id
+        Returns:
+            set: ids of the users debited
+        """
+        if not debits:
+            return set()
+        batch_id = str(uuid.uuid4())
+        result = await db.users.bulk_write([
+            UpdateOne(
+                {"id": user_id, "investment_capital": {"$gte": amount}},
+                {
+                    "$inc": {"investment_capital": -amount, VERSION_FIELD: 1},
+                    "$addToSet": {PENDING_DEBITS_FIELD: batch_id}
+                }
+            )
+            for user_id, amount in debits.items()
+        ], ordered=False)
+        debited = set(debits)
+        if result.matched_count < len(debits):
+            debited = {
+                user["id"] async for user in db.users.find(
+                    {"id": {"$in": list(debits)}, PENDING_DEBITS_FIELD: batch_id},
+                    {"id": 1}
+                )
+            }
+        # Untag the batch and drop the field once no batch is pending, in one
+        # ordered round trip, so users do not keep an empty array
+        await db.users.bulk_write([
+            UpdateMany(
+                {"id": {"$in": list(debits)}},
+                {"$pull": {PENDING_DEBITS_FIELD: batch_id}}
+            ),
+            UpdateMany(
+                {"id": {"$in": list(debits)}, PENDING_DEBITS_FIELD: {"$size": 0}},
+                {"$unset": {PENDING_DEBITS_FIELD: ""}}
+            ),
+        ])
+        return debited
+
+    async def credit_capital_many(self, credits: Dict[str, float]):
+        if credits:
+            await db.users.bulk_write([
+                UpdateOne(
+                    {"id": user_id},
+                    {"$inc": {"investment_capital": amount, VERSION_FIELD: 1}}
+                )
+                for user_id, amount in credits.items()
+            ], ordered=False)
@@ -0,0 +1,27 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional, Set
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    async def debit_capital(self, user_id: str, amount: float) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    async def credit_capital(self, user_id: str, amount: float) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    async def debit_capital_many(self, debits: Dict[str, float]) -> Set[str]:
+        pass
+
+    @abstractmethod
+    async def credit_capital_many(self, credits: Dict[str, float]):
+        pass
+
+    def invalidate(self, user_ids: Iterable[str]):
+        """Forget what is known about these users, nothing to do by default."""
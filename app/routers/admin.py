@@ -0,0 +1,56 @@
+# admin.py
+"""Operational endpoints, off unless ADMIN_TOKEN is set.
+
+Every request must then carry ``Authorization: Bearer <ADMIN_TOKEN>``;
+without the setting the routes answer 404, as if they did not exist.
+"""
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from app.utils.constants import AdminError
+from app.utils.slow_queries import slow_query_log
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """_summary_
+    Let the request through only with the configured admin token.
+    Raises:
+        HTTPException: 404 when no ADMIN_TOKEN is configured, 401 when the
+        token is missing or wrong
+    """
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail=AdminError.ERROR_ADMIN_DISABLED)
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        credentials.encode(), token.encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail=AdminError.ERROR_INVALID_ADMIN_TOKEN,
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/admin/slow-queries")
+async def slow_queries_endpoint(
+    collscan: Optional[bool] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "sample_rate": slow_query_log.sample_rate,
+        "recorded": slow_query_log.recorded,
+        "entries": slow_query_log.list(collscan=collscan, limit=limit),
+    }
+
+
+@router.delete("/admin/slow-queries", status_code=204)
+async def clear_slow_queries_endpoint():
+    slow_query_log.clear()
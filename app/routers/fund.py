@@ -1,27 +1,84 @@
 # fund_router.py
-from fastapi import APIRouter
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Query, Request, Response
+from app.models.announcement import Announcement
 from app.models.fund import Fund
-from app.repositories.mongo_fund_repository import MongoFundRepository
+from app.repositories.cached_fund_repository import fund_repository
+from app.services.announcement_service import (
+    get_announcement,
+    start_announcement
+)
 from app.services.fund_service import FundService
+from app.utils.pagination import (
+    MAX_PAGE_SIZE,
+    page_request,
+    set_pagination_headers
+)
+from app.utils.etag import conditional_get
+from app.utils.streaming import stream_documents, stream_format
 
 router = APIRouter()
 
 
-# Create an instance of the repository and the service
-repository = MongoFundRepository()
-fund_service = FundService(repository=repository)
+# Create an instance of the service over the cached fund catalog
+fund_service = FundService(repository=fund_repository)
+
+# Clients may keep funds but must revalidate them with their ETag
+FUNDS_CACHE_CONTROL = os.getenv("FUNDS_CACHE_CONTROL", "no-cache")
 
 
 @router.post("/funds/")
-def create_fund_endpoint(fund: Fund):
-    return fund_service.create_fund(fund)
+async def create_fund_endpoint(fund: Fund):
+    return await fund_service.create_fund(fund)
 
 
 @router.get("/funds/{fund_id}")
-def get_fund_endpoint(fund_id: str):
-    return fund_service.get_fund(fund_id)
+async def get_fund_endpoint(fund_id: str, request: Request, response: Response):
+    return await conditional_get(
+        request,
+        response,
+        lambda: fund_service.fund_etag(fund_id),
+        lambda: fund_service.get_fund(fund_id),
+        FUNDS_CACHE_CONTROL
+    )
 
 
 @router.get("/funds/")
-def list_funds_endpoint():
-    return fund_service.list_funds()
+async def list_funds_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    media_type = stream_format(request)
+    if media_type:
+        return stream_documents(fund_service.iter_funds(), media_type)
+
+    # The catalog is small: without paging parameters the whole of it is one
+    # cached page, with its ETag
+    _, limit = page_request(limit, after)
+
+    async def load():
+        funds = await fund_service.list_funds(limit=limit, after=after)
+        set_pagination_headers(request, response, funds)
+        return funds
+
+    return await conditional_get(
+        request,
+        response,
+        lambda: fund_service.page_etag(limit, after),
+        load,
+        FUNDS_CACHE_CONTROL
+    )
+
+
+@router.post("/funds/{fund_id}/announcements", status_code=202)
+async def start_announcement_endpoint(fund_id: str, announcement: Announcement):
+    return await start_announcement(fund_id, announcement)
+
+
+@router.get("/funds/announcements/{job_id}")
+async def get_announcement_endpoint(job_id: str):
+    return await get_announcement(job_id)
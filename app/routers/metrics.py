@@ -0,0 +1,13 @@
+# metrics.py
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.utils.metrics import registry, update_threadpool_gauges
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    update_threadpool_gauges()
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,29 @@
+# notification.py
+from fastapi import APIRouter, Depends, Query
+
+from app.routers.admin import require_admin
+from app.utils.notification.dispatcher import notification_dispatcher
+from app.utils.notification.outbox import outbox_worker
+
+# Dead letters carry recipients and subjects: same access as the admin routes
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/notifications/metrics")
+async def notification_metrics_endpoint():
+    return {
+        **notification_dispatcher.stats(),
+        "outbox": await outbox_worker.stats(),
+    }
+
+
+@router.get("/notifications/dead-letters")
+async def notification_dead_letters_endpoint(
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return await outbox_worker.failed_entries(limit)
+
+
+@router.get("/notifications/outbox")
+async def notification_outbox_endpoint():
+    return await outbox_worker.stats()
@@ -1,40 +1,87 @@
 # subscription.py
-from fastapi import APIRouter
+from typing import List, Optional
+
+from fastapi import APIRouter, Query, Request, Response
 from app.models.subscription import Subscription
 from app.services.subscription_service import (
     create_subscription,
+    create_subscriptions_bulk,
     cancel_subscription,
+    cancel_subscriptions_bulk,
     list_subscriptions_by_user,
     list_subscriptions_with_users,
-    get_user_transactions
+    get_user_transactions,
+    iter_subscriptions_with_users
+)
+from app.utils.pagination import (
+    MAX_PAGE_SIZE,
+    page_request,
+    set_pagination_headers
 )
+from app.utils.streaming import JSON_MEDIA_TYPE, stream_documents, stream_format
 
 router = APIRouter()
 
 
 @router.post("/subscriptions/")
-def create_subscription_endpoint(subscription: Subscription):
-    return create_subscription(subscription)
+async def create_subscription_endpoint(subscription: Subscription):
+    return await create_subscription(subscription)
+
+
+@router.post("/subscriptions/bulk")
+async def create_subscriptions_bulk_endpoint(subscriptions: List[Subscription]):
+    return await create_subscriptions_bulk(subscriptions)
+
+
+# Declared before /subscriptions/cancel/{subscription_id}, which would match it
+@router.post("/subscriptions/cancel/bulk")
+async def cancel_subscriptions_bulk_endpoint(subscription_ids: List[str]):
+    return await cancel_subscriptions_bulk(subscription_ids)
 
 
 @router.post("/subscriptions/cancel/{subscription_id}")
-def cancel_subscription_endpoint(subscription_id: str):
-    return cancel_subscription(subscription_id)
+async def cancel_subscription_endpoint(subscription_id: str):
+    return await cancel_subscription(subscription_id)
 
 
 @router.get("/subscriptions/")
-def list_subscriptions_with_users_endpoint():
-    return list_subscriptions_with_users()
+async def list_subscriptions_with_users_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    paginated, limit = page_request(limit, after)
+    media_type = stream_format(request) or (
+        None if paginated else JSON_MEDIA_TYPE
+    )
+    if media_type:
+        return stream_documents(iter_subscriptions_with_users(), media_type)
+
+    subscriptions = await list_subscriptions_with_users(limit=limit, after=after)
+    set_pagination_headers(request, response, subscriptions)
+    return subscriptions
 
 
 @router.get("/subscriptions/{user_id}/transactions")
-def get_user_transactions_endpoint(user_id: str):
-    return get_user_transactions(user_id)
+async def get_user_transactions_endpoint(user_id: str):
+    return await get_user_transactions(user_id)
 
 
 @router.get("/subscriptions/user/{user_id}")
-def get_subscriptions_by_user(user_id: str):
-    subscriptions = list_subscriptions_by_user(user_id)
+async def get_subscriptions_by_user(
+    user_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    # A user's subscriptions are few: without paging parameters, all of them
+    _, limit = page_request(limit, after)
+    subscriptions = await list_subscriptions_by_user(
+        user_id, limit=limit, after=after
+    )
+    set_pagination_headers(request, response, subscriptions)
     # if not subscriptions:
     #     raise HTTPException(
     # status_code=404, detail="No subscriptions found for this user")
@@ -1,16 +1,38 @@
 # user.py
-from fastapi import APIRouter
+from typing import Optional
+
+from fastapi import APIRouter, Query, Request, Response
 from app.models.user import User
-from app.services.user_service import create_user, get_all_users
+from app.services.user_service import create_user, get_all_users, iter_users
+from app.utils.pagination import (
+    MAX_PAGE_SIZE,
+    page_request,
+    set_pagination_headers
+)
+from app.utils.streaming import JSON_MEDIA_TYPE, stream_documents, stream_format
 
 router = APIRouter()
 
 
 @router.post("/users/")
-def create_user_endpoint(user: User):
-    return create_user(user)
+async def create_user_endpoint(user: User):
+    return await create_user(user)
 
 
 @router.get("/users/")
-def get_all_users_endpoint():
-    return get_all_users()
+async def get_all_users_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    paginated, limit = page_request(limit, after)
+    media_type = stream_format(request) or (
+        None if paginated else JSON_MEDIA_TYPE
+    )
+    if media_type:
+        return stream_documents(iter_users(), media_type)
+
+    users = await get_all_users(limit=limit, after=after)
+    set_pagination_headers(request, response, users)
+    return users
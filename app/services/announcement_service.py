@@ -0,0 +1,353 @@
+# announcement_service.py
+"""Announcements sent to every active subscriber of a fund.
+
+An announcement is a job in the ``announcement_jobs`` collection, run in the
+background. The subscribers are read in ``_id`` order, ANNOUNCEMENT_BATCH_SIZE
+at a time, each batch joined to its users with one $in query and sent
+through app/utils/notification/fanout.py. After every batch the job records
+the last ``_id`` sent as its checkpoint, so memory stays bounded by a batch
+and a job interrupted by a restart resumes after its last checkpoint.
+Messages of the batch in flight when a process dies are sent again.
+
+A job is held under a lease renewed at every checkpoint and owned by the
+run that claimed it: a run whose lease was taken over stops at its next
+checkpoint instead of moving another run's. A failed batch is retried in
+process with a backoff, up to ANNOUNCEMENT_MAX_ATTEMPTS times; jobs whose
+lease ran out (their process died or gave up) are resumed at startup and
+then every ANNOUNCEMENT_RESUME_INTERVAL_SECONDS.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from jinja2 import TemplateError
+from pymongo import ReturnDocument
+
+from app.models.announcement import Announcement
+from app.utils.batch_join import fetch_by_keys
+from app.utils.constants import (
+    AnnouncementError,
+    AnnouncementStatus,
+    FundStatus,
+    NotificationEvent,
+    SubscriptionNotificationChannel
+)
+from app.utils.database import shared_db
+from app.utils.notification.fanout import FanoutSender, create_fanout_sender
+from app.utils.notification.templates import notification_templates
+
+db = shared_db()
+
+ANNOUNCEMENT_BATCH_SIZE = int(os.getenv("ANNOUNCEMENT_BATCH_SIZE", "500"))
+ANNOUNCEMENT_LEASE_SECONDS = float(os.getenv("ANNOUNCEMENT_LEASE_SECONDS", "300"))
+ANNOUNCEMENT_MAX_ATTEMPTS = int(os.getenv("ANNOUNCEMENT_MAX_ATTEMPTS", "5"))
+# Delay before the first retry of a failed batch, doubled each time
+ANNOUNCEMENT_RETRY_DELAY_SECONDS = float(
+    os.getenv("ANNOUNCEMENT_RETRY_DELAY_SECONDS", "2")
+)
+ANNOUNCEMENT_RESUME_INTERVAL_SECONDS = float(
+    os.getenv("ANNOUNCEMENT_RESUME_INTERVAL_SECONDS", "60")
+)
+
+logger = logging.getLogger(__name__)
+
+# Jobs running in this process
+_tasks = set()
+# Periodic resume of the jobs whose lease ran out
+_resume_task = None
+
+
+def _public(job: dict) -> dict:
+    job = dict(job)
+    job.pop("_id", None)
+    job.pop("lease_owner", None)
+    if job.get("checkpoint") is not None:
+        job["checkpoint"] = str(job["checkpoint"])
+    return job
+
+
+def _schedule(job_id: str):
+    task = asyncio.create_task(run_announcement(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def start_announcement(fund_id: str, announcement: Announcement) -> dict:
+    """_summary_
+    Create an announcement job for a fund and start it in the background.
+    Raises:
+        HTTPException: 404 when the fund does not exist
+    Returns:
+        dict: the job, with its id to follow the progress
+    """
+    if not await db.funds.find_one({"id": fund_id}, {"_id": 1}):
+        raise HTTPException(
+            status_code=404, detail=AnnouncementError.ERROR_FUND_DOES_NOT_EXIST
+        )
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "fund_id": fund_id,
+        "subject": announcement.subject,
+        "body": announcement.body,
+        "status": AnnouncementStatus.RUNNING,
+        "checkpoint": None,
+        "sent": 0,
+        "failed": 0,
+        "skipped": 0,
+        "created_at": now,
+        "updated_at": now,
+        "locked_until": None,
+        "lease_owner": None,
+    }
+    await db.announcement_jobs.insert_one(job)
+    _schedule(job["id"])
+    return _public(job)
+
+
+async def get_announcement(job_id: str) -> dict:
+    job = await db.announcement_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=AnnouncementError.ERROR_ANNOUNCEMENT_DOES_NOT_EXIST
+        )
+    return _public(job)
+
+
+async def _claim(job_id: str) -> Optional[dict]:
+    now = datetime.utcnow()
+    return await db.announcement_jobs.find_one_and_update(
+        {
+            "id": job_id,
+            "status": AnnouncementStatus.RUNNING,
+            "$or": [{"locked_until": None}, {"locked_until": {"$lte": now}}],
+        },
+        {"$set": {
+            "locked_until": now + timedelta(seconds=ANNOUNCEMENT_LEASE_SECONDS),
+            "lease_owner": str(uuid.uuid4()),
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _renew(job_id: str, owner: str) -> Optional[dict]:
+    """_summary_
+    Extend the lease of a job this run still owns.
+    Returns:
+        dict: the job, None when another run has taken it over
+    """
+    return await db.announcement_jobs.find_one_and_update(
+        {"id": job_id, "lease_owner": owner, "status": AnnouncementStatus.RUNNING},
+        {"$set": {
+            "locked_until": datetime.utcnow() + timedelta(
+                seconds=ANNOUNCEMENT_LEASE_SECONDS
+            )
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _messages(job: dict, fund: dict, subscriptions: list, users: dict):
+    """_summary_
+    Render the messages of a batch in each user's locale and group them by
+    channel.
+    Returns:
+        tuple: {channel: [(to, subject, body)]} and the number of subscribers
+        without an address for their channel or whose message could not be
+        rendered
+    """
+    messages = {}
+    skipped = 0
+    for subscription in subscriptions:
+        method = (
+            subscription.get("subscription_notification_channel")
+            or SubscriptionNotificationChannel.EMAIL
+        )
+        user = users.get(subscription.get("user_id")) or {}
+        to = user.get(
+            "email" if method == SubscriptionNotificationChannel.EMAIL
+            else "phone_number"
+        )
+        if not to:
+            skipped += 1
+            continue
+        try:
+            message = notification_templates.render(
+                NotificationEvent.ANNOUNCEMENT, method, user.get("locale"),
+                user=user, fund=fund, subject=job["subject"], body=job["body"]
+            )
+        except TemplateError:
+            logger.exception(
+                "Announcement %s not rendered for user %s", job["id"], user.get("id")
+            )
+            skipped += 1
+            continue
+        messages.setdefault(method, []).append((to, message.subject, message.body))
+    return messages, skipped
+
+
+async def _send_batches(
+    job: dict, sender: FanoutSender, batch_size: int
+) -> Optional[dict]:
+    """_summary_
+    Send the batches of a job from its checkpoint, recording a checkpoint
+    after each one.
+    Returns:
+        dict: the job after its last checkpoint, None when the lease was
+        taken over by another run
+    """
+    fund = await db.funds.find_one(
+        {"id": job["fund_id"]}, {"_id": 0}
+    ) or {"id": job["fund_id"], "name": job["fund_id"]}
+    owner = job["lease_owner"]
+    while True:
+        # A keyset query per batch: no cursor stays open while a
+        # rate-limited batch is being sent
+        query = {"fund_id": job["fund_id"], "status": FundStatus.ACTIVE}
+        if job["checkpoint"] is not None:
+            query["_id"] = {"$gt": job["checkpoint"]}
+        subscriptions = await db.subscriptions.find(
+            query, {"user_id": 1, "subscription_notification_channel": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not subscriptions:
+            return job
+        users = await fetch_by_keys(
+            db.users, [subscription["user_id"] for subscription in subscriptions]
+        )
+        messages, skipped = _messages(job, fund, subscriptions, users)
+        sent, failed = await sender.send(messages)
+        now = datetime.utcnow()
+        job = await db.announcement_jobs.find_one_and_update(
+            {"id": job["id"], "lease_owner": owner},
+            {
+                "$set": {
+                    "checkpoint": subscriptions[-1]["_id"],
+                    "updated_at": now,
+                    "locked_until": now + timedelta(
+                        seconds=ANNOUNCEMENT_LEASE_SECONDS
+                    ),
+                },
+                "$inc": {"sent": sent, "failed": failed, "skipped": skipped},
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return None
+
+
+async def run_announcement(
+    job_id: str,
+    sender: FanoutSender = None,
+    batch_size: int = None
+) -> Optional[dict]:
+    """_summary_
+    Send a job from its checkpoint to the last subscriber, retrying a failed
+    batch from the last checkpoint with an exponential backoff.
+    Returns:
+        dict: the finished job, None when it is held by another worker,
+        already completed, taken over while running or still failing after
+        ANNOUNCEMENT_MAX_ATTEMPTS attempts
+    """
+    job = await _claim(job_id)
+    if not job:
+        return None
+    owner = job["lease_owner"]
+    sender = sender or create_fanout_sender()
+    batch_size = batch_size or ANNOUNCEMENT_BATCH_SIZE
+    attempt = 0
+    while True:
+        try:
+            if attempt:
+                # Resume from the last checkpoint, if the job is still ours
+                job = await _renew(job_id, owner)
+            if job:
+                job = await _send_batches(job, sender, batch_size)
+            break
+        except asyncio.CancelledError:
+            # Stopped with the application: let the next start resume it
+            await db.announcement_jobs.update_one(
+                {"id": job_id, "lease_owner": owner}, {"$set": {"locked_until": None}}
+            )
+            raise
+        except Exception:
+            attempt += 1
+            if attempt >= ANNOUNCEMENT_MAX_ATTEMPTS:
+                # Left running; resumed once its lease runs out
+                logger.exception(
+                    "Announcement %s interrupted after %s attempts", job_id, attempt
+                )
+                return None
+            logger.warning(
+                "Announcement %s failed, attempt %s", job_id, attempt, exc_info=True
+            )
+            await asyncio.sleep(ANNOUNCEMENT_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+    if job is None:
+        logger.warning("Announcement %s taken over by another worker", job_id)
+        return None
+    now = datetime.utcnow()
+    return await db.announcement_jobs.find_one_and_update(
+        {"id": job_id, "lease_owner": owner},
+        {"$set": {
+            "status": AnnouncementStatus.COMPLETED,
+            "completed_at": now,
+            "updated_at": now,
+            "locked_until": None,
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def resume_announcements() -> int:
+    """_summary_
+    Restart the jobs left running whose lease is over.
+    Returns:
+        int: number of jobs restarted
+    """
+    now = datetime.utcnow()
+    resumed = 0
+    async for job in db.announcement_jobs.find(
+        {
+            "status": AnnouncementStatus.RUNNING,
+            "$or": [{"locked_until": None}, {"locked_until": {"$lte": now}}],
+        },
+        {"id": 1}
+    ):
+        _schedule(job["id"])
+        resumed += 1
+    return resumed
+
+
+async def _resume_periodically():
+    while True:
+        try:
+            await resume_announcements()
+        except Exception:
+            logger.exception("Announcement jobs not resumed")
+        await asyncio.sleep(ANNOUNCEMENT_RESUME_INTERVAL_SECONDS)
+
+
+def start_announcements():
+    """_summary_
+    Resume the jobs whose lease ran out now and every
+    ANNOUNCEMENT_RESUME_INTERVAL_SECONDS, until stop_announcements.
+    """
+    global _resume_task
+    if _resume_task is None:
+        _resume_task = asyncio.create_task(_resume_periodically())
+
+
+async def stop_announcements():
+    global _resume_task
+    if _resume_task is not None:
+        _resume_task.cancel()
+        await asyncio.gather(_resume_task, return_exceptions=True)
+        _resume_task = None
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
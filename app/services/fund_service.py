@@ -4,17 +4,18 @@ from pymongo.errors import PyMongoError
 from app.models.fund import Fund
 from app.repositories.fund_repository import FundRepository
 from app.utils.constants import DataBaseError, FundStatus, FundSuccessMessage
+from app.utils.pagination import DEFAULT_PAGE_SIZE
 
 
 class FundService:
     def __init__(self, repository: FundRepository):
         self.repository = repository
 
-    def create_fund(self, fund: Fund):
+    async def create_fund(self, fund: Fund):
         try:
             if "status" not in fund.dict() or not fund.status:
                 fund.status = FundStatus.ACTIVE
-            fund_id = self.repository.create_fund(fund)
+            fund_id = await self.repository.create_fund(fund)
             response = {
                 "message": FundSuccessMessage.SUCCESS_FUND_CREATED,
                 "fund_id": fund_id
@@ -29,14 +30,23 @@ class FundService:
         except HTTPException as e:
             raise e
 
-    def get_fund(self, fund_id: str):
+    async def get_fund(self, fund_id: str):
         try:
-            return self.repository.get_fund(fund_id)
+            return await self.repository.get_fund(fund_id)
         except HTTPException as e:
             raise e
 
-    def list_funds(self):
+    async def list_funds(self, limit: int = DEFAULT_PAGE_SIZE, after: str = None):
         try:
-            return self.repository.list_funds()
+            return await self.repository.list_funds(limit=limit, after=after)
         except HTTPException as e:
             raise e
+
+    def iter_funds(self):
+        return self.repository.iter_funds()
+
+    def fund_etag(self, fund_id: str):
+        return self.repository.fund_etag(fund_id)
+
+    def page_etag(self, limit: int = DEFAULT_PAGE_SIZE, after: str = None):
+        return self.repository.page_etag(limit, after)
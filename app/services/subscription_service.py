@@ -1,55 +1,171 @@
 
+import asyncio
+import logging
+import os
 import uuid
 from datetime import datetime
+from typing import List
 
 from fastapi import HTTPException
-from pymongo.errors import PyMongoError
+from fastapi.encoders import jsonable_encoder
+from jinja2 import TemplateError
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 
 from app.models.subscription import Subscription
 from app.models.transaction_history import TransactionHistory
+from app.repositories.cached_fund_repository import fund_cache, fund_key
+from app.repositories.cached_user_repository import user_repository
+from app.repositories.mongo_user_repository import (
+    PUBLIC_USER_PROJECTION,
+    public_user
+)
 from app.utils.constants import (
     DataBaseError,
     FundStatus,
+    NotificationEvent,
     SubscriptionError,
     SubscriptionNotificationChannel,
     SuccessMessage,
     TransactionAction
 )
-from app.utils.database import connect_db
+from app.utils.batch_join import fetch_by_keys, join_related
+from app.utils.database import shared_db
 from app.utils.formater.date_utils import DateUtils
-from app.utils.notification.notification_factory import NotificationFactory
+from app.utils.pagination import DEFAULT_PAGE_SIZE, Page, fetch_page
+from app.utils.response_cache import response_cache
+from app.utils.streaming import STREAM_BATCH_SIZE, iterate_batches
+from app.utils.notification.outbox import (
+    OUTBOX_COLLECTION,
+    outbox_entry,
+    outbox_worker
+)
+from app.utils.notification.templates import notification_templates
 
 # load_dotenv()
-db = connect_db()
+db = shared_db()
+
+# Largest batch accepted by the bulk endpoints
+MAX_BULK_SIZE = int(os.getenv("MAX_BULK_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
 
 
-def _send_subscription_notification(user: dict, fund: dict, method: str):
+async def _get_fund(fund_id: str):
     """_summary_
-    This function sends a notification to the user after a successful subscription
+    Read a fund through the fund catalog cache shared with the fund routes.
+    Returns:
+        dict: the fund, with ``_id`` as a string, or None if it does not exist
+    """
+    async def load():
+        fund = await db.funds.find_one({"id": fund_id})
+        if fund and "_id" in fund:
+            fund["_id"] = str(fund["_id"])
+        return fund
+
+    return await fund_cache.get_or_load(fund_key(fund_id), load)
+
+
+def _subscription_notification(
+    user: dict,
+    fund: dict,
+    method: str,
+    event: str = NotificationEvent.SUBSCRIPTION_CREATED
+) -> dict:
+    """_summary_
+    Build the outbox entry notifying a user of a change in a subscription,
+    rendered in the user's locale. The change is already committed, so a
+    template that cannot be rendered skips the notification instead of
+    failing the request.
     Args:
         user (dict): _description_
         fund (dict): _description_
         method (str): _description_
+        event (str): NotificationEvent of the change
     """
-
-    subject = "Subscription Created Successfully"
-    body = (
-        f"Dear {user['name']},\n\n"
-        f"Your subscription to {fund['name']} has been created successfully.\n\n"
-        "Best regards,\n"
-        "Your Company"
-    )
-    notification = NotificationFactory.get_notification(method)
     notification_channel_value = (
-        user["email"]
+        user.get("email")
         if method == SubscriptionNotificationChannel.EMAIL
-        else user["phone_number"]
+        else user.get("phone_number")
+    )
+    if not notification_channel_value:
+        return None
+    try:
+        message = notification_templates.render(
+            event, method, user.get("locale"), user=user, fund=fund
+        )
+    except TemplateError:
+        logger.exception(
+            "Notification %s.%s for user %s not rendered",
+            event, method, user.get("id")
+        )
+        return None
+    return outbox_entry(
+        method, notification_channel_value, message.subject, message.body
     )
 
-    notification.send_notification(notification_channel_value, subject, body)
 
+async def _send_subscription_notifications(
+    notifications: list,
+    event: str = NotificationEvent.SUBSCRIPTION_CREATED
+):
+    """_summary_
+    Write notifications to the outbox with a single insert. The outbox worker
+    sends them, so the response does not wait for SMTP or SNS and a restart
+    does not lose them.
+    Args:
+        notifications (list): (user, fund, method) tuples
+        event (str): NotificationEvent of the change
+    """
+    # Users without an address or a phone number for the channel are skipped
+    entries = [
+        entry for entry in (
+            _subscription_notification(user, fund, method, event)
+            for user, fund, method in notifications
+        )
+        if entry
+    ]
+    if entries:
+        await db[OUTBOX_COLLECTION].insert_many(entries)
+        outbox_worker.wake()
+
+
+async def _send_subscription_notification(
+    user: dict,
+    fund: dict,
+    method: str,
+    event: str = NotificationEvent.SUBSCRIPTION_CREATED
+):
+    """_summary_
+    This function sends a notification to the user after a change in a subscription
+    Args:
+        user (dict): _description_
+        fund (dict): _description_
+        method (str): _description_
+        event (str): NotificationEvent of the change
+    """
+    await _send_subscription_notifications([(user, fund, method)], event)
 
-def create_subscription(subscription: Subscription):
+
+async def _after_commit(subscription_id: str, *writes):
+    """_summary_
+    Run the writes that follow a committed change to a subscription (its
+    transaction log and notification) concurrently, in one round trip of
+    latency. They cannot undo the change, so a failure is logged instead of
+    failing the request.
+    Args:
+        subscription_id (str): the subscription that changed
+        writes (coroutine): the writes to run
+    """
+    results = await asyncio.gather(*writes, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(
+                "Write after subscription %s was committed failed",
+                subscription_id, exc_info=result
+            )
+
+
+async def create_subscription(subscription: Subscription):
     """_summary_
     This function creates a subscription for a user to a fund.
     Args:
@@ -68,46 +184,35 @@ def create_subscription(subscription: Subscription):
         _type_: _description_
     """
     try:
-
-        # Check if the user exists
-        user = db.users.find_one({"id": subscription.user_id})
-        if not user:
-            raise HTTPException(
-                status_code=404,
-                detail=SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
-            )
-
         # Check if the fund exists
-        fund = db.funds.find_one({"id": subscription.fund_id})
+        fund = await _get_fund(subscription.fund_id)
         if not fund:
             raise HTTPException(
                 status_code=404,
                 detail=SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
             )
 
-        # Check if the user is already subscribed to the fund
-        existing_subscription = db.subscriptions.find_one({
-            "user_id": subscription.user_id,
-            "fund_id": subscription.fund_id,
-            "status": FundStatus.ACTIVE
-        })
-
-        if existing_subscription:
-            raise HTTPException(
-                status_code=400,
-                detail=SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND)
-
-        user_investment_capital = user.get("investment_capital")
         fund_minimum_investment_amount = fund.get("minimum_investment_amount")
-
         if fund_minimum_investment_amount is None:
             raise HTTPException(
                 status_code=400,
                 detail=SubscriptionError.ERROR_NO_MINIMUM_AMOUNT_TO_INVEST
             )
 
-        # Check if the user has enough investment capital to subscribe to the fund
-        if user_investment_capital < fund_minimum_investment_amount:
+        # Check the balance and debit it in one conditional update, so two
+        # concurrent subscriptions can never spend the same capital
+        user = await user_repository.debit_capital(
+            subscription.user_id, fund_minimum_investment_amount
+        )
+        if not user:
+            # Only on failure: tell a missing user from a short balance
+            if not await user_repository.get_user(subscription.user_id):
+                raise HTTPException(
+                    status_code=404,
+                    detail=(
+                        SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
+                    )
+                )
             raise HTTPException(
                 status_code=400,
                 detail=(
@@ -116,44 +221,53 @@ def create_subscription(subscription: Subscription):
                 )
             )
 
-        # Create the subscription
+        # Create the subscription, the subscriptions_user_fund_active_unique
+        # index rejects a second active subscription to the same fund
         subscription_id = str(uuid.uuid4())
-        subscription_dict = subscription.dict()
-        subscription_dict["id"] = subscription_id
-        db.subscriptions.insert_one(subscription_dict)
-
-        # Log the transaction
-        log_transaction(
+        transaction = _transaction_document(
             subscription_id,
             TransactionAction.CREATED,
             subscription.subscription_notification_channel or
             SubscriptionNotificationChannel.EMAIL
         )
+        subscription_dict = subscription.dict()
+        subscription_dict["id"] = subscription_id
+        subscription_dict.update(_last_transaction(transaction))
+        try:
+            await db.subscriptions.insert_one(subscription_dict)
+        except DuplicateKeyError:
+            await user_repository.credit_capital(
+                subscription.user_id, fund_minimum_investment_amount
+            )
+            raise HTTPException(
+                status_code=400,
+                detail=SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND)
+        except BaseException:
+            # Any other failure (network error, timeout, cancellation) would
+            # keep the capital debited for a subscription that was not saved
+            await user_repository.credit_capital(
+                subscription.user_id, fund_minimum_investment_amount
+            )
+            raise
 
-        """Subtract the fund's minimum investment amount
-            from the user's investmen t capital"""
-        new_investment_capital = (
-            user_investment_capital
-            - fund_minimum_investment_amount
-        )
-
-        db.users.update_one(
-            {"id": subscription.user_id},
-            {"$set": {"investment_capital": new_investment_capital}}
-        )
-
-        # Send notification
-        _send_subscription_notification(
-            user,
-            fund,
-            method=subscription.subscription_notification_channel or
-            SubscriptionNotificationChannel.EMAIL
+        # The subscription is committed: refresh the cached views first, then
+        # log the transaction and queue the notification side by side
+        await _invalidate_views(subscription.user_id)
+        await _after_commit(
+            subscription_id,
+            db.transaction_history.insert_one(transaction),
+            _send_subscription_notification(
+                user,
+                fund,
+                method=subscription.subscription_notification_channel or
+                SubscriptionNotificationChannel.EMAIL
+            )
         )
 
         return {
             "detail": SuccessMessage.SUCCESS_SUBSCRIPTION,
             "subscription_id": subscription_id,
-            "new_capital_value": new_investment_capital
+            "new_capital_value": user.get("investment_capital")
         }
 
     except HTTPException as e:
@@ -163,7 +277,7 @@ def create_subscription(subscription: Subscription):
         raise HTTPException(status_code=500, detail=DataBaseError.ERROR_DB_CONNECTION)
 
 
-def cancel_subscription(subscription_id: str):
+async def cancel_subscription(subscription_id: str):
     """_summary_
     This function cancels a subscription and refunds the user's investment capital.
     Args:
@@ -180,12 +294,15 @@ def cancel_subscription(subscription_id: str):
     """
     try:
         # Check if the subscription exists
-        subscription = db.subscriptions.find_one({"id": subscription_id})
+        subscription = await db.subscriptions.find_one({"id": subscription_id})
         if not subscription:
-            raise HTTPException(status_code=404, detail="Subscription does not exist")
+            raise HTTPException(
+                status_code=404,
+                detail=SubscriptionError.ERROR_SUBSCRIPTION_DOES_NOT_EXIST
+            )
 
         # Check if the user exists
-        user = db.users.find_one({"id": subscription["user_id"]})
+        user = await user_repository.get_user(subscription["user_id"])
         if not user:
             raise HTTPException(
                 status_code=404,
@@ -193,34 +310,48 @@ def cancel_subscription(subscription_id: str):
             )
 
         # Check if the fund exists
-        fund = db.funds.find_one({"id": subscription["fund_id"]})
+        fund = await _get_fund(subscription["fund_id"])
         if not fund:
             raise HTTPException(
                 status_code=404,
                 detail=SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
             )
 
-        user_investment_capital = user.get("investment_capital")
-        fund_minimum_investment_amount = fund.get("minimum_investment_amount")
-        new_investment_capital = (
-            user_investment_capital + fund_minimum_investment_amount
+        # Flip the status only if it is still active, so a cancellation
+        # repeated or sent twice at once refunds the capital a single time
+        transaction = _transaction_document(
+            subscription_id,
+            TransactionAction.CANCELLED,
+            str(subscription.get("subscription_notification_channel", "sin_canal"))
         )
-
-        db.users.update_one(
-            {"id": user.get("id")},
-            {"$set": {"investment_capital": new_investment_capital}}
+        cancelled = await db.subscriptions.find_one_and_update(
+            {"id": subscription_id, "status": FundStatus.ACTIVE},
+            {"$set": {
+                "status": TransactionAction.CANCELLED,
+                **_last_transaction(transaction)
+            }}
         )
+        if not cancelled:
+            raise HTTPException(
+                status_code=400,
+                detail=SubscriptionError.ERROR_SUBSCRIPTION_ALREADY_CANCELLED
+            )
 
-        db.subscriptions.update_one(
-            {"id": subscription_id},
-            {"$set": {"status": TransactionAction.CANCELLED}}
+        refunded_user = await user_repository.credit_capital(
+            subscription["user_id"], fund.get("minimum_investment_amount")
         )
+        new_investment_capital = (refunded_user or user).get("investment_capital")
 
-        # Log the transaction
-        log_transaction(
+        await _invalidate_views(subscription["user_id"])
+        await _after_commit(
             subscription_id,
-            TransactionAction.CANCELLED,
-            str(subscription.get("subscription_notification_channel", "sin_canal"))
+            db.transaction_history.insert_one(transaction),
+            _send_subscription_notification(
+                refunded_user or user, fund,
+                subscription.get("subscription_notification_channel")
+                or SubscriptionNotificationChannel.EMAIL,
+                NotificationEvent.SUBSCRIPTION_CANCELLED
+            )
         )
 
         return {
@@ -232,94 +363,479 @@ def cancel_subscription(subscription_id: str):
         raise e
 
 
-def list_subscriptions_with_users():
+def _item_result(index: int, status_code: int, detail: str, **fields) -> dict:
+    return {"index": index, "status_code": status_code, "detail": detail, **fields}
+
+
+def _bulk_summary(results: list) -> dict:
+    succeeded = sum(1 for result in results if result["status_code"] == 200)
+    return {
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+
+def _check_bulk_size(items: list):
+    if len(items) > MAX_BULK_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{SubscriptionError.ERROR_BULK_TOO_LARGE} ({MAX_BULK_SIZE})"
+        )
+
+
+def _add_amount(amounts: dict, key: str, amount: float):
+    amounts[key] = amounts.get(key, 0) + amount
+
+
+async def create_subscriptions_bulk(subscriptions: List[Subscription]):
     """_summary_
-    This function returns a list of subscriptions with the user and fund information.
+    Create many subscriptions with a constant number of queries: users,
+    funds and active subscriptions are read once for the whole batch and
+    every item is validated in memory against them, then the debits go in one
+    bulk_write and the subscriptions and their transactions in one
+    insert_many each. An item failing does not fail the others.
+    Args:
+        subscriptions (List[Subscription]): subscriptions to create
+    Raises:
+        HTTPException: the batch is larger than MAX_BULK_SIZE
     Returns:
-        _type_: _description_
+        dict: succeeded and failed counts, and one result per item in order
     """
-    subscriptions = db.subscriptions.find()
-    result = []
-    for subscription in subscriptions:
-        user = db.users.find_one({"id": subscription["user_id"]})
-        fund = db.funds.find_one({"id": subscription["fund_id"]})
+    _check_bulk_size(subscriptions)
+    try:
+        users = await fetch_by_keys(
+            db.users, [subscription.user_id for subscription in subscriptions]
+        )
+        funds = await fetch_by_keys(
+            db.funds, [subscription.fund_id for subscription in subscriptions]
+        )
+        active = set()
+        if users and funds:
+            active = {
+                (existing["user_id"], existing["fund_id"])
+                async for existing in db.subscriptions.find(
+                    {
+                        "user_id": {"$in": list(users)},
+                        "fund_id": {"$in": list(funds)},
+                        "status": FundStatus.ACTIVE
+                    },
+                    {"user_id": 1, "fund_id": 1}
+                )
+            }
+
+        # Validate every item against the balances left by the previous ones
+        results = [None] * len(subscriptions)
+        balances = {
+            user_id: user.get("investment_capital") or 0
+            for user_id, user in users.items()
+        }
+        accepted = []
+        transactions = {}
+        debits = {}
+        for index, subscription in enumerate(subscriptions):
+            user = users.get(subscription.user_id)
+            fund = funds.get(subscription.fund_id)
+            if not user:
+                results[index] = _item_result(
+                    index, 404,
+                    SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
+                )
+                continue
+            if not fund:
+                results[index] = _item_result(
+                    index, 404, SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
+                )
+                continue
+            amount = fund.get("minimum_investment_amount")
+            if amount is None:
+                results[index] = _item_result(
+                    index, 400, SubscriptionError.ERROR_NO_MINIMUM_AMOUNT_TO_INVEST
+                )
+                continue
+            pair = (subscription.user_id, subscription.fund_id)
+            if pair in active:
+                results[index] = _item_result(
+                    index, 400, SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND
+                )
+                continue
+            if balances[subscription.user_id] < amount:
+                results[index] = _item_result(
+                    index, 400,
+                    f"{SubscriptionError.ERROR_NO_AVAILABLE_BALANCE} {fund['name']}"
+                )
+                continue
+            balances[subscription.user_id] -= amount
+            _add_amount(debits, subscription.user_id, amount)
+            if subscription.status == FundStatus.ACTIVE:
+                active.add(pair)
+            document = subscription.dict()
+            document["id"] = str(uuid.uuid4())
+            transactions[index] = _transaction_document(
+                document["id"],
+                TransactionAction.CREATED,
+                subscription.subscription_notification_channel
+                or SubscriptionNotificationChannel.EMAIL
+            )
+            document.update(_last_transaction(transactions[index]))
+            accepted.append((index, document, amount))
+
+        # A balance that changed since it was read fails all the items of
+        # that user, none of them was debited
+        debited = await user_repository.debit_capital_many(debits)
+        for index, document, amount in accepted:
+            if document["user_id"] not in debited:
+                results[index] = _item_result(
+                    index, 400,
+                    f"{SubscriptionError.ERROR_NO_AVAILABLE_BALANCE} "
+                    f"{funds[document['fund_id']]['name']}"
+                )
+        accepted = [item for item in accepted if item[1]["user_id"] in debited]
+
+        # Subscriptions created meanwhile are rejected by the unique index,
+        # their debit is given back
+        rejected = {}
+        if accepted:
+            try:
+                await db.subscriptions.insert_many(
+                    [document for _, document, _ in accepted], ordered=False
+                )
+            except BulkWriteError as e:
+                rejected = {
+                    error["index"]: error for error in e.details["writeErrors"]
+                }
+        refunds = {}
+        for position, error in rejected.items():
+            index, document, amount = accepted[position]
+            _add_amount(refunds, document["user_id"], amount)
+            results[index] = _item_result(
+                index, 400, SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND
+            ) if error.get("code") == 11000 else _item_result(
+                index, 500, DataBaseError.ERROR_DB_CONNECTION
+            )
+        await user_repository.credit_capital_many(refunds)
+        created = [
+            item for position, item in enumerate(accepted)
+            if position not in rejected
+        ]
+
+        await log_transactions([transactions[index] for index, _, _ in created])
+        await _invalidate_views(*{document["user_id"] for _, document, _ in created})
+        for index, document, _ in created:
+            results[index] = _item_result(
+                index, 200, SuccessMessage.SUCCESS_SUBSCRIPTION,
+                subscription_id=document["id"]
+            )
+
+        await _send_subscription_notifications([
+            (
+                users[document["user_id"]],
+                funds[document["fund_id"]],
+                transactions[index]["notification_channel"]
+            )
+            for index, document, _ in created
+        ])
+
+        return _bulk_summary(results)
 
+    except HTTPException as e:
+        raise e
+    except PyMongoError:
+        raise HTTPException(status_code=500, detail=DataBaseError.ERROR_DB_CONNECTION)
+
+
+async def cancel_subscriptions_bulk(subscription_ids: List[str]):
+    """_summary_
+    Cancel many subscriptions with a constant number of queries: the
+    subscriptions, their users and funds are read once, the statuses change
+    in one update_many and the refunds go in one bulk_write.
+    Args:
+        subscription_ids (List[str]): subscriptions to cancel
+    Raises:
+        HTTPException: the batch is larger than MAX_BULK_SIZE
+    Returns:
+        dict: succeeded and failed counts, and one result per item in order
+    """
+    _check_bulk_size(subscription_ids)
+    try:
+        subscriptions = await fetch_by_keys(db.subscriptions, subscription_ids)
+        users = await fetch_by_keys(
+            db.users,
+            [subscription.get("user_id") for subscription in subscriptions.values()]
+        )
+        funds = await fetch_by_keys(
+            db.funds,
+            [subscription.get("fund_id") for subscription in subscriptions.values()]
+        )
+
+        results = [None] * len(subscription_ids)
+        accepted = {}
+        for index, subscription_id in enumerate(subscription_ids):
+            subscription = subscriptions.get(subscription_id)
+            if not subscription:
+                results[index] = _item_result(
+                    index, 404, SubscriptionError.ERROR_SUBSCRIPTION_DOES_NOT_EXIST
+                )
+            elif subscription["user_id"] not in users:
+                results[index] = _item_result(
+                    index, 404,
+                    SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
+                )
+            elif subscription["fund_id"] not in funds:
+                results[index] = _item_result(
+                    index, 404, SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
+                )
+            elif (
+                subscription.get("status") != FundStatus.ACTIVE
+                or subscription_id in accepted
+            ):
+                results[index] = _item_result(
+                    index, 400, SubscriptionError.ERROR_SUBSCRIPTION_ALREADY_CANCELLED
+                )
+            else:
+                accepted[subscription_id] = index
+
+        # Only the subscriptions still active change, the batch tag tells
+        # which ones when another cancellation got some of them first
+        cancelled = set()
+        if accepted:
+            cancellation_id = str(uuid.uuid4())
+            timestamp = datetime.utcnow()
+            result = await db.subscriptions.update_many(
+                {"id": {"$in": list(accepted)}, "status": FundStatus.ACTIVE},
+                {"$set": {
+                    "status": TransactionAction.CANCELLED,
+                    "cancellation_id": cancellation_id,
+                    "last_transaction_at": timestamp,
+                    "last_action": TransactionAction.CANCELLED
+                }}
+            )
+            cancelled = set(accepted)
+            if result.modified_count < len(accepted):
+                cancelled = {
+                    subscription["id"] async for subscription in db.subscriptions.find(
+                        {"id": {"$in": list(accepted)},
+                         "cancellation_id": cancellation_id},
+                        {"id": 1}
+                    )
+                }
+
+        refunds = {}
+        for subscription_id, index in accepted.items():
+            if subscription_id not in cancelled:
+                results[index] = _item_result(
+                    index, 400, SubscriptionError.ERROR_SUBSCRIPTION_ALREADY_CANCELLED
+                )
+                continue
+            subscription = subscriptions[subscription_id]
+            _add_amount(
+                refunds, subscription["user_id"],
+                funds[subscription["fund_id"]].get("minimum_investment_amount") or 0
+            )
+            results[index] = _item_result(
+                index, 200, SuccessMessage.SUCCESS_SUBSCRIPTION_CANCELLATION,
+                subscription_id=subscription_id
+            )
+        await user_repository.credit_capital_many(refunds)
+        await log_transactions([
+            _transaction_document(
+                subscription_id,
+                TransactionAction.CANCELLED,
+                str(subscriptions[subscription_id].get(
+                    "subscription_notification_channel", "sin_canal"
+                )),
+                timestamp
+            )
+            for subscription_id in accepted if subscription_id in cancelled
+        ])
+        await _invalidate_views(*{
+            subscriptions[subscription_id]["user_id"]
+            for subscription_id in accepted if subscription_id in cancelled
+        })
+        await _send_subscription_notifications([
+            (
+                users[subscriptions[subscription_id]["user_id"]],
+                funds[subscriptions[subscription_id]["fund_id"]],
+                subscriptions[subscription_id].get("subscription_notification_channel")
+                or SubscriptionNotificationChannel.EMAIL
+            )
+            for subscription_id in accepted if subscription_id in cancelled
+        ], NotificationEvent.SUBSCRIPTION_CANCELLED)
+
+        return _bulk_summary(results)
+
+    except HTTPException as e:
+        raise e
+    except PyMongoError:
+        raise HTTPException(status_code=500, detail=DataBaseError.ERROR_DB_CONNECTION)
+
+
+async def _latest_transaction_timestamps(subscription_ids) -> dict:
+    """_summary_
+    Find the timestamp of the latest transaction of each subscription in one
+    aggregation, served by the (subscription_id, timestamp) index.
+    Args:
+        subscription_ids (iterable): subscriptions to look up
+    Returns:
+        dict: latest timestamp keyed by subscription id
+    """
+    cursor = await db.transaction_history.aggregate([
+        {"$match": {"subscription_id": {"$in": list(subscription_ids)}}},
+        {"$sort": {"subscription_id": 1, "timestamp": -1}},
+        {"$group": {"_id": "$subscription_id", "timestamp": {"$first": "$timestamp"}}}
+    ])
+    return {item["_id"]: item["timestamp"] async for item in cursor}
+
+
+async def _join_subscriptions(subscriptions: list, known_users: dict = None):
+    """_summary_
+    Attach the user, the fund and the latest transaction timestamp to each
+    subscription with one query per related collection, whatever the number
+    of subscriptions, and drop the user_id and fund_id references.
+    The timestamp comes from the last_transaction_at field of the
+    subscription; transaction_history is only read for subscriptions written
+    before that field existed and not backfilled yet.
+    Args:
+        subscriptions (list): subscription documents, enriched in place
+        known_users (dict): users already loaded, keyed by id
+    """
+    if not subscriptions:
+        return
+    await join_related(
+        subscriptions, db.users, "user_id", "user",
+        known=known_users, projection=PUBLIC_USER_PROJECTION
+    )
+    await join_related(subscriptions, db.funds, "fund_id", "fund")
+    missing = [
+        subscription["id"] for subscription in subscriptions
+        if not subscription.get("last_transaction_at")
+    ]
+    timestamps = await _latest_transaction_timestamps(missing) if missing else {}
+
+    for subscription in subscriptions:
         # Convert ObjectId to string
         subscription["_id"] = str(subscription["_id"])
-        if user:
-            user["_id"] = str(user["_id"])
-            subscription["user"] = user
-        if fund:
-            fund["_id"] = str(fund["_id"])
-            subscription["fund"] = fund
 
-        # Find the latest transaction for the subscription
-        transaction = db.transaction_history.find_one(
-            {"subscription_id": subscription["id"]},
-            sort=[("timestamp", -1)]
+        # Latest transaction for the subscription
+        timestamp = subscription.get("last_transaction_at") or timestamps.get(
+            subscription["id"]
         )
-        if transaction:
+        if timestamp:
             subscription["transaction_timestamp"] = DateUtils.format_datetime(
-                transaction["timestamp"]
+                timestamp
             )
 
         # Remove user_id and fund_id from subscription
         subscription.pop("user_id", None)
         subscription.pop("fund_id", None)
 
-        subscription_with_user_and_fund = {
-            "subscription": subscription
-        }
 
-        result.append(subscription_with_user_and_fund)
-    return result
+# Response cache scopes: the full listing depends on every subscription, the
+# per-user views only on the subscriptions and transactions of one user
+SUBSCRIPTIONS_SCOPE = "subscriptions"
+
+
+def _user_scope(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def _encode_page(page: Page) -> dict:
+    return {"items": jsonable_encoder(list(page)), "next_cursor": page.next_cursor}
 
 
-def list_subscriptions_by_user(user_id: str):
+def _decode_page(content: dict) -> Page:
+    return Page(content["items"], content["next_cursor"])
+
+
+async def _invalidate_views(*user_ids: str):
+    """_summary_
+    Drop the cached listings showing the subscriptions of these users, after
+    a write to their subscriptions or transactions.
     """
-    This function returns a list of subscriptions for a user.
-    Args: user_id (str): The user ID
-    Returns: A list of subscriptions for the user
+    if user_ids:
+        await response_cache.invalidate(
+            SUBSCRIPTIONS_SCOPE, *[_user_scope(user_id) for user_id in user_ids]
+        )
+
+
+async def list_subscriptions_with_users(
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: str = None
+):
+    """_summary_
+    This function returns a page of subscriptions with the user and fund
+    information.
+    Users, funds and the latest transactions are fetched once for the whole
+    page and joined in memory, so the number of queries does not grow
+    with the number of subscriptions.
+    Args:
+        limit (int): page size
+        after (str): cursor of the previous page
+    Returns:
+        Page: subscriptions wrapped in {"subscription": ...}
     """
-    try:
-        subscriptions = db.subscriptions.find({"user_id": user_id})
-        result = []
+    async def load():
+        subscriptions = await fetch_page(db.subscriptions, limit=limit, after=after)
+        await _join_subscriptions(subscriptions)
+        return Page(
+            [{"subscription": subscription} for subscription in subscriptions],
+            subscriptions.next_cursor
+        )
+
+    return await response_cache.cached(
+        f"subscriptions:{limit}:{after or ''}", [SUBSCRIPTIONS_SCOPE], load,
+        encode=_encode_page, decode=_decode_page
+    )
+
+
+async def iter_subscriptions_with_users():
+    """_summary_
+    Yield every subscription with its user and fund, as in
+    list_subscriptions_with_users, joining one cursor batch at a time so
+    memory stays bounded by the batch size.
+    """
+    cursor = db.subscriptions.find().sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+    async for subscriptions in iterate_batches(cursor, STREAM_BATCH_SIZE):
+        await _join_subscriptions(subscriptions)
         for subscription in subscriptions:
-            user = db.users.find_one({"id": subscription["user_id"]})
-            fund = db.funds.find_one({"id": subscription["fund_id"]})
-
-            # Convertir ObjectId a string
-            subscription["_id"] = str(subscription["_id"])
-            if user:
-                user["_id"] = str(user["_id"])
-                subscription["user"] = user
-            if fund:
-                fund["_id"] = str(fund["_id"])
-                subscription["fund"] = fund
-
-            # Encontrar la última transacción para la suscripción
-            transaction = db.transaction_history.find_one(
-                {"subscription_id": subscription["id"]},
-                sort=[("timestamp", -1)]
-            )
-            if transaction:
-                subscription["transaction_timestamp"] = DateUtils.format_datetime(
-                    transaction["timestamp"]
-                )
+            yield {"subscription": subscription}
 
-            # Eliminar user_id y fund_id de la suscripción
-            subscription.pop("user_id", None)
-            subscription.pop("fund_id", None)
 
-            result.append(subscription)
-        return result
+async def list_subscriptions_by_user(
+    user_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: str = None
+):
+    """
+    This function returns a page of subscriptions for a user.
+    Args: user_id (str): The user ID, limit (int): page size, None for all
+        of them, after (str): cursor of the previous page
+    Returns: A page of subscriptions for the user
+    """
+    async def load():
+        subscriptions = await fetch_page(
+            db.subscriptions, {"user_id": user_id}, limit=limit, after=after
+        )
+        await _join_subscriptions(subscriptions)
+        return subscriptions
+
+    try:
+        return await response_cache.cached(
+            f"user:{user_id}:subscriptions:{limit}:{after or ''}",
+            [_user_scope(user_id)], load,
+            encode=_encode_page, decode=_decode_page
+        )
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def get_user_transactions(user_id: str):
+async def get_user_transactions(user_id: str):
     """_summary_
     This function returns a list of transactions for a user.
+    The subscriptions are read once and the funds with a single $in query,
+    so the number of queries does not depend on the number of transactions.
     Args:
         user_id (str): _description_
 
@@ -332,47 +848,10 @@ def get_user_transactions(user_id: str):
         _type_: _description_
     """
     try:
-        # Check if the user exists
-        user = db.users.find_one({"id": user_id})
-        if not user:
-            raise HTTPException(
-                status_code=404,
-                detail=SubscriptionError.ERROR_USER_DOEES_NOT_EXIST
-            )
-
-        # Find all subscriptions for the user
-        subscriptions = db.subscriptions.find({"user_id": user_id})
-        subscription_ids = [subscription["id"] for subscription in subscriptions]
-
-        # Find all transactions for the user's subscriptions
-        transactions = db.transaction_history.find({
-            "subscription_id": {"$in": subscription_ids}
-        })
-
-        result = []
-        for transaction in transactions:
-            transaction["_id"] = str(transaction["_id"])
-            transaction["subscription_id"] = str(transaction["subscription_id"])
-
-            # Get the user associated with the subscription
-            subscription = db.subscriptions.find_one(
-                {"id": transaction["subscription_id"]}
-            )
-            if subscription:
-                user = db.users.find_one({"id": subscription["user_id"]})
-                if user:
-                    user["_id"] = str(user["_id"])
-                    transaction["user"] = user
-
-                fund = db.funds.find_one({"id": subscription["fund_id"]})
-                if fund:
-                    fund["_id"] = str(fund["_id"])
-                    transaction["fund"] = fund
-
-            result.append(transaction)
-
-        return result
-
+        return await response_cache.cached(
+            f"user:{user_id}:transactions", [_user_scope(user_id)],
+            lambda: _get_user_transactions(user_id)
+        )
     except HTTPException as e:
         raise e
     except PyMongoError:
@@ -382,18 +861,80 @@ def get_user_transactions(user_id: str):
         )
 
 
-def log_transaction(subscription_id: str, action: str, notification_channel: str):
-    """_summary_
-    This function logs a transaction in the transaction history collection.
-    Args:
-        subscription_id (str): _description_
-        action (str): _description_
-    """
-    transaction = TransactionHistory(
+async def _get_user_transactions(user_id: str):
+    # Check if the user exists
+    user = await user_repository.get_user(user_id)
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail=SubscriptionError.ERROR_USER_DOEES_NOT_EXIST
+        )
+
+    # Find all subscriptions for the user
+    subscriptions = {
+        subscription["id"]: subscription
+        async for subscription in db.subscriptions.find({"user_id": user_id})
+    }
+
+    # Find all transactions for the user's subscriptions
+    transactions = await db.transaction_history.find({
+        "subscription_id": {"$in": list(subscriptions)}
+    }).to_list(length=None)
+
+    for transaction in transactions:
+        transaction["_id"] = str(transaction["_id"])
+        transaction["subscription_id"] = str(transaction["subscription_id"])
+
+    def subscription_field(field: str):
+        return lambda transaction: subscriptions.get(
+            transaction["subscription_id"], {}
+        ).get(field)
+
+    # The user is already loaded, only the funds need a query
+    await join_related(
+        transactions, db.users, subscription_field("user_id"), "user",
+        known={user_id: public_user(user)}, projection=PUBLIC_USER_PROJECTION
+    )
+    await join_related(
+        transactions, db.funds, subscription_field("fund_id"), "fund"
+    )
+
+    return transactions
+
+
+def _transaction_document(
+    subscription_id: str,
+    action: str,
+    notification_channel: str,
+    timestamp: datetime = None
+) -> dict:
+    return TransactionHistory(
         id=str(uuid.uuid4()),
         subscription_id=subscription_id,
         action=action,
-        timestamp=datetime.utcnow(),
+        timestamp=timestamp or datetime.utcnow(),
         notification_channel=notification_channel
-    )
-    db.transaction_history.insert_one(transaction.dict())
+    ).dict()
+
+
+def _last_transaction(transaction: dict) -> dict:
+    """_summary_
+    Fields keeping the latest transaction on the subscription document, so
+    listings do not have to look it up in transaction_history. Writers set
+    them in the same write that changes the subscription.
+    """
+    return {
+        "last_transaction_at": transaction["timestamp"],
+        "last_action": transaction["action"]
+    }
+
+
+async def log_transactions(transactions: list):
+    """_summary_
+    Insert several transaction documents with a single insert.
+    Args:
+        transactions (list): documents built with _transaction_document, whose
+            subscriptions already point to them
+    """
+    if transactions:
+        await db.transaction_history.insert_many(transactions)
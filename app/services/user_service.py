@@ -1,13 +1,16 @@
 import uuid
-from app.utils.database import connect_db
+from app.repositories.mongo_user_repository import PUBLIC_USER_PROJECTION
+from app.utils.database import shared_db
 from app.models.user import User
 from pymongo.errors import PyMongoError
 from fastapi import HTTPException
+from app.utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from app.utils.streaming import STREAM_BATCH_SIZE
 
-db = connect_db()
+db = shared_db()
 
 
-def create_user(user: User):
+async def create_user(user: User):
     try:
         user_id = str(uuid.uuid4())
         user_dict = user.dict()
@@ -16,7 +19,7 @@ def create_user(user: User):
             user_dict["investment_capital"] = 500000.0
 
         user_dict["id"] = user_id  # Set the generated UUID as the id field
-        db.users.insert_one(user_dict)
+        await db.users.insert_one(user_dict)
         return {"message": "User created successfully", "user_id": user_id}
     except PyMongoError as e:
         raise HTTPException(
@@ -30,14 +33,19 @@ def create_user(user: User):
         )
 
 
-def get_all_users():
+async def get_all_users(limit: int = DEFAULT_PAGE_SIZE, after: str = None):
     try:
-        # Exclude the MongoDB internal _id field
-        users = list(db.users.find({}, {"_id": 0}))
+        users = await fetch_page(
+            db.users, projection=PUBLIC_USER_PROJECTION, limit=limit, after=after
+        )
 
         for user in users:
+            # Exclude the MongoDB internal _id field, it only drives paging
+            user.pop("_id", None)
             user["id"] = str(user["id"])  # Convert the ObjectId to a string
         return users
+    except HTTPException as e:
+        raise e
     except PyMongoError as e:
         raise HTTPException(
             status_code=500,
@@ -48,3 +56,18 @@ def get_all_users():
             status_code=500,
             detail="An unexpected error occurred: " + str(e)
         )
+
+
+async def iter_users():
+    """_summary_
+    Yield every user in _id order, reading the cursor batch by batch instead
+    of loading the whole collection.
+    """
+    cursor = db.users.find(
+        {}, {"_id": 0, **PUBLIC_USER_PROJECTION}
+    ).sort("_id", 1).batch_size(
+        STREAM_BATCH_SIZE
+    )
+    async for user in cursor:
+        user["id"] = str(user["id"])
+        yield user
@@ -0,0 +1,71 @@
+# batch_join.py
+"""In-memory joins over batched lookups.
+
+Instead of one find_one per row, collect the keys of every row, fetch each
+related collection once with $in and attach the documents to the rows.
+"""
+from typing import Callable, Dict, Iterable, List, Union
+
+
+async def fetch_by_keys(
+    collection,
+    keys: Iterable,
+    field: str = "id",
+    projection: Dict = None
+) -> Dict:
+    """_summary_
+    Fetch every document whose field is one of keys with a single $in query.
+    Args:
+        collection (AsyncCollection): collection to read
+        keys (Iterable): values to look up, duplicates and None are ignored
+        field (str): field the keys refer to
+        projection (Dict): projection of the documents, must keep field
+    Returns:
+        Dict: documents keyed by field, with ``_id`` converted to string
+    """
+    keys = list({key for key in keys if key is not None})
+    if not keys:
+        return {}
+    documents = {}
+    async for document in collection.find({field: {"$in": keys}}, projection):
+        if "_id" in document:
+            document["_id"] = str(document["_id"])
+        documents[document[field]] = document
+    return documents
+
+
+async def join_related(
+    rows: List[dict],
+    collection,
+    key: Union[str, Callable],
+    as_field: str,
+    field: str = "id",
+    known: Dict = None,
+    projection: Dict = None
+) -> Dict:
+    """_summary_
+    Attach to each row the document of collection whose field matches the
+    row's key, fetching all of them in one query.
+    Args:
+        rows (List[dict]): rows to enrich in place
+        collection (AsyncCollection): related collection
+        key (str | Callable): field of the row holding the key, or a function
+            computing it (for keys reached through another joined document)
+        as_field (str): row field receiving the related document
+        field (str): field of the related documents matched against the key
+        known (Dict): related documents already loaded, keyed by field; only
+            the keys missing from it are fetched
+        projection (Dict): projection of the related documents, must keep
+            field
+    Returns:
+        Dict: every related document used, keyed by field
+    """
+    key_of = key if callable(key) else (lambda row: row.get(key))
+    related = dict(known or {})
+    missing = {key_of(row) for row in rows} - set(related)
+    related.update(await fetch_by_keys(collection, missing, field, projection))
+    for row in rows:
+        document = related.get(key_of(row))
+        if document:
+            row[as_field] = document
+    return related
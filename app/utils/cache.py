@@ -0,0 +1,170 @@
+# cache.py
+"""Process-local cache with a time to live and a bounded size.
+
+Entries are kept in least recently used order: once the cache is full, adding
+an entry evicts the one used the longest time ago. Expired entries are dropped
+when they are read. Values are deep copied in and out, so callers may modify
+what they get without changing the cached copy.
+
+An entry may carry a version: storing an older version than the one cached is
+ignored, so writes completing out of order cannot bring back stale data. An
+entry can also memoize a tag derived from its value, such as an HTTP ETag,
+computed once per stored value.
+"""
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class _Entry:
+    __slots__ = ("expires_at", "version", "value", "tag")
+
+    def __init__(self, expires_at: Optional[float], version: Optional[int], value):
+        self.expires_at = expires_at
+        self.version = version
+        self.value = value
+        self.tag = None
+
+
+class TTLCache:
+    """_summary_
+    Bounded LRU cache whose entries expire ttl seconds after being stored.
+    Args:
+        max_size (int): entries kept at most
+        ttl (float): seconds an entry stays valid, None for no expiry
+        clock (callable): monotonic time source, replaceable in tests
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: Optional[float] = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= self.clock():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """_summary_
+        Return a copy of the value stored for key, or default when it is
+        missing or expired.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry.value)
+
+    def version(self, key: Hashable) -> Optional[int]:
+        """_summary_
+        Version of the entry cached for key, None when there is no entry or
+        it was stored without a version. Does not count as a lookup.
+        """
+        entry = self._lookup(key)
+        return None if entry is None else entry.version
+
+    def tag(self, key: Hashable, compute: Callable[[Any], str]) -> Optional[str]:
+        """_summary_
+        Tag of the value cached for key, computed by compute the first time
+        it is asked for and kept until the value is replaced. Does not count
+        as a lookup.
+        Returns:
+            str: the tag, None when nothing is cached for key
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        if entry.tag is None:
+            entry.tag = compute(entry.value)
+        return entry.tag
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None):
+        """_summary_
+        Store value for key. With a version, the value is dropped if the
+        cached entry has a higher one.
+        Returns:
+            bool: whether the value was stored
+        """
+        cached_version = self.version(key)
+        if (
+            version is not None and cached_version is not None
+            and version < cached_version
+        ):
+            return False
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        self._entries[key] = _Entry(expires_at, version, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        version: Callable[[Any], Optional[int]] = None
+    ) -> Any:
+        """_summary_
+        Return the cached value for key, calling loader and storing its result
+        on a miss. A None result is returned but not cached, so a document
+        that does not exist yet is looked up again next time.
+        Args:
+            key (Hashable): cache key
+            loader (callable): coroutine function producing the value
+            version (callable): gives the version of a loaded value, for
+                values written concurrently with the load
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return copy.deepcopy(entry.value)
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            self.set(key, value, version(value) if version else None)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -3,6 +3,12 @@ class SubscriptionNotificationChannel:
     SMS = "sms"
 
 
+class NotificationEvent:
+    SUBSCRIPTION_CREATED = "subscription_created"
+    SUBSCRIPTION_CANCELLED = "subscription_cancelled"
+    ANNOUNCEMENT = "announcement"
+
+
 class FundStatus:
     ACTIVE = "active"
     INACTIVE = "inactive"
@@ -28,6 +34,19 @@ class SubscriptionError:
         "No existe el fondo para realizar la suscripción"
     )
     ERROR_USER_DOEES_NOT_EXIST = "El usuario no existe"
+    ERROR_SUBSCRIPTION_ALREADY_CANCELLED = "La suscripción ya está cancelada"
+    ERROR_SUBSCRIPTION_DOES_NOT_EXIST = "Subscription does not exist"
+    ERROR_BULK_TOO_LARGE = "El lote supera el número máximo de elementos"
+
+
+class AnnouncementStatus:
+    RUNNING = "running"
+    COMPLETED = "completed"
+
+
+class AnnouncementError:
+    ERROR_FUND_DOES_NOT_EXIST = "El fondo no existe"
+    ERROR_ANNOUNCEMENT_DOES_NOT_EXIST = "El anuncio no existe"
 
 
 class DataBaseError:
@@ -38,3 +57,12 @@ class SuccessMessage:
     SUCCESS_SUBSCRIPTION = "Suscripción realizada con éxito"
     SUCCESS_TRANSACTION = "Transacción completada con éxito"
     SUCCESS_SUBSCRIPTION_CANCELLATION = "Suscripción cancelada con éxito"
+
+
+class PaginationError:
+    ERROR_INVALID_CURSOR = "El cursor de paginación no es válido"
+
+
+class AdminError:
+    ERROR_ADMIN_DISABLED = "Not Found"
+    ERROR_INVALID_ADMIN_TOKEN = "Token de administración no válido"
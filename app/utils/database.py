@@ -1,15 +1,144 @@
 
-from pymongo import MongoClient
-from dotenv import load_dotenv
 import os
+import threading
+
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient
+
+from app.utils.in_memory_database import IN_MEMORY_SCHEME, InMemoryAsyncClient
+from app.utils.metrics import command_metrics
+from app.utils.query_accounting import query_accounting
+from app.utils.slow_queries import slow_query_log
 
 load_dotenv()
 
+# Process-wide client shared by every service and repository
+_client = None
+_client_lock = threading.Lock()
+
+
+def _int_env(name: str, default: int = None):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def get_client_options() -> dict:
+    """_summary_
+    Build the client keyword arguments from the environment.
+    Pool sizes, timeouts and wire compression can be tuned per deployment
+    without code changes; unset variables fall back to the driver defaults.
+    Returns:
+        dict: keyword arguments for AsyncMongoClient
+    """
+    options = {
+        "maxPoolSize": _int_env("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _int_env("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "connectTimeoutMS": _int_env("MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "socketTimeoutMS": _int_env("MONGO_SOCKET_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _int_env(
+            "MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000
+        ),
+    }
+    compressors = os.getenv("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def get_client():
+    """_summary_
+    Return the process-wide async client, creating it on first use.
+    The client owns the connection pool and the monitor tasks, so it must
+    be shared instead of being created per module or per request.
+    A CONNECTION_URL starting with mongomock:// selects the in-process
+    stand-in used by the tests and the benchmarks. Every command is timed
+    by the listener behind GET /metrics, counted in its request's
+    X-DB-Queries header and, when slow, kept for GET /admin/slow-queries.
+    Returns:
+        AsyncMongoClient: the shared client
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                connection_url = os.getenv("CONNECTION_URL")
+                client_class = AsyncMongoClient
+                if connection_url and connection_url.startswith(IN_MEMORY_SCHEME):
+                    client_class = InMemoryAsyncClient
+                _client = client_class(
+                    connection_url,
+                    event_listeners=[
+                        command_metrics, query_accounting, slow_query_log
+                    ],
+                    **get_client_options()
+                )
+                slow_query_log.bind(_client)
+    return _client
+
+
+async def close_client():
+    """_summary_
+    Close the shared client and release its pool and monitor tasks.
+    pymongo raises InvalidOperation on any use of a closed client, so the
+    singleton is dropped and the next get_client() opens a new one; the
+    handles returned by shared_db() and shared_collection() follow it.
+    """
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        slow_query_log.bind(None)
+        await client.close()
+
 
 def connect_db():
-    connection_url = os.getenv("CONNECTION_URL")
+    """_summary_
+    Borrow the configured database from the shared client.
+    Returns:
+        AsyncDatabase: the application database
+    """
     connection_database = os.getenv("CONNECTION_DATABASE")
+    return get_client()[connection_database]
+
+
+class _SharedHandle:
+    """_summary_
+    Database or collection of the shared client, resolved again on every
+    use so that a module-level handle outlives close_client().
+    Args:
+        resolve (Callable): returns the current database or collection
+    """
+    __slots__ = ("_resolve",)
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+
+def shared_db():
+    """_summary_
+    Handle on the configured database for module-level use: each access is
+    resolved through connect_db() at call time, never at import time.
+    Returns:
+        _SharedHandle: behaves as the application AsyncDatabase
+    """
+    return _SharedHandle(connect_db)
+
 
-    client = MongoClient(connection_url)
-    db = client[connection_database]
-    return db
+def shared_collection(name: str):
+    """_summary_
+    Handle on one collection of the configured database, resolved at call
+    time like shared_db().
+    Returns:
+        _SharedHandle: behaves as the AsyncCollection
+    """
+    return _SharedHandle(lambda: connect_db()[name])
@@ -0,0 +1,88 @@
+# etag.py
+"""Conditional GET with strong ETags.
+
+The ETag of a response is a hash of its JSON content. Cached repositories
+memoize it on the cache entry, once per stored value. A request whose
+If-None-Match matches a cached entry is answered 304 from memory, with no
+query and no serialization. ETags depend only on the content, so every
+worker computes the same one for the same data.
+"""
+import hashlib
+import json
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+def compute_etag(content) -> str:
+    """_summary_
+    Strong ETag of a response body. The cursor of a page is part of it,
+    since it is sent along with the page.
+    """
+    if hasattr(content, "next_cursor"):
+        content = {"items": list(content), "next_cursor": content.next_cursor}
+    body = json.dumps(
+        jsonable_encoder(content),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, W/ prefixes are ignored
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in header.split(",")
+    )
+
+
+def _set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+
+
+def _not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status_code=304)
+    _set_cache_headers(response, etag, cache_control)
+    return response
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    known_etag: Callable[[], Optional[str]],
+    load: Callable[[], Awaitable],
+    cache_control: str = "no-cache"
+):
+    """_summary_
+    Answer a GET with 304 Not Modified when If-None-Match matches the ETag of
+    the content, or with the content and its ETag otherwise.
+    Args:
+        request (Request): the request
+        response (Response): response whose headers receive ETag and
+            Cache-Control
+        known_etag (callable): ETag of the content if known without loading
+            it, as from a cache entry, None otherwise
+        load (callable): coroutine function producing the content
+        cache_control (str): Cache-Control header value
+    Returns:
+        the content, or a 304 response
+    """
+    etag = known_etag()
+    if etag_matches(request, etag):
+        return _not_modified(etag, cache_control)
+    content = await load()
+    etag = known_etag() or compute_etag(content)
+    if etag_matches(request, etag):
+        return _not_modified(etag, cache_control)
+    _set_cache_headers(response, etag, cache_control)
+    return content
@@ -0,0 +1,542 @@
+# in_memory_database.py
+"""In-process stand-in for pymongo's AsyncMongoClient, backed by mongomock.
+
+database.get_client() returns it when CONNECTION_URL starts with
+``mongomock://`` so the API, the tests and the benchmarks can run without a
+MongoDB server. Every collection call publishes the same command events as
+the real driver to the ``event_listeners`` given to the client, which keeps
+query accounting comparable between the stand-in and Atlas.
+"""
+import itertools
+import time
+
+from pymongo import (
+    DeleteMany,
+    DeleteOne,
+    InsertOne,
+    ReplaceOne,
+    UpdateMany,
+    UpdateOne
+)
+from pymongo.errors import PyMongoError
+
+try:
+    import mongomock
+except ImportError:  # pragma: no cover - only needed for mongomock:// URLs
+    mongomock = None
+
+IN_MEMORY_SCHEME = "mongomock://"
+
+# MongoDB returns this many documents in the first batch of a cursor
+DEFAULT_FIRST_BATCH_SIZE = 101
+
+_request_ids = itertools.count(1)
+
+_BULK_COMMAND_NAMES = {
+    InsertOne: "insert",
+    UpdateOne: "update",
+    UpdateMany: "update",
+    ReplaceOne: "update",
+    DeleteOne: "delete",
+    DeleteMany: "delete",
+}
+
+
+def _own_projection(projection):
+    # mongomock adds ``_id`` to the projection it is given, the driver leaves
+    # it alone: shared projection constants must not change between calls
+    return dict(projection) if isinstance(projection, dict) else projection
+
+
+class CommandEvent:
+    """Mirror of pymongo's command monitoring events."""
+
+    def __init__(self, command_name: str, command: dict, database_name: str,
+                 request_id: int, duration_micros: int = None,
+                 reply: dict = None, failure: dict = None):
+        self.command_name = command_name
+        self.command = command
+        self.database_name = database_name
+        self.request_id = request_id
+        self.operation_id = request_id
+        self.connection_id = ("in-memory", 0)
+        self.server_connection_id = None
+        self.service_id = None
+        self.duration_micros = duration_micros
+        self.reply = reply
+        self.failure = failure
+
+
+class InMemoryAsyncClient:
+    """_summary_
+    Async facade over a mongomock client with the subset of the
+    AsyncMongoClient API used by the application.
+    """
+
+    def __init__(self, host: str = None, event_listeners=None, **kwargs):
+        if mongomock is None:
+            raise ImportError(
+                "mongomock is required to use a mongomock:// CONNECTION_URL"
+            )
+        self.host = host
+        self.event_listeners = list(event_listeners or [])
+        self._client = mongomock.MongoClient()
+
+    def __getitem__(self, name: str):
+        return InMemoryAsyncDatabase(self, self._client[name])
+
+    def get_database(self, name: str):
+        return self[name]
+
+    async def close(self):
+        pass
+
+    def _run(self, database_name: str, command_name: str, command: dict,
+             operation, reply=None):
+        """_summary_
+        Execute one mongomock call as a single round trip, publishing
+        started/succeeded/failed events around it.
+        Args:
+            operation (callable): the synchronous mongomock call
+            reply (callable): builds the server-style reply from the result
+        """
+        request_id = next(_request_ids)
+        for listener in self.event_listeners:
+            listener.started(CommandEvent(
+                command_name, command, database_name, request_id
+            ))
+        start = time.perf_counter()
+        try:
+            result = operation()
+        except PyMongoError as error:
+            duration = int((time.perf_counter() - start) * 1_000_000)
+            for listener in self.event_listeners:
+                listener.failed(CommandEvent(
+                    command_name, command, database_name, request_id,
+                    duration_micros=duration,
+                    failure={"errmsg": str(error), "ok": 0}
+                ))
+            raise
+        duration = int((time.perf_counter() - start) * 1_000_000)
+        event_reply = reply(result) if reply else {"ok": 1}
+        for listener in self.event_listeners:
+            listener.succeeded(CommandEvent(
+                command_name, command, database_name, request_id,
+                duration_micros=duration, reply=event_reply
+            ))
+        return result
+
+
+class InMemoryAsyncDatabase:
+    def __init__(self, client: InMemoryAsyncClient, database):
+        self.client = client
+        self._database = database
+        self.name = database.name
+
+    def __getitem__(self, name: str):
+        return InMemoryAsyncCollection(self, self._database[name])
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str):
+        return self[name]
+
+    async def list_collection_names(self):
+        return self.client._run(
+            self.name, "listCollections", {"listCollections": 1},
+            self._database.list_collection_names
+        )
+
+    async def command(self, command, **kwargs):
+        if isinstance(command, str):
+            command = {command: 1}
+        command_name = next(iter(command))
+        if command_name == "ping":
+            return self.client._run(
+                self.name, "ping", command, lambda: {"ok": 1.0}
+            )
+        if command_name == "explain":
+            return self.client._run(
+                self.name, "explain", command,
+                lambda: self._explain(command["explain"])
+            )
+        raise NotImplementedError(
+            f"Command {command_name} is not supported by the in-memory database"
+        )
+
+    def _explain(self, command: dict) -> dict:
+        """_summary_
+        Imitate the queryPlanner output of explain. The plan is an IXSCAN
+        on the index whose leading fields the filter, or else the sort,
+        uses most (a partial index only when the filter has its fields), and
+        a COLLSCAN otherwise. There is no cost model: it tells indexed
+        queries from collection scans, nothing more.
+        """
+        command_name = next(iter(command))
+        collection_name = command[command_name]
+        query, sort = _explained_query(command_name, command)
+        best, best_length = None, 0
+        indexes = self._database[collection_name].index_information()
+        for name, index in indexes.items():
+            fields = [field for field, _ in index["key"]]
+            partial = index.get("partialFilterExpression") or {}
+            if not all(field in query for field in partial):
+                continue
+            length = 0
+            while length < len(fields) and fields[length] in query:
+                length += 1
+            if length == 0 and sort and next(iter(sort)) == fields[0]:
+                length = 1
+            if length > best_length:
+                best, best_length = name, length
+        if best is None:
+            plan = {"stage": "COLLSCAN", "filter": query, "direction": "forward"}
+        else:
+            plan = {"stage": "FETCH", "inputStage": {
+                "stage": "IXSCAN",
+                "indexName": best,
+                "keyPattern": dict(indexes[best]["key"]),
+            }}
+        return {
+            "queryPlanner": {
+                "namespace": f"{self.name}.{collection_name}",
+                "parsedQuery": query,
+                "winningPlan": plan,
+            },
+            "ok": 1.0,
+        }
+
+
+def _explained_query(command_name: str, command: dict):
+    """Filter and sort of an explained command."""
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        query = pipeline[0].get("$match") or {}
+        sort = next(
+            (stage["$sort"] for stage in pipeline[:2] if "$sort" in stage), None
+        )
+        return query, sort
+    if command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        return statements[0].get("q") or {}, None
+    if command_name in ("findAndModify", "count", "distinct"):
+        return command.get("query") or {}, command.get("sort")
+    return command.get("filter") or {}, command.get("sort")
+
+
+class InMemoryAsyncCollection:
+    def __init__(self, database: InMemoryAsyncDatabase, collection):
+        self.database = database
+        self._collection = collection
+        self.name = collection.name
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _run(self, command_name: str, command: dict, operation, reply=None):
+        command = {command_name: self.name, **command}
+        return self.database.client._run(
+            self.database.name, command_name, command, operation, reply
+        )
+
+    def find(self, filter=None, projection=None, skip=0, limit=0, sort=None,
+             batch_size=0, **kwargs):
+        return InMemoryAsyncCursor(
+            self, filter or {}, projection, skip=skip, limit=limit,
+            sort=sort, batch_size=batch_size
+        )
+
+    async def find_one(self, filter=None, *args, **kwargs):
+        async for document in self.find(filter, *args, **kwargs).limit(-1):
+            return document
+        return None
+
+    async def insert_one(self, document: dict, **kwargs):
+        return self._run(
+            "insert", {"documents": [document]},
+            lambda: self._collection.insert_one(document),
+            lambda result: {"n": 1, "ok": 1}
+        )
+
+    async def insert_many(self, documents, ordered: bool = True, **kwargs):
+        documents = list(documents)
+        return self._run(
+            "insert", {"documents": documents, "ordered": ordered},
+            lambda: self._collection.insert_many(documents, ordered=ordered),
+            lambda result: {"n": len(result.inserted_ids), "ok": 1}
+        )
+
+    async def update_one(self, filter, update, upsert: bool = False, **kwargs):
+        return self._run(
+            "update", {"updates": [{"q": filter, "u": update, "upsert": upsert}]},
+            lambda: self._collection.update_one(filter, update, upsert=upsert),
+            lambda result: {"n": result.matched_count, "ok": 1}
+        )
+
+    async def update_many(self, filter, update, upsert: bool = False, **kwargs):
+        return self._run(
+            "update",
+            {"updates": [{"q": filter, "u": update, "multi": True}]},
+            lambda: self._collection.update_many(filter, update, upsert=upsert),
+            lambda result: {"n": result.matched_count, "ok": 1}
+        )
+
+    async def replace_one(self, filter, replacement, upsert: bool = False,
+                          **kwargs):
+        return self._run(
+            "update", {"updates": [{"q": filter, "u": replacement}]},
+            lambda: self._collection.replace_one(
+                filter, replacement, upsert=upsert
+            ),
+            lambda result: {"n": result.matched_count, "ok": 1}
+        )
+
+    async def delete_one(self, filter, **kwargs):
+        return self._run(
+            "delete", {"deletes": [{"q": filter, "limit": 1}]},
+            lambda: self._collection.delete_one(filter),
+            lambda result: {"n": result.deleted_count, "ok": 1}
+        )
+
+    async def delete_many(self, filter, **kwargs):
+        return self._run(
+            "delete", {"deletes": [{"q": filter, "limit": 0}]},
+            lambda: self._collection.delete_many(filter),
+            lambda result: {"n": result.deleted_count, "ok": 1}
+        )
+
+    async def find_one_and_update(self, filter, update, projection=None,
+                                  sort=None, upsert: bool = False,
+                                  return_document: bool = False, **kwargs):
+        return self._run(
+            "findAndModify",
+            {"query": filter, "update": update, "sort": sort, "new": return_document},
+            lambda: self._collection.find_one_and_update(
+                filter, update, projection=_own_projection(projection), sort=sort,
+                upsert=upsert, return_document=return_document
+            ),
+            lambda result: {"value": result, "ok": 1}
+        )
+
+    async def bulk_write(self, requests, ordered: bool = True, **kwargs):
+        requests = list(requests)
+        command_names = {
+            _BULK_COMMAND_NAMES.get(type(request), "update") for request in requests
+        }
+        command_name = command_names.pop() if len(command_names) == 1 else "bulkWrite"
+        return self._run(
+            command_name, {"ops": len(requests), "ordered": ordered},
+            lambda: self._collection.bulk_write(requests, ordered=ordered),
+            lambda result: {"n": len(requests), "ok": 1}
+        )
+
+    async def aggregate(self, pipeline, batch_size: int = 0, **kwargs):
+        pipeline = list(pipeline)
+        cursor = InMemoryAsyncCursor(
+            self, {}, None, batch_size=batch_size,
+            command_name="aggregate",
+            loader=lambda: list(self._collection.aggregate(pipeline)),
+            command={"pipeline": pipeline}
+        )
+        await cursor._fetch_first_batch()
+        return cursor
+
+    async def count_documents(self, filter, **kwargs):
+        return self._run(
+            "aggregate", {"pipeline": [{"$match": filter}, {"$count": "n"}]},
+            lambda: self._collection.count_documents(filter),
+            lambda result: {"cursor": {"firstBatch": [{"n": result}]}, "ok": 1}
+        )
+
+    async def estimated_document_count(self, **kwargs):
+        return self._run(
+            "count", {},
+            self._collection.estimated_document_count,
+            lambda result: {"n": result, "ok": 1}
+        )
+
+    async def distinct(self, key: str, filter=None, **kwargs):
+        return self._run(
+            "distinct", {"key": key, "query": filter},
+            lambda: self._collection.distinct(key, filter),
+            lambda result: {"values": result, "ok": 1}
+        )
+
+    async def create_index(self, keys, **kwargs):
+        return self._run(
+            "createIndexes", {"indexes": [{"key": keys, **kwargs}]},
+            lambda: self._collection.create_index(keys, **kwargs)
+        )
+
+    async def create_indexes(self, indexes, **kwargs):
+        documents = [dict(index.document) for index in indexes]
+        return self._run(
+            "createIndexes", {"indexes": documents},
+            lambda: self._create_indexes(documents)
+        )
+
+    def _create_indexes(self, documents) -> list:
+        # mongomock's own create_indexes drops options such as
+        # partialFilterExpression, create them one by one instead
+        names = []
+        for document in documents:
+            options = {
+                option: value for option, value in document.items()
+                if option not in ("key", "v")
+            }
+            names.append(
+                self._collection.create_index(
+                    list(document["key"].items()), **options
+                )
+            )
+        return names
+
+    async def drop_index(self, index_or_name, **kwargs):
+        return self._run(
+            "dropIndexes", {"index": index_or_name},
+            lambda: self._collection.drop_index(index_or_name)
+        )
+
+    async def index_information(self, **kwargs):
+        return self._run(
+            "listIndexes", {},
+            self._collection.index_information
+        )
+
+    async def list_indexes(self, **kwargs):
+        cursor = InMemoryAsyncCursor(
+            self, {}, None, command_name="listIndexes",
+            loader=lambda: list(self._collection.list_indexes())
+        )
+        await cursor._fetch_first_batch()
+        return cursor
+
+    async def drop(self, **kwargs):
+        return self._run("drop", {}, self._collection.drop)
+
+
+class InMemoryAsyncCursor:
+    """_summary_
+    Async cursor that replays MongoDB batching: the first fetch is a
+    ``find`` (or ``aggregate``) round trip and every further batch is a
+    ``getMore``.
+    """
+
+    def __init__(self, collection: InMemoryAsyncCollection, filter: dict,
+                 projection, skip: int = 0, limit: int = 0, sort=None,
+                 batch_size: int = 0, command_name: str = "find",
+                 loader=None, command: dict = None):
+        self.collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._skip = skip
+        self._limit = limit
+        self._sort = sort
+        self._batch_size = batch_size
+        self._command_name = command_name
+        self._loader = loader
+        self._command = command or {}
+        self._results = None
+        self._position = 0
+        self._delivered = 0
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction or 1)]
+        self._sort = list(key_or_list)
+        return self
+
+    def skip(self, skip: int):
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int):
+        self._batch_size = batch_size
+        return self
+
+    def _load(self):
+        if self._loader is not None:
+            return self._loader()
+        return list(self.collection._collection.find(
+            self._filter, _own_projection(self._projection), skip=self._skip,
+            limit=abs(self._limit), sort=self._sort
+        ))
+
+    def _command_document(self) -> dict:
+        if self._command_name != "find":
+            return self._command
+        return {
+            "filter": self._filter,
+            "projection": self._projection,
+            "sort": dict(self._sort) if self._sort else None,
+            "skip": self._skip,
+            "limit": self._limit,
+            "batchSize": self._batch_size,
+        }
+
+    def _next_batch_size(self) -> int:
+        if self._batch_size:
+            return self._batch_size
+        if self._results is None:
+            return DEFAULT_FIRST_BATCH_SIZE
+        return len(self._results)
+
+    async def _fetch_first_batch(self):
+        size = self._next_batch_size()
+        results = self.collection._run(
+            self._command_name, self._command_document(), self._load,
+            lambda results: {
+                "cursor": {"firstBatch": results[:size]}, "ok": 1
+            }
+        )
+        self._results = results
+        self._position = min(size, len(results))
+
+    async def _fetch_next_batch(self):
+        size = self._next_batch_size()
+        start = self._position
+        self.collection._run(
+            "getMore", {"getMore": 0, "collection": self.collection.name},
+            lambda: None,
+            lambda _: {
+                "cursor": {"nextBatch": self._results[start:start + size]},
+                "ok": 1
+            }
+        )
+        self._position = min(start + size, len(self._results))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._results is None:
+            await self._fetch_first_batch()
+        if self._delivered >= len(self._results):
+            raise StopAsyncIteration
+        if self._delivered >= self._position:
+            await self._fetch_next_batch()
+        document = self._results[self._delivered]
+        self._delivered += 1
+        return document
+
+    async def next(self):
+        return await self.__anext__()
+
+    async def to_list(self, length: int = None):
+        documents = []
+        async for document in self:
+            documents.append(document)
+            if length and len(documents) >= length:
+                break
+        return documents
+
+    async def close(self):
+        self._results = self._results or []
+        self._delivered = len(self._results)
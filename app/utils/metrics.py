@@ -0,0 +1,224 @@
+# metrics.py
+"""Prometheus metrics of the application, served by GET /metrics.
+
+- ``MetricsMiddleware`` times every request by route template (``/funds/{id}``,
+  not the raw path, so the label set stays bounded) and counts the requests
+  in flight.
+- ``CommandMetrics`` is a pymongo CommandListener registered on the shared
+  client; it times every command by collection and command name.
+- ``track_notification`` and ``record_notification_batch`` time the sends of
+  each notification channel and count their failures.
+- The threadpool gauges are read when the metrics are scraped.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from anyio import to_thread
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    PlatformCollector,
+    ProcessCollector
+)
+from pymongo import monitoring
+from starlette.routing import Match
+
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+PlatformCollector(registry=registry)
+
+UNMATCHED_ROUTE = "unmatched"
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, by route template",
+    ["method", "route", "status"],
+    registry=registry
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests being answered",
+    ["method", "route"],
+    registry=registry
+)
+threadpool_threads = Gauge(
+    "threadpool_threads",
+    "Threads the request threadpool may use",
+    registry=registry
+)
+threadpool_threads_in_use = Gauge(
+    "threadpool_threads_in_use",
+    "Threads of the request threadpool running sync endpoints and dependencies",
+    registry=registry
+)
+threadpool_tasks_waiting = Gauge(
+    "threadpool_tasks_waiting",
+    "Calls waiting for a free thread of the request threadpool",
+    registry=registry
+)
+mongodb_command_duration = Histogram(
+    "mongodb_command_duration_seconds",
+    "Time of MongoDB commands, by collection and command",
+    ["collection", "command"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+    registry=registry
+)
+mongodb_command_failures = Counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that failed, by collection and command",
+    ["collection", "command"],
+    registry=registry
+)
+notification_send_duration = Histogram(
+    "notification_send_duration_seconds",
+    "Time to send one notification, by channel",
+    ["channel"],
+    registry=registry
+)
+notification_failures = Counter(
+    "notification_failures_total",
+    "Notifications that could not be sent, by channel",
+    ["channel"],
+    registry=registry
+)
+
+
+def _route(scope: dict) -> str:
+    """Template of the route matching the request, resolved before routing so
+    the in-flight gauge has the same labels as the histogram."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """_summary_
+    ASGI middleware timing the HTTP requests.
+    Args:
+        app (ASGIApp): the wrapped application
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = _route(scope)
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            http_request_duration.labels(method, route, status[0]).observe(
+                time.perf_counter() - started
+            )
+
+
+def _collection(event) -> str:
+    value = event.command.get(event.command_name)
+    if event.command_name == "getMore":
+        value = event.command.get("collection")
+    return value if isinstance(value, str) else ""
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """_summary_
+    Command listener feeding the MongoDB histograms. The succeeded and failed
+    events do not carry the command, so the collection is kept from the
+    started event until then.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        with self._lock:
+            self._pending[self._key(event)] = _collection(event)
+
+    def _finish(self, event) -> str:
+        with self._lock:
+            collection = self._pending.pop(self._key(event), "")
+        mongodb_command_duration.labels(collection, event.command_name).observe(
+            event.duration_micros / 1_000_000
+        )
+        return collection
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        mongodb_command_failures.labels(collection, event.command_name).inc()
+
+
+command_metrics = CommandMetrics()
+
+
+@contextmanager
+def track_notification(channel: str):
+    """_summary_
+    Time one send through a channel, counting it as failed if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        notification_failures.labels(channel).inc()
+        raise
+    finally:
+        notification_send_duration.labels(channel).observe(
+            time.perf_counter() - started
+        )
+
+
+def record_notification_batch(channel: str, seconds: float, errors: list):
+    """_summary_
+    Record a batch sent through a channel: its time is split evenly among
+    its messages and every error counts as a failure.
+    Args:
+        errors (list): None for each message sent, the error for each failed one
+    """
+    if not errors:
+        return
+    histogram = notification_send_duration.labels(channel)
+    for _ in errors:
+        histogram.observe(seconds / len(errors))
+    failed = sum(error is not None for error in errors)
+    if failed:
+        notification_failures.labels(channel).inc(failed)
+
+
+def update_threadpool_gauges():
+    """_summary_
+    Read the usage of the threadpool running sync endpoints and dependencies;
+    call from the event loop.
+    """
+    limiter = to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    threadpool_threads.set(limiter.total_tokens)
+    threadpool_threads_in_use.set(statistics.borrowed_tokens)
+    threadpool_tasks_waiting.set(statistics.tasks_waiting)
@@ -0,0 +1,56 @@
+# channel_registry.py
+"""Notification channels created once per process.
+
+Building a channel is expensive: the SMS channel creates a boto3 client and
+the email channel reads its settings and attaches to an SMTP pool. The
+registry builds each channel the first time it is asked for and hands the
+same instance to every later caller, from any thread. ``reload`` drops the
+instances so the next call builds them again, for example after the
+settings changed; ``shutdown`` also closes their clients.
+"""
+import threading
+from typing import Callable, Dict
+
+from .notification_base import NotificationBase
+
+
+class ChannelRegistry:
+    """_summary_
+    Lazily built, shared notification channels.
+    Args:
+        builders (dict): method name to a callable building its channel
+    """
+
+    def __init__(self, builders: Dict[str, Callable[[], NotificationBase]]):
+        self.builders = dict(builders)
+        self._channels: Dict[str, NotificationBase] = {}
+        self._lock = threading.Lock()
+
+    def get(self, method: str) -> NotificationBase:
+        channel = self._channels.get(method)
+        if channel is not None:
+            return channel
+        if method not in self.builders:
+            raise ValueError(f"Notification method {method} not supported")
+        with self._lock:
+            # Another thread may have built it while this one waited
+            channel = self._channels.get(method)
+            if channel is None:
+                channel = self._channels[method] = self.builders[method]()
+            return channel
+
+    def reload(self):
+        """_summary_
+        Close the current channels; the next get builds new ones. The email
+        channel also drops its SMTP pool, so new settings take effect.
+        """
+        with self._lock:
+            channels, self._channels = self._channels, {}
+        for channel in channels.values():
+            channel.close()
+
+    def shutdown(self):
+        """_summary_
+        Close the channels and their clients, at process exit.
+        """
+        self.reload()
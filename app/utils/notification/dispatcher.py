@@ -0,0 +1,73 @@
+# dispatcher.py
+"""Delivery of one notification through its channel, off the event loop.
+
+The SMTP and SNS clients block, so ``deliver`` sends in a thread. Queuing,
+retries and failed messages are kept by the persistent outbox
+(app/utils/notification/outbox.py), which calls ``deliver`` for every entry
+it claims; the dispatcher only keeps the send counts and latencies served by
+GET /notifications/metrics.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from .notification_factory import NotificationFactory
+
+# Send latencies kept for the percentiles of stats()
+LATENCY_WINDOW = 1000
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class NotificationDispatcher:
+    """_summary_
+    Send notifications through their channel, measuring every send.
+    Args:
+        get_channel (callable): returns the channel for a method
+    """
+
+    def __init__(self, get_channel: Callable = NotificationFactory.get_notification):
+        self.get_channel = get_channel
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.sent = 0
+        self.failed = 0
+
+    async def deliver(self, method: str, to: str, subject: str, body: str):
+        """_summary_
+        Send one message now, in a thread, counting it in the metrics.
+        Raises:
+            Exception: whatever the channel raised
+        """
+        started = time.perf_counter()
+        try:
+            channel = self.get_channel(method)
+            await asyncio.to_thread(channel.send_notification, to, subject, body)
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            self.sent += 1
+        finally:
+            self._latencies.append(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        latencies = list(self._latencies)
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "send_latency_seconds": {
+                "count": len(latencies),
+                "p50": _percentile(latencies, 0.5),
+                "p99": _percentile(latencies, 0.99),
+                "max": max(latencies) if latencies else None,
+            },
+        }
+
+
+notification_dispatcher = NotificationDispatcher()
@@ -1,36 +1,72 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from .notification_base import NotificationBase
+import os
+import time
+from typing import List, Optional, Tuple
+
+from app.utils.constants import SubscriptionNotificationChannel
+from app.utils.metrics import record_notification_batch, track_notification
+from .notification_base import NotificationBase, NotificationError
+from .smtp_pool import SMTPPool, get_pool, release_pool
 
 
 class EmailNotification(NotificationBase):
     """_summary_
-    Send email notifications using SMTP
+    Send email notifications using SMTP, over the sessions of the pool shared
+    by every EmailNotification of the same server and account.
+    SMTP_POOL_SIZE, SMTP_IDLE_TIMEOUT_SECONDS and SMTP_STARTTLS tune the pool.
     Args:
         NotificationBase (_type_): _description_
     """
-    def __init__(self, smtp_server: str, smtp_port: int, username: str, password: str):
+    def __init__(
+        self,
+        smtp_server: str,
+        smtp_port: int,
+        username: str,
+        password: str,
+        pool: Optional[SMTPPool] = None
+    ):
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.username = username
         self.password = password
+        self.pool = pool or get_pool(
+            smtp_server, smtp_port, username, password,
+            size=int(os.getenv("SMTP_POOL_SIZE", "4")),
+            idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "60")),
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+        )
 
-    def send_notification(self, to: str, subject: str, body: str):
-        msg = MIMEMultipart()
-        msg["From"] = self.username
-        msg["To"] = to
-        msg["Subject"] = subject
+    def close(self):
+        # Evicted, not only closed: a channel rebuilt after the credentials
+        # changed must not get the sessions of the old ones
+        release_pool(self.pool)
 
-        msg.attach(MIMEText(body, "plain"))
+    def send_notification(self, to: str, subject: str, body: str):
+        with track_notification(SubscriptionNotificationChannel.EMAIL):
+            try:
+                self.pool.send(to, subject, body)
+            except Exception as e:
+                raise NotificationError(f"Failed to send email: {e}") from e
 
+    def send_notifications(
+        self,
+        messages: List[Tuple[str, str, str]]
+    ) -> List[Optional[Exception]]:
+        """_summary_
+        Send (to, subject, body) messages over one authenticated session.
+        Returns:
+            list: None for each message sent, a NotificationError for each
+            failed one
+        """
+        started = time.perf_counter()
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.username, self.password)
-            text = msg.as_string()
-            server.sendmail(self.username, to, text)
-            server.quit()
-            print("Email sent successfully")
+            errors = [
+                NotificationError(f"Failed to send email: {error}") if error else None
+                for error in self.pool.send_many(messages)
+            ]
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            errors = [NotificationError(f"Failed to send email: {e}")] * len(messages)
+        record_notification_batch(
+            SubscriptionNotificationChannel.EMAIL,
+            time.perf_counter() - started, errors
+        )
+        return errors
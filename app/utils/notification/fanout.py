@@ -0,0 +1,136 @@
+# fanout.py
+"""Sending one message to many recipients, channel by channel.
+
+Messages are grouped by channel and cut in chunks. Each chunk is sent in a
+thread through the channel's ``send_notifications``, which for email uses
+one pooled SMTP session per chunk. At most ``concurrency`` chunks are in
+flight, and each channel has its own rate limit in messages per second.
+
+FANOUT_CONCURRENCY, FANOUT_EMAIL_RATE, FANOUT_SMS_RATE, FANOUT_EMAIL_CHUNK
+and FANOUT_SMS_CHUNK tune the defaults; a rate of 0 means unlimited.
+"""
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.utils.constants import SubscriptionNotificationChannel
+from .notification_factory import NotificationFactory
+
+
+class RateLimiter:
+    """_summary_
+    Spread acquisitions so that on average at most rate units pass per
+    second. A large acquisition goes through at once and makes the next
+    ones wait for it.
+    Args:
+        rate (float): units per second, 0 for no limit
+        clock (callable): monotonic time source, replaceable in tests
+        sleep (callable): coroutine function waiting a number of seconds
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable = asyncio.sleep
+    ):
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self._next_free = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, count: int = 1):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = self.clock()
+            start = now if self._next_free is None else max(now, self._next_free)
+            self._next_free = start + count / self.rate
+            wait = start - now
+        if wait > 0:
+            await self.sleep(wait)
+
+
+class FanoutSender:
+    """_summary_
+    Send batches of messages through their channels with bounded concurrency
+    and per-channel rate limits. Build one per job, on the loop running it.
+    Args:
+        concurrency (int): chunks sent at once
+        rates (dict): messages per second per channel
+        chunk_sizes (dict): messages per send_notifications call per channel
+        get_channel (callable): returns the channel for a method
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        rates: Dict[str, float] = None,
+        chunk_sizes: Dict[str, int] = None,
+        get_channel: Callable = NotificationFactory.get_notification
+    ):
+        self.concurrency = concurrency
+        self.limiters = {
+            method: RateLimiter(rate) for method, rate in (rates or {}).items()
+        }
+        self.chunk_sizes = chunk_sizes or {}
+        self.get_channel = get_channel
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _send_chunk(self, method: str, chunk: List[Tuple[str, str, str]]):
+        limiter = self.limiters.get(method)
+        if limiter is not None:
+            await limiter.acquire(len(chunk))
+        async with self._semaphore:
+            try:
+                channel = self.get_channel(method)
+                return await asyncio.to_thread(channel.send_notifications, chunk)
+            except Exception as e:
+                return [e] * len(chunk)
+
+    async def send(
+        self,
+        messages: Dict[str, List[Tuple[str, str, str]]]
+    ) -> Tuple[int, int]:
+        """_summary_
+        Send (to, subject, body) messages grouped by channel.
+        Returns:
+            tuple: number of messages sent and number failed
+        """
+        chunks = []
+        for method, method_messages in messages.items():
+            size = max(1, self.chunk_sizes.get(method, 50))
+            chunks += [
+                (method, method_messages[start:start + size])
+                for start in range(0, len(method_messages), size)
+            ]
+        results = await asyncio.gather(*[
+            self._send_chunk(method, chunk) for method, chunk in chunks
+        ])
+        failed = sum(error is not None for errors in results for error in errors)
+        total = sum(len(chunk) for _, chunk in chunks)
+        return total - failed, failed
+
+
+def create_fanout_sender() -> FanoutSender:
+    return FanoutSender(
+        concurrency=int(os.getenv("FANOUT_CONCURRENCY", "8")),
+        rates={
+            SubscriptionNotificationChannel.EMAIL: float(
+                os.getenv("FANOUT_EMAIL_RATE", "50")
+            ),
+            SubscriptionNotificationChannel.SMS: float(
+                os.getenv("FANOUT_SMS_RATE", "10")
+            ),
+        },
+        chunk_sizes={
+            SubscriptionNotificationChannel.EMAIL: int(
+                os.getenv("FANOUT_EMAIL_CHUNK", "50")
+            ),
+            SubscriptionNotificationChannel.SMS: int(
+                os.getenv("FANOUT_SMS_CHUNK", "10")
+            ),
+        }
+    )
@@ -1,8 +1,32 @@
 # notification_base.py
 from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+
+class NotificationError(Exception):
+    """A channel could not deliver a notification."""
 
 
 class NotificationBase(ABC):
     @abstractmethod
     def send_notification(self, to: str, subject: str, body: str):
-        pass
+        """Send one message, raising NotificationError when it fails."""
+
+    def send_notifications(
+        self,
+        messages: List[Tuple[str, str, str]]
+    ) -> List[Optional[Exception]]:
+        """Send (to, subject, body) messages, returning None for each one sent
+        and the exception for each failed one. Channels able to batch
+        override it."""
+        errors = []
+        for to, subject, body in messages:
+            try:
+                self.send_notification(to, subject, body)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def close(self):
+        """Release the clients held by the channel."""
@@ -1,23 +1,30 @@
 import os
 from dotenv import load_dotenv
 
+from .channel_registry import ChannelRegistry
 from .email_notification import EmailNotification
 from .sms_notification import SMSNotification
 
 load_dotenv()
 
 
+def _email_channel() -> EmailNotification:
+    return EmailNotification(
+        smtp_server=os.getenv("SMTP_SERVER"),
+        smtp_port=int(os.getenv("SMTP_PORT")),
+        username=os.getenv("SMTP_USERNAME"),
+        password=os.getenv("SMTP_PASSWORD")
+    )
+
+
+# Channels are built on first use and shared by the whole process
+channel_registry = ChannelRegistry({
+    "email": _email_channel,
+    "sms": SMSNotification,
+})
+
+
 class NotificationFactory:
     @staticmethod
     def get_notification(method: str):
-        if method == "email":
-            return EmailNotification(
-                smtp_server=os.getenv("SMTP_SERVER"),
-                smtp_port=int(os.getenv("SMTP_PORT")),
-                username=os.getenv("SMTP_USERNAME"),
-                password=os.getenv("SMTP_PASSWORD")
-            )
-        elif method == "sms":
-            return SMSNotification()
-        else:
-            raise ValueError(f"Notification method {method} not supported")
+        return channel_registry.get(method)
@@ -0,0 +1,290 @@
+# outbox.py
+"""Persistent outbox of notifications.
+
+Services write the notifications of a change to the ``notification_outbox``
+collection right after the change itself, instead of sending them. A worker
+claims due entries in batches, sends them and records the outcome, so a
+notification survives a restart of the process and is delivered at least
+once:
+
+- ``pending`` entries are due at ``next_attempt_at``.
+- Claiming sets them ``sending`` under a ``claim_id`` and pushes
+  ``next_attempt_at`` one lease ahead; an entry whose worker died is claimed
+  again once the lease is over.
+- A sent entry becomes ``sent`` and is removed by the TTL index on
+  ``sent_at``. A failed one goes back to ``pending`` with an exponential
+  backoff, or to ``failed`` after OUTBOX_MAX_ATTEMPTS attempts.
+
+OUTBOX_BATCH_SIZE and OUTBOX_CONCURRENCY tune the throughput of a worker,
+OUTBOX_POLL_INTERVAL_SECONDS how often it looks for due entries when idle.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.utils.database import shared_collection
+from app.utils.notification.dispatcher import notification_dispatcher
+
+OUTBOX_COLLECTION = "notification_outbox"
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxStatus:
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+def outbox_entry(method: str, to: str, subject: str, body: str) -> dict:
+    """_summary_
+    Build the outbox document of one notification, due now.
+    """
+    now = datetime.utcnow()
+    return {
+        "method": method,
+        "to": to,
+        "subject": subject,
+        "body": body,
+        "status": OutboxStatus.PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+
+class OutboxWorker:
+    """_summary_
+    Claim due outbox entries in batches and send them.
+    Args:
+        collection (AsyncCollection): the outbox collection
+        deliver (callable): coroutine function sending one message, raising
+            on failure
+        batch_size (int): entries claimed at a time
+        concurrency (int): entries of a batch sent at once
+        max_attempts (int): attempts before an entry is marked failed
+        retry_delay (float): seconds before the first retry, doubled each time
+        max_retry_delay (float): upper bound of the backoff
+        lease (float): seconds a claimed entry is reserved to this worker
+        poll_interval (float): seconds between polls while idle
+    """
+
+    def __init__(
+        self,
+        collection,
+        deliver: Callable[..., Awaitable] = notification_dispatcher.deliver,
+        batch_size: int = 100,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        retry_delay: float = 2.0,
+        max_retry_delay: float = 600.0,
+        lease: float = 60.0,
+        poll_interval: float = 1.0
+    ):
+        self.collection = collection
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if not self.running:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def wake(self):
+        """_summary_
+        Tell the worker new entries were written, so it does not wait for
+        the next poll.
+        """
+        self._wake.set()
+
+    async def claim(self) -> List[dict]:
+        """_summary_
+        Reserve up to batch_size due entries for this worker. The update
+        repeats the due condition, so two workers never claim the same entry.
+        """
+        now = datetime.utcnow()
+        due = {
+            "status": {"$in": [OutboxStatus.PENDING, OutboxStatus.SENDING]},
+            "next_attempt_at": {"$lte": now},
+        }
+        candidates = await self.collection.find(due, {"_id": 1}).sort(
+            "next_attempt_at", ASCENDING
+        ).limit(self.batch_size).to_list(length=None)
+        if not candidates:
+            return []
+        claim_id = str(uuid.uuid4())
+        await self.collection.update_many(
+            {"_id": {"$in": [entry["_id"] for entry in candidates]}, **due},
+            {
+                "$set": {
+                    "status": OutboxStatus.SENDING,
+                    "claim_id": claim_id,
+                    "next_attempt_at": now + timedelta(seconds=self.lease),
+                },
+                "$inc": {"attempts": 1},
+            }
+        )
+        return await self.collection.find({"claim_id": claim_id}).to_list(
+            length=None
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+
+    def _outcome(self, entry: dict, error: Exception) -> UpdateOne:
+        now = datetime.utcnow()
+        owned = {"_id": entry["_id"], "claim_id": entry["claim_id"]}
+        if error is None:
+            self.sent += 1
+            return UpdateOne(owned, {
+                "$set": {"status": OutboxStatus.SENT, "sent_at": now},
+                "$unset": {"claim_id": ""},
+            })
+        self.failed += 1
+        if entry["attempts"] >= self.max_attempts:
+            self.dead += 1
+            return UpdateOne(owned, {
+                "$set": {"status": OutboxStatus.FAILED, "last_error": str(error)},
+                "$unset": {"claim_id": ""},
+            })
+        return UpdateOne(owned, {
+            "$set": {
+                "status": OutboxStatus.PENDING,
+                "last_error": str(error),
+                "next_attempt_at": now + timedelta(
+                    seconds=self._backoff(entry["attempts"])
+                ),
+            },
+            "$unset": {"claim_id": ""},
+        })
+
+    async def process_batch(self) -> int:
+        """_summary_
+        Claim one batch, send it and record every outcome with one
+        bulk_write.
+        Returns:
+            int: number of entries processed
+        """
+        entries = await self.claim()
+        if not entries:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(entry: dict):
+            async with semaphore:
+                try:
+                    await self.deliver(
+                        entry["method"], entry["to"], entry["subject"], entry["body"]
+                    )
+                except Exception as e:
+                    return e
+                return None
+
+        errors = await asyncio.gather(*[send(entry) for entry in entries])
+        await self.collection.bulk_write(
+            [self._outcome(entry, error) for entry, error in zip(entries, errors)],
+            ordered=False
+        )
+        return len(entries)
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except PyMongoError:
+                logger.exception("Notification outbox unavailable")
+                processed = 0
+            except Exception:
+                # Keep the worker alive: a dead task would stop every
+                # notification until the next restart
+                logger.exception("Notification outbox batch failed")
+                processed = 0
+            if processed < self.batch_size:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def stats(self) -> dict:
+        """_summary_
+        Entries and attempts made so far by status, and the outcomes
+        recorded by this worker since it started.
+        """
+        statuses = (
+            OutboxStatus.PENDING, OutboxStatus.SENDING,
+            OutboxStatus.SENT, OutboxStatus.FAILED
+        )
+        counts = {status: 0 for status in statuses}
+        attempts = {status: 0 for status in statuses}
+        cursor = await self.collection.aggregate([
+            {"$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "attempts": {"$sum": "$attempts"},
+            }}
+        ])
+        async for group in cursor:
+            counts[group["_id"]] = group["count"]
+            attempts[group["_id"]] = group["attempts"]
+        return {
+            "running": self.running,
+            "entries": counts,
+            "attempts": attempts,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dead": self.dead,
+        }
+
+    async def failed_entries(self, limit: int = 100) -> List[dict]:
+        """_summary_
+        Entries that ran out of attempts, newest first.
+        Returns:
+            list: channel, recipient, subject, attempts and last error of each
+        """
+        return await self.collection.find(
+            {"status": OutboxStatus.FAILED},
+            {"_id": 0, "method": 1, "to": 1, "subject": 1, "attempts": 1,
+             "last_error": 1, "created_at": 1}
+        ).sort("created_at", -1).limit(limit).to_list(length=None)
+
+
+outbox_worker = OutboxWorker(
+    shared_collection(OUTBOX_COLLECTION),
+    batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "100")),
+    concurrency=int(os.getenv("OUTBOX_CONCURRENCY", "8")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+    retry_delay=float(os.getenv("OUTBOX_RETRY_DELAY_SECONDS", "2")),
+    max_retry_delay=float(os.getenv("OUTBOX_MAX_RETRY_DELAY_SECONDS", "600")),
+    lease=float(os.getenv("OUTBOX_LEASE_SECONDS", "60")),
+    poll_interval=float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1"))
+)
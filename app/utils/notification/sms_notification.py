@@ -1,4 +1,6 @@
-from .notification_base import NotificationBase
+from .notification_base import NotificationBase, NotificationError
+from app.utils.constants import SubscriptionNotificationChannel
+from app.utils.metrics import track_notification
 import boto3
 import os
 from dotenv import load_dotenv
@@ -20,17 +22,19 @@ class SMSNotification(NotificationBase):
             region_name=os.getenv("AWS_REGION")
         )
 
+    def close(self):
+        self.client.close()
+
     def send_notification(self, to: str, subject: str, body: str):
         # Implement the SMS sending logic here
-        try:
-            phone_number = str('+57' + to)
-            # Send the SMS message
-            response = self.client.publish(
-                PhoneNumber=phone_number,
-                Message=body
-            )
-            print(f"SMS sent to {to} with subject {subject}")
-            return response
-        except Exception as e:
-            print("Error enviando SMS:", e)
-            return None
+        with track_notification(SubscriptionNotificationChannel.SMS):
+            try:
+                phone_number = str('+57' + to)
+                # Send the SMS message
+                response = self.client.publish(
+                    PhoneNumber=phone_number,
+                    Message=body
+                )
+                return response
+            except Exception as e:
+                raise NotificationError(f"Error enviando SMS: {e}") from e
@@ -0,0 +1,320 @@
+# smtp_pool.py
+"""Pool of authenticated SMTP sessions.
+
+Connecting, STARTTLS and login cost several round trips, more than sending a
+message. The pool keeps up to ``size`` logged-in sessions and lends them to
+the sending threads:
+
+- A session idle for more than ``idle_timeout`` seconds is closed, before
+  the server drops it: when it would be lent, when another session is
+  returned, and by a reaper thread running every ``reap_interval`` seconds
+  while sessions are idle, so connections left after a burst do not stay
+  open until the next send.
+- A session idle for more than ``check_after`` seconds is checked with NOOP
+  before it is lent.
+- A send failing because the connection broke is retried once on a new
+  session; a message refused by the server is not.
+
+``send_many`` sends a batch of messages over a single session.
+"""
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import Message
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _broken(error: Exception) -> bool:
+    """Whether error means the connection is unusable, as opposed to a message
+    refused by the server (SMTPException also derives from OSError)."""
+    return isinstance(error, smtplib.SMTPServerDisconnected) or (
+        isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+    )
+
+
+def build_message(sender: str, to: str, subject: str, body: str) -> Message:
+    message = MIMEMultipart()
+    message["From"] = sender
+    message["To"] = to
+    message["Subject"] = subject
+    message.attach(MIMEText(body, "plain"))
+    return message
+
+
+class SMTPPool:
+    """_summary_
+    Thread-safe pool of SMTP sessions to one server and account.
+    Args:
+        host (str): SMTP server
+        port (int): SMTP port
+        username (str): login, also the sender address; no login when empty
+        password (str): password
+        size (int): sessions kept open at most
+        idle_timeout (float): seconds after which an idle session is closed
+        check_after (float): seconds of idleness after which a session is
+            checked with NOOP before use
+        starttls (bool): upgrade the connection with STARTTLS
+        timeout (float): socket timeout in seconds
+        connect (callable): builds a connection from host, port and timeout
+        reap_interval (float): seconds between two passes of the reaper,
+            half of idle_timeout by default; no reaper when not positive
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = 4,
+        idle_timeout: float = 60.0,
+        check_after: float = 5.0,
+        starttls: bool = True,
+        timeout: float = 30.0,
+        connect: Callable[..., smtplib.SMTP] = smtplib.SMTP,
+        reap_interval: Optional[float] = None
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connect = connect
+        self.reap_interval = (
+            idle_timeout / 2 if reap_interval is None else reap_interval
+        )
+        self._reaper: Optional[threading.Thread] = None
+        # Idle sessions with the time they were returned, most recent last
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._open = 0
+        self._available = threading.Condition()
+        self.connections = 0
+        self.messages = 0
+
+    def _login(self) -> smtplib.SMTP:
+        server = self.connect(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        self.connections += 1
+        return server
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _healthy(self, server: smtplib.SMTP, idle: float) -> bool:
+        if idle > self.idle_timeout:
+            return False
+        if idle <= self.check_after:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> smtplib.SMTP:
+        with self._available:
+            while not self._idle and self._open >= self.size:
+                self._available.wait()
+            if self._idle:
+                server, returned_at = self._idle.pop()
+            else:
+                server, returned_at = None, None
+            self._open += 1
+        if server is not None:
+            if self._healthy(server, time.monotonic() - returned_at):
+                return server
+            self._quit(server)
+        try:
+            return self._login()
+        except Exception:
+            self._release(None)
+            raise
+
+    def _expired(self) -> List[smtplib.SMTP]:
+        """Remove the idle sessions past idle_timeout; the lock must be held."""
+        now = time.monotonic()
+        expired = [
+            server for server, returned_at in self._idle
+            if now - returned_at > self.idle_timeout
+        ]
+        if expired:
+            self._idle = [
+                (server, returned_at) for server, returned_at in self._idle
+                if now - returned_at <= self.idle_timeout
+            ]
+        return expired
+
+    def _release(self, server: Optional[smtplib.SMTP]):
+        with self._available:
+            self._open -= 1
+            expired = self._expired()
+            if server is not None:
+                self._idle.append((server, time.monotonic()))
+                if self._reaper is None and self.reap_interval > 0:
+                    self._reaper = threading.Thread(
+                        target=self._reap, name="smtp-pool-reaper", daemon=True
+                    )
+                    self._reaper.start()
+            self._available.notify()
+        for server in expired:
+            self._quit(server)
+
+    def _reap(self):
+        # Runs while sessions are idle, then exits; the next release
+        # starts a new one
+        done = False
+        while not done:
+            time.sleep(self.reap_interval)
+            with self._available:
+                expired = self._expired()
+                done = not self._idle
+                if done:
+                    self._reaper = None
+            for server in expired:
+                self._quit(server)
+
+    @contextmanager
+    def session(self):
+        """_summary_
+        Lend a logged-in session. A session that raised a connection error
+        is closed instead of being returned to the pool.
+        """
+        server = self._acquire()
+        try:
+            yield server
+        except Exception as e:
+            if _broken(e):
+                self._quit(server)
+                server = None
+            self._release(server)
+            raise
+        self._release(server)
+
+    def _send(self, server: smtplib.SMTP, message: Message):
+        server.send_message(message, from_addr=self.username or message["From"])
+        self.messages += 1
+
+    def send(self, to: str, subject: str, body: str):
+        """_summary_
+        Send one message, reconnecting once if the session was broken.
+        """
+        message = build_message(self.username, to, subject, body)
+        try:
+            with self.session() as server:
+                self._send(server, message)
+        except OSError as e:
+            if not _broken(e):
+                raise
+            with self.session() as server:
+                self._send(server, message)
+
+    def send_many(
+        self,
+        messages: List[Tuple[str, str, str]]
+    ) -> List[Optional[Exception]]:
+        """_summary_
+        Send (to, subject, body) messages over one session. A refused message
+        does not stop the batch; a broken connection is replaced once per
+        message.
+        Returns:
+            list: None for each message sent, the exception for each failed one
+        """
+        errors: List[Optional[Exception]] = [None] * len(messages)
+        position = 0
+        retried = False
+        while position < len(messages):
+            try:
+                with self.session() as server:
+                    while position < len(messages):
+                        to, subject, body = messages[position]
+                        try:
+                            self._send(
+                                server, build_message(self.username, to, subject, body)
+                            )
+                        except smtplib.SMTPException as e:
+                            if _broken(e):
+                                raise
+                            errors[position] = e
+                        position += 1
+                        retried = False
+            except OSError as e:
+                if not _broken(e):
+                    raise
+                if retried:
+                    errors[position] = e
+                    position += 1
+                retried = not retried
+        return errors
+
+    def close(self):
+        """_summary_
+        Close the idle sessions; lent ones are closed when returned.
+        """
+        with self._available:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._quit(server)
+
+    def stats(self) -> Dict[str, int]:
+        with self._available:
+            return {
+                "size": self.size,
+                "open": self._open + len(self._idle),
+                "idle": len(self._idle),
+                "connections": self.connections,
+                "messages": self.messages,
+            }
+
+
+_pools: Dict[tuple, SMTPPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host: str, port: int, username: str, password: str, **options) -> SMTPPool:
+    """_summary_
+    Return the process-wide pool for a server and account, creating it on
+    first use, so every EmailNotification sending with it shares sessions.
+    """
+    key = (host, port, username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPPool(host, port, username, password, **options)
+        return pool
+
+
+def release_pool(pool: SMTPPool):
+    """_summary_
+    Close a pool and forget it, so the next get_pool for its server and
+    account builds a new one with the settings given then.
+    """
+    with _pools_lock:
+        for key, registered in list(_pools.items()):
+            if registered is pool:
+                del _pools[key]
+    pool.close()
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
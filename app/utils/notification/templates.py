@@ -0,0 +1,172 @@
+# templates.py
+"""Notification texts rendered from Jinja2 templates.
+
+Templates live in app/templates/notifications/<locale>/<event>.<channel>.j2
+and define a ``body`` block and, for email, a ``subject`` block. Each one is
+loaded and compiled the first time it is used and then kept by
+(event, locale, channel), so a bulk send renders thousands of messages
+without reading or parsing a template again. The locale of the recipient is
+matched against the locale folders, then its language ("es-CO" to "es"),
+then NOTIFICATION_LOCALE; only those folders ever reach the cache key, so
+arbitrary user locales cannot grow it. A template of another locale that
+fails to render falls back to NOTIFICATION_LOCALE.
+
+SMS bodies are cut to SMS_MAX_LENGTH (160) characters.
+"""
+import logging
+import os
+import threading
+from typing import Dict, NamedTuple, Tuple
+
+from jinja2 import (
+    Environment,
+    FileSystemLoader,
+    StrictUndefined,
+    Template,
+    TemplateError
+)
+
+from app.utils.constants import SubscriptionNotificationChannel
+
+TEMPLATES_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(__file__), "..", "..", "templates", "notifications"
+))
+ELLIPSIS = "..."
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedNotification(NamedTuple):
+    subject: str
+    body: str
+
+
+def truncate(text: str, max_length: int) -> str:
+    if len(text) <= max_length:
+        return text
+    return text[:max_length - len(ELLIPSIS)].rstrip() + ELLIPSIS
+
+
+class NotificationTemplates:
+    """_summary_
+    Compiled notification templates, cached per (event, locale, channel).
+    Args:
+        directory (str): folder with one subfolder per locale
+        default_locale (str): locale used when the requested one has no template
+        sms_max_length (int): characters kept from an SMS body
+    """
+
+    def __init__(
+        self,
+        directory: str = TEMPLATES_DIR,
+        default_locale: str = "es",
+        sms_max_length: int = 160
+    ):
+        self.default_locale = default_locale
+        self.sms_max_length = sms_max_length
+        # The compiled templates are kept below, so the loader never checks
+        # the files for changes
+        self.environment = Environment(
+            loader=FileSystemLoader(directory),
+            undefined=StrictUndefined,
+            auto_reload=False,
+            autoescape=False
+        )
+        self.locales = frozenset(
+            name.lower() for name in os.listdir(directory)
+            if os.path.isdir(os.path.join(directory, name))
+        ) if os.path.isdir(directory) else frozenset()
+        self._compiled: Dict[Tuple[str, str, str], Template] = {}
+        self._lock = threading.Lock()
+        self.compilations = 0
+
+    def resolve_locale(self, locale: str = None) -> str:
+        """_summary_
+        Map a recipient locale to a locale folder: itself, its language or
+        the default one.
+        """
+        if locale:
+            locale = locale.replace("_", "-").lower()
+            for candidate in (locale, locale.split("-")[0]):
+                if candidate in self.locales:
+                    return candidate
+        return self.default_locale
+
+    def _load(self, event: str, locale: str, channel: str) -> Template:
+        locales = dict.fromkeys([locale, self.default_locale])
+        template = self.environment.select_template(
+            [f"{candidate}/{event}.{channel}.j2" for candidate in locales]
+        )
+        self.compilations += 1
+        return template
+
+    def template(self, event: str, locale: str, channel: str) -> Template:
+        """_summary_
+        Return the compiled template, loading it on first use.
+        Raises:
+            jinja2.TemplatesNotFound: no template for the event and channel
+        """
+        key = (event, self.resolve_locale(locale), channel)
+        template = self._compiled.get(key)
+        if template is None:
+            with self._lock:
+                template = self._compiled.get(key)
+                if template is None:
+                    template = self._compiled[key] = self._load(*key)
+        return template
+
+    def render(
+        self,
+        event: str,
+        channel: str,
+        locale: str = None,
+        **context
+    ) -> RenderedNotification:
+        """_summary_
+        Render the subject and body of a notification.
+        Args:
+            event (str): NotificationEvent value
+            channel (str): SubscriptionNotificationChannel value
+            locale (str): locale of the recipient, the default one when None
+            context: variables of the template
+        Raises:
+            jinja2.TemplateError: the template of the default locale is
+            missing or fails to render
+        Returns:
+            RenderedNotification: subject (empty without a subject block) and body
+        """
+        locale = self.resolve_locale(locale)
+        try:
+            return self._render(event, channel, locale, context)
+        except TemplateError:
+            if locale == self.default_locale:
+                raise
+            logger.exception(
+                "Template %s.%s failed for locale %s, using %s",
+                event, channel, locale, self.default_locale
+            )
+            return self._render(event, channel, self.default_locale, context)
+
+    def _render(
+        self, event: str, channel: str, locale: str, context: dict
+    ) -> RenderedNotification:
+        template = self.template(event, locale, channel)
+        variables = template.new_context(context)
+        subject = (
+            "".join(template.blocks["subject"](variables)).strip()
+            if "subject" in template.blocks else ""
+        )
+        body = "".join(template.blocks["body"](variables)).strip()
+        if channel == SubscriptionNotificationChannel.SMS:
+            body = truncate(body, self.sms_max_length)
+        return RenderedNotification(subject, body)
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+
+
+notification_templates = NotificationTemplates(
+    default_locale=os.getenv("NOTIFICATION_LOCALE", "es"),
+    sms_max_length=int(os.getenv("SMS_MAX_LENGTH", "160"))
+)
@@ -1,7 +1,6 @@
 # notification_utils.py
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from app.utils.notification.email_notification import EmailNotification
+from app.utils.notification.notification_base import NotificationError
 
 
 class NotificationUtils:
@@ -10,25 +9,15 @@ class NotificationUtils:
         self.smtp_port = smtp_port
         self.username = username
         self.password = password
+        # Same pooled sessions as the email channel
+        self.email = EmailNotification(smtp_server, smtp_port, username, password)
 
     def send_email(self, to_email: str, subject: str, body: str):
-        msg = MIMEMultipart()
-        msg["From"] = self.username
-        msg["To"] = to_email
-        msg["Subject"] = subject
-
-        msg.attach(MIMEText(body, "plain"))
-
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.username, self.password)
-            text = msg.as_string()
-            server.sendmail(self.username, to_email, text)
-            server.quit()
+            self.email.send_notification(to_email, subject, body)
             print("Email sent successfully")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+        except NotificationError as e:
+            print(e)
 
     def send_notification(
         self,
@@ -0,0 +1,110 @@
+# pagination.py
+"""Keyset pagination on ``_id``.
+
+``_id`` is always indexed and ObjectIds grow with insertion time, so a page
+is an index seek past the last key seen: the cost of a page does not depend
+on how deep the client is. The key travels as an opaque cursor; the next one
+is returned in the X-Next-Cursor and Link response headers so the list
+bodies keep their shape.
+
+Pagination is opt-in: a list request without ``limit`` nor ``after`` still
+returns the whole list, as before pagination existed, so clients that do not
+read the headers never get a silently truncated list. The large listings
+stream it (app/utils/streaming.py) instead of loading it.
+"""
+import base64
+import binascii
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Request, Response
+
+from app.utils.constants import PaginationError
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def page_request(
+    limit: Optional[int], after: Optional[str]
+) -> Tuple[bool, Optional[int]]:
+    """_summary_
+    Tell whether a list request asked for a page, and of what size.
+    Args:
+        limit (int): the ``limit`` query parameter, None when absent
+        after (str): the ``after`` query parameter, None when absent
+    Returns:
+        tuple: whether to paginate, and the page size, DEFAULT_PAGE_SIZE when
+        only ``after`` was given
+    """
+    if limit is None and after is None:
+        return False, None
+    return True, limit or DEFAULT_PAGE_SIZE
+
+
+class Page(list):
+    """List of documents carrying the cursor of the following page."""
+
+    def __init__(self, items=(), next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(object_id) -> str:
+    return base64.urlsafe_b64encode(ObjectId(object_id).binary).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, InvalidId, TypeError, ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=400,
+            detail=PaginationError.ERROR_INVALID_CURSOR
+        )
+
+
+async def fetch_page(
+    collection,
+    filter: dict = None,
+    projection: dict = None,
+    limit: Optional[int] = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None
+) -> Page:
+    """_summary_
+    Read one page of a collection in ``_id`` order.
+    One extra document is requested to know whether another page follows.
+    Args:
+        collection (AsyncCollection): collection to read
+        filter (dict): query filter
+        projection (dict): projection, must keep ``_id``
+        limit (int): page size, None for every remaining document
+        after (str): cursor returned with the previous page
+    Returns:
+        Page: the documents, with ``next_cursor`` set when more remain
+    """
+    query = dict(filter or {})
+    if after:
+        query["_id"] = {"$gt": decode_cursor(after)}
+    cursor = collection.find(query, projection).sort("_id", 1)
+    if limit is not None:
+        cursor = cursor.limit(limit + 1)
+    documents = await cursor.to_list(length=None)
+    next_cursor = None
+    if limit is not None and len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1]["_id"])
+    return Page(documents, next_cursor)
+
+
+def set_pagination_headers(request: Request, response: Response, page):
+    """_summary_
+    Expose the next cursor of a page in the X-Next-Cursor and Link headers.
+    """
+    next_cursor = getattr(page, "next_cursor", None)
+    if not next_cursor:
+        return
+    next_url = request.url.include_query_params(after=next_cursor)
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
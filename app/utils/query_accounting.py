@@ -0,0 +1,169 @@
+# query_accounting.py
+"""Database work done by each request.
+
+``QueryAccounting`` is a pymongo CommandListener on the shared client. While
+a request is served, ``QueryAccountingMiddleware`` keeps a ``QueryStats`` in
+a context variable and the listener adds every command to it: its count,
+the documents it returned and its time. The middleware then:
+
+- adds ``X-DB-Queries`` and ``Server-Timing: db;dur=<ms>;desc="<n> queries"``
+  to the response;
+- logs one JSON line per request on the ``app.db.queries`` logger, at
+  WARNING when the request ran more than DB_QUERIES_WARN_THRESHOLD (50)
+  commands.
+
+``count_queries`` measures a block of code the same way, outside of a
+request (tests, scripts, benchmarks).
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+DB_QUERIES_WARN_THRESHOLD = int(os.getenv("DB_QUERIES_WARN_THRESHOLD", "50"))
+QUERIES_HEADER = "X-DB-Queries"
+
+logger = logging.getLogger("app.db.queries")
+
+
+class QueryStats:
+    """_summary_
+    Commands run in one request or block, by command name.
+    """
+    __slots__ = ("queries", "documents", "seconds", "commands")
+
+    def __init__(self):
+        self.queries = 0
+        self.documents = 0
+        self.seconds = 0.0
+        self.commands: Dict[str, int] = {}
+
+    def add(self, command_name: str, documents: int, seconds: float):
+        self.queries += 1
+        self.documents += documents
+        self.seconds += seconds
+        self.commands[command_name] = self.commands.get(command_name, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "db_queries": self.queries,
+            "db_documents": self.documents,
+            "db_time_ms": round(self.seconds * 1000, 3),
+            "db_commands": dict(self.commands),
+        }
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("db_queries", default=None)
+
+
+def _returned_documents(reply: dict) -> int:
+    if not reply:
+        return 0
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if "value" in reply:
+        return int(reply["value"] is not None)
+    if isinstance(reply.get("values"), list):
+        return len(reply["values"])
+    return 0
+
+
+class QueryAccounting(monitoring.CommandListener):
+    """_summary_
+    Command listener adding every command to the QueryStats of the running
+    request or block, if any. The events are published in the task that runs
+    the command, so the context variable is the caller's.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.add(
+                event.command_name,
+                _returned_documents(event.reply),
+                event.duration_micros / 1_000_000
+            )
+
+    def failed(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.add(event.command_name, 0, event.duration_micros / 1_000_000)
+
+
+query_accounting = QueryAccounting()
+
+
+@contextmanager
+def count_queries():
+    """_summary_
+    Count the commands run inside the block.
+    Returns:
+        QueryStats: filled in as the block runs
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryAccountingMiddleware:
+    """_summary_
+    ASGI middleware reporting the database work of each request.
+    Args:
+        app (ASGIApp): the wrapped application
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [None]
+        started = time.perf_counter()
+
+        with count_queries() as stats:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    status[0] = message["status"]
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (QUERIES_HEADER.lower().encode(), str(stats.queries).encode()),
+                        (
+                            b"server-timing",
+                            f'db;dur={stats.seconds * 1000:.3f};'
+                            f'desc="{stats.queries} queries"'.encode()
+                        ),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                # Streamed responses keep querying after the headers: the log
+                # line has the final figures
+                logger.log(
+                    logging.WARNING if stats.queries > DB_QUERIES_WARN_THRESHOLD
+                    else logging.INFO,
+                    json.dumps({
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status[0],
+                        "duration_ms": round(
+                            (time.perf_counter() - started) * 1000, 3
+                        ),
+                        **stats.to_dict(),
+                    })
+                )
@@ -0,0 +1,342 @@
+# response_cache.py
+"""Cache of whole listing responses, shared by the workers or per process.
+
+A response is stored as its JSON text, tagged with scopes such as
+``subscriptions`` or ``user:<id>``. Writes invalidate the scopes whose data
+they change, which drops every response tagged with them and increments a
+generation counter per scope kept by the backend. A response is stored with
+the generations read before it was loaded and is never served once one of
+them has moved, so a listing loaded while a write landed, in this worker or
+another, does not outlive that write. Two backends:
+
+- ``memory``: a bounded LRU dictionary inside the process. Invalidation only
+  reaches the process that made the write, so with several workers the
+  others serve their copy until it expires; a warning is logged when
+  WEB_CONCURRENCY says more than one worker runs.
+- ``mongo``: a collection that every worker reads, with a TTL index on
+  ``expires_at``. The generation counters are documents of the same
+  collection, read in the same query as the entry.
+
+RESPONSE_CACHE_BACKEND picks one (``none`` disables caching),
+RESPONSE_CACHE_TTL_SECONDS bounds how long a response may be served after a
+change made outside the application, and RESPONSE_CACHE_MAX_ENTRIES and
+RESPONSE_CACHE_MAX_BYTES bound the memory backend.
+"""
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import UpdateOne
+
+RESPONSE_CACHE_COLLECTION = "response_cache"
+
+# _id prefix of the generation counters in the mongo backend's collection
+GENERATION_PREFIX = "generation:"
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCacheBackend(ABC):
+    @abstractmethod
+    async def get(
+        self, key: str, scopes: Iterable[str] = ()
+    ) -> Tuple[Optional[str], Dict[str, int]]:
+        """Cached text of key, None when missing or stored under older
+        generations of its scopes, and the current generation of each of
+        scopes."""
+
+    @abstractmethod
+    async def set(
+        self, key: str, value: str, generations: Dict[str, int], ttl: float
+    ):
+        """Store value under its scopes, the keys of generations, unless one
+        of them was invalidated since these generations were read."""
+
+    @abstractmethod
+    async def invalidate(self, scopes: Iterable[str]):
+        """Increment the generation of scopes and drop their entries."""
+
+    @abstractmethod
+    async def size(self) -> Tuple[int, int]:
+        """Number of entries and bytes of cached text."""
+
+    @abstractmethod
+    async def clear(self):
+        pass
+
+
+class MemoryBackend(ResponseCacheBackend):
+    """_summary_
+    LRU dictionary bounded both in entries and in bytes of cached text.
+    Args:
+        max_entries (int): entries kept at most
+        max_bytes (int): bytes of cached text kept at most
+        clock (callable): monotonic time source, replaceable in tests
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._keys_by_scope: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+
+    def _remove(self, key: str):
+        _, value, scopes = self._entries.pop(key)
+        self._bytes -= len(value.encode("utf-8"))
+        for scope in scopes:
+            keys = self._keys_by_scope.get(scope)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_scope[scope]
+
+    async def get(
+        self, key: str, scopes: Iterable[str] = ()
+    ) -> Tuple[Optional[str], Dict[str, int]]:
+        generations = {scope: self._generations.get(scope, 0) for scope in scopes}
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, generations
+        if entry[0] <= self.clock():
+            self._remove(key)
+            return None, generations
+        self._entries.move_to_end(key)
+        return entry[1], generations
+
+    async def set(
+        self, key: str, value: str, generations: Dict[str, int], ttl: float
+    ):
+        if any(
+            self._generations.get(scope, 0) != generation
+            for scope, generation in generations.items()
+        ):
+            return
+        if key in self._entries:
+            self._remove(key)
+        scopes = tuple(generations)
+        self._entries[key] = (self.clock() + ttl, value, scopes)
+        self._bytes += len(value.encode("utf-8"))
+        for scope in scopes:
+            self._keys_by_scope.setdefault(scope, set()).add(key)
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate(self, scopes: Iterable[str]):
+        for scope in scopes:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+            for key in list(self._keys_by_scope.get(scope, ())):
+                self._remove(key)
+
+    async def size(self) -> Tuple[int, int]:
+        return len(self._entries), self._bytes
+
+    async def clear(self):
+        self._entries.clear()
+        self._keys_by_scope.clear()
+        self._bytes = 0
+
+
+class MongoBackend(ResponseCacheBackend):
+    """_summary_
+    Entries in a collection shared by every worker, next to one generation
+    counter per invalidated scope. Expired entries are removed by the TTL
+    index declared in app/migrations/indexes.py and ignored until then.
+    A lookup reads the entry and the counters of its scopes in one query and
+    ignores an entry stored under older generations, so a response loaded
+    before another worker's invalidation is never served. Invalidation
+    increments the counters, then drops the entries with a delete_many on
+    the indexed scopes field.
+    Args:
+        collection (AsyncCollection): collection holding the entries
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(
+        self, key: str, scopes: Iterable[str] = ()
+    ) -> Tuple[Optional[str], Dict[str, int]]:
+        counter_ids = {GENERATION_PREFIX + scope: scope for scope in scopes}
+        documents = await self.collection.find(
+            {"$or": [
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"_id": {"$in": list(counter_ids)}},
+            ]},
+            {"value": 1, "generations": 1, "generation": 1}
+        ).to_list(length=None)
+        generations = dict.fromkeys(counter_ids.values(), 0)
+        entry = None
+        for document in documents:
+            if document["_id"] == key:
+                entry = document
+            else:
+                generations[counter_ids[document["_id"]]] = document["generation"]
+        if entry is None or any(
+            entry.get("generations", {}).get(scope, 0) != generation
+            for scope, generation in generations.items()
+        ):
+            return None, generations
+        return entry["value"], generations
+
+    async def set(
+        self, key: str, value: str, generations: Dict[str, int], ttl: float
+    ):
+        await self.collection.replace_one(
+            {"_id": key},
+            {
+                "value": value,
+                "scopes": list(generations),
+                "generations": dict(generations),
+                "size": len(value.encode("utf-8")),
+                "expires_at": datetime.utcnow() + timedelta(seconds=ttl)
+            },
+            upsert=True
+        )
+
+    async def invalidate(self, scopes: Iterable[str]):
+        scopes = list(scopes)
+        # Counters first: an entry stored from then on under the old
+        # generations is ignored, whoever stores it
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": GENERATION_PREFIX + scope},
+                {"$inc": {"generation": 1}},
+                upsert=True
+            )
+            for scope in scopes
+        ], ordered=False)
+        await self.collection.delete_many({"scopes": {"$in": scopes}})
+
+    async def size(self) -> Tuple[int, int]:
+        cursor = await self.collection.aggregate([
+            {"$match": {"value": {"$exists": True}}},
+            {"$group": {
+                "_id": None, "entries": {"$sum": 1}, "bytes": {"$sum": "$size"}
+            }}
+        ])
+        totals = await cursor.to_list(length=None)
+        if not totals:
+            return 0, 0
+        return totals[0]["entries"], totals[0]["bytes"]
+
+    async def clear(self):
+        # The counters stay: an entry being loaded keeps its generations
+        await self.collection.delete_many({"value": {"$exists": True}})
+
+
+class ResponseCache:
+    """_summary_
+    Serve responses from a backend, loading and storing them on a miss.
+    Args:
+        backend (ResponseCacheBackend): where responses are kept, None to
+            disable caching
+        ttl (float): seconds a response is served at most
+    """
+
+    def __init__(self, backend: Optional[ResponseCacheBackend], ttl: float = 30.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def cached(
+        self,
+        key: str,
+        scopes: Iterable[str],
+        load: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Any] = jsonable_encoder,
+        decode: Callable[[Any], Any] = lambda content: content
+    ) -> Any:
+        """_summary_
+        Return the response cached for key, or load it and cache it.
+        Args:
+            key (str): identifies the listing and its parameters
+            scopes (Iterable[str]): scopes whose invalidation drops the entry
+            load (callable): coroutine function producing the response
+            encode (callable): turns the response into JSON compatible data
+            decode (callable): rebuilds the response from that data
+        """
+        if self.backend is None:
+            return await load()
+        cached, generations = await self.backend.get(key, scopes)
+        if cached is not None:
+            self.hits += 1
+            return decode(json.loads(cached))
+        self.misses += 1
+        content = await load()
+        # Not kept if one of the scopes was invalidated during the load
+        await self.backend.set(
+            key, json.dumps(encode(content), ensure_ascii=False), generations,
+            self.ttl
+        )
+        return content
+
+    async def invalidate(self, *scopes: str):
+        if self.backend is None or not scopes:
+            return
+        await self.backend.invalidate(scopes)
+
+    async def clear(self):
+        if self.backend is not None:
+            await self.backend.clear()
+
+    async def stats(self) -> dict:
+        entries, size = await self.backend.size() if self.backend else (0, 0)
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    """_summary_
+    Build the response cache configured by the environment.
+    """
+    backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+    if backend_name == "none":
+        return ResponseCache(None, ttl)
+    if backend_name == "mongo":
+        from app.utils.database import shared_collection
+        return ResponseCache(
+            MongoBackend(shared_collection(RESPONSE_CACHE_COLLECTION)), ttl
+        )
+    workers = int(os.getenv("WEB_CONCURRENCY") or "1")
+    if workers > 1:
+        logger.warning(
+            "RESPONSE_CACHE_BACKEND=memory with WEB_CONCURRENCY=%s: writes only "
+            "invalidate the cache of the worker that made them, the others "
+            "serve stale listings for up to %ss. Use RESPONSE_CACHE_BACKEND=mongo.",
+            workers, ttl
+        )
+    return ResponseCache(
+        MemoryBackend(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        ),
+        ttl
+    )
+
+
+response_cache = create_response_cache()
@@ -0,0 +1,282 @@
+# slow_queries.py
+"""Slow MongoDB operations, with their query plans.
+
+``SlowQueryLog`` is a pymongo CommandListener on the shared client. Every
+command slower than SLOW_QUERY_THRESHOLD_MS (100) is kept in a ring buffer
+of SLOW_QUERY_LOG_SIZE (200) entries with its collection, filter, sort,
+projection and duration. A fraction SLOW_QUERY_EXPLAIN_SAMPLE_RATE (0.1) of
+them is explained in the background with ``verbosity: queryPlanner``; the
+plan summary (stages, indexes, whether it scans the whole collection) is
+attached to the entry and reused for the same query shape for
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS (60). Collection scans are logged as
+warnings.
+
+The values of the filters and pipelines are replaced by "?" unless
+SLOW_QUERY_REDACT is false, so the buffer shows query shapes and no user
+data.
+GET /admin/slow-queries lists the entries (app/routers/admin.py, behind
+ADMIN_TOKEN).
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Commands with a query plan; others are recorded but never explained
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify",
+               "update", "delete"}
+# Fields the driver adds to a command, not accepted inside an explain
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction",
+                 "readConcern", "writeConcern"}
+REDACTED = "?"
+# Parts of a query holding values; sorts and projections only name fields
+REDACTED_FIELDS = {"filter", "pipeline"}
+
+logger = logging.getLogger(__name__)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {key: _redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            # $in lists and the like: their length is not part of the shape
+            return [REDACTED]
+        return [_redact(item) for item in value]
+    return REDACTED
+
+
+def _query(command_name: str, command: dict) -> dict:
+    """The filter, sort and projection of a command, wherever it keeps them."""
+    if command_name == "find":
+        return {
+            "filter": command.get("filter"),
+            "sort": command.get("sort"),
+            "projection": command.get("projection"),
+        }
+    if command_name == "aggregate":
+        return {"pipeline": command.get("pipeline")}
+    if command_name == "findAndModify":
+        return {
+            "filter": command.get("query"),
+            "sort": command.get("sort"),
+            "projection": command.get("fields"),
+        }
+    if command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        return {"filter": statements[0].get("q")}
+    if command_name in ("count", "distinct"):
+        return {"filter": command.get("query")}
+    return {}
+
+
+def _stages(plan: dict) -> List[dict]:
+    """Flatten a winning plan, classic or slot based, into its stages."""
+    stages = []
+    pending = [plan.get("queryPlan", plan)]
+    while pending:
+        stage = pending.pop()
+        if not isinstance(stage, dict):
+            continue
+        if "stage" in stage:
+            stages.append(stage)
+        pending.extend(stage.get("inputStages") or [])
+        pending.append(stage.get("inputStage"))
+        pending.append(stage.get("queryPlan"))
+    return stages
+
+
+def summarize_plan(explain: dict) -> dict:
+    """_summary_
+    Reduce the output of explain to the stages and indexes of the winning
+    plan.
+    Returns:
+        dict: stages, indexes and whether any stage is a COLLSCAN
+    """
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # Aggregations explain each stage, the first one holds the query
+        for stage in explain.get("stages") or []:
+            planner = (stage.get("$cursor") or {}).get("queryPlanner")
+            if planner:
+                break
+    stages = _stages((planner or {}).get("winningPlan") or {})
+    names = [stage["stage"] for stage in stages]
+    return {
+        "stages": names,
+        "indexes": [stage["indexName"] for stage in stages if "indexName" in stage],
+        "collscan": "COLLSCAN" in names,
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """_summary_
+    Command listener keeping the slow commands and sampling their plans.
+    Args:
+        threshold_ms (float): commands at least this slow are recorded
+        size (int): entries kept, the oldest are dropped first
+        sample_rate (float): fraction of the recorded commands explained
+        explain_interval (float): seconds a plan is reused for its query shape
+        redact (bool): replace filter values with "?"
+        max_explains (int): explains running at once at most
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = 100.0,
+        size: int = 200,
+        sample_rate: float = 0.1,
+        explain_interval: float = 60.0,
+        redact: bool = True,
+        max_explains: int = 2
+    ):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.explain_interval = explain_interval
+        self.redact = redact
+        self.max_explains = max_explains
+        self.entries = deque(maxlen=size)
+        self.recorded = 0
+        self._client = None
+        self._pending: Dict[Tuple, dict] = {}
+        self._plans: Dict[str, Tuple[float, dict]] = {}
+        self._explains = set()
+        self._lock = threading.Lock()
+
+    def bind(self, client):
+        """_summary_
+        Set the client the explains are sent with.
+        """
+        self._client = client
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        # The succeeded and failed events do not carry the command
+        with self._lock:
+            self._pending[self._key(event)] = event.command
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            command = self._pending.pop(self._key(event), None)
+        duration_ms = event.duration_micros / 1000
+        if event.command_name == "explain" or duration_ms < self.threshold_ms:
+            return
+        command = command or {}
+        value = command.get(event.command_name)
+        query = _query(event.command_name, command)
+        entry = {
+            "at": datetime.utcnow(),
+            "database": event.database_name,
+            "collection": value if isinstance(value, str) else None,
+            "command": event.command_name,
+            **{
+                field: _redact(part)
+                if self.redact and part is not None and field in REDACTED_FIELDS
+                else part
+                for field, part in query.items()
+            },
+            "duration_ms": round(duration_ms, 3),
+            "failed": failed,
+            "plan": None,
+        }
+        shape = repr((entry["database"], entry["collection"], entry["command"],
+                      _redact(query)))
+        with self._lock:
+            self.entries.append(entry)
+            self.recorded += 1
+            cached = self._plans.get(shape)
+        if cached and time.monotonic() - cached[0] < self.explain_interval:
+            entry["plan"] = cached[1]
+        elif (
+            event.command_name in EXPLAINABLE
+            and random.random() < self.sample_rate
+        ):
+            self._schedule_explain(entry, shape, command)
+
+    def _schedule_explain(self, entry: dict, shape: str, command: dict):
+        if self._client is None or len(self._explains) >= self.max_explains:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on an event loop: the synchronous driver, nothing to await on
+            return
+        explained = {
+            key: value for key, value in command.items()
+            if not key.startswith("$") and key not in DRIVER_FIELDS
+            and value is not None
+        }
+        # Started from a fresh context: the explain is not part of the request
+        # whose command triggered it, nor of its query count and budget
+        task = contextvars.Context().run(
+            loop.create_task, self._explain(entry, shape, explained)
+        )
+        self._explains.add(task)
+        task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, entry: dict, shape: str, command: dict):
+        try:
+            explain = await self._client[entry["database"]].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+        except Exception as e:
+            entry["plan"] = {"error": str(e)}
+            return
+        plan = summarize_plan(explain)
+        entry["plan"] = plan
+        with self._lock:
+            self._plans[shape] = (time.monotonic(), plan)
+        if plan["collscan"]:
+            logger.warning(
+                "COLLSCAN on %s.%s: %s %s taking %sms", entry["database"],
+                entry["collection"], entry["command"],
+                entry.get("filter", entry.get("pipeline")), entry["duration_ms"]
+            )
+
+    def list(self, collscan: Optional[bool] = None, limit: int = None) -> List[dict]:
+        """_summary_
+        Recorded entries, newest first.
+        Args:
+            collscan (bool): only those whose plan is, or is not, a COLLSCAN
+            limit (int): entries returned at most
+        """
+        with self._lock:
+            entries = list(reversed(self.entries))
+        if collscan is not None:
+            entries = [
+                entry for entry in entries
+                if entry["plan"] is not None
+                and entry["plan"].get("collscan") is collscan
+            ]
+        return entries[:limit]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._plans.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100")),
+    size=int(os.getenv("SLOW_QUERY_LOG_SIZE", "200")),
+    sample_rate=float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1")),
+    explain_interval=float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "60")),
+    redact=os.getenv("SLOW_QUERY_REDACT", "true").lower() == "true"
+)
@@ -0,0 +1,84 @@
+# streaming.py
+"""Streamed responses for whole-collection exports.
+
+A request with ``Accept: application/x-ndjson`` gets one JSON document per
+line, and ``?stream=true`` gets a JSON array written element by element.
+Documents are serialized as the Mongo cursor returns them, so the memory
+used by a request is bounded by the cursor batch size, not by the size of
+the collection.
+"""
+import json
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+# Documents per getMore while streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+
+def stream_format(request: Request) -> Optional[str]:
+    """_summary_
+    Tell which streaming format the client asked for, if any.
+    Returns:
+        str: NDJSON_MEDIA_TYPE, JSON_MEDIA_TYPE or None for a regular response
+    """
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return NDJSON_MEDIA_TYPE
+    if request.query_params.get("stream", "").lower() == "true":
+        return JSON_MEDIA_TYPE
+    return None
+
+
+def _serialize(document) -> str:
+    return json.dumps(jsonable_encoder(document), ensure_ascii=False)
+
+
+async def _ndjson(documents: AsyncIterator[dict]):
+    async for document in documents:
+        yield _serialize(document) + "\n"
+
+
+async def _json_array(documents: AsyncIterator[dict]):
+    yield "["
+    separator = ""
+    async for document in documents:
+        yield separator + _serialize(document)
+        separator = ","
+    yield "]"
+
+
+def stream_documents(
+    documents: AsyncIterator[dict],
+    media_type: str
+) -> StreamingResponse:
+    """_summary_
+    Build a streaming response serializing documents as they are produced.
+    Args:
+        documents (AsyncIterator[dict]): documents to send
+        media_type (str): NDJSON_MEDIA_TYPE or JSON_MEDIA_TYPE
+    """
+    body = _ndjson(documents) if media_type == NDJSON_MEDIA_TYPE else (
+        _json_array(documents)
+    )
+    return StreamingResponse(body, media_type=media_type)
+
+
+async def iterate_batches(cursor, size: int) -> AsyncIterator[list]:
+    """_summary_
+    Group the documents of an async cursor in lists of at most size, for
+    joins that work on a batch at a time.
+    """
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
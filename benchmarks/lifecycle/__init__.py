@@ -0,0 +1,13 @@
+"""Benchmark of the subscription lifecycle at production scale.
+
+Seeds the in-process stand-in with synthetic data (by default 10k users,
+100 funds, 100k subscriptions and 500k transactions), runs each service
+path and records throughput, p50/p99 latency, queries per call and peak
+memory to a JSON baseline. A later run is compared with a baseline to flag
+regressions. See ``python -m benchmarks.lifecycle --help``.
+"""
+import os
+
+# Always benchmark against the in-process stand-in, never a real cluster
+os.environ["CONNECTION_URL"] = "mongomock://benchmarks"
+os.environ["CONNECTION_DATABASE"] = "benchmarks"
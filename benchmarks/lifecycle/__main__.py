@@ -0,0 +1,73 @@
+# __main__.py
+"""Usage:
+    python -m benchmarks.lifecycle run [--scale 1.0] [--iterations 10]
+        [--output lifecycle.json] [--compare baseline.json]
+    python -m benchmarks.lifecycle compare baseline.json current.json
+
+Exits with status 1 when a comparison finds regressions.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from . import compare as comparison
+from .runner import run
+
+
+def _load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def _report(regressions: list) -> int:
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("no regressions")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.lifecycle")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, measure and save a report")
+    run_parser.add_argument(
+        "--scale", type=float, default=1.0,
+        help="fraction of 10k users, 100k subscriptions and 500k transactions"
+    )
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--iterations", type=int, default=10)
+    run_parser.add_argument("--with-cache", action="store_true")
+    run_parser.add_argument("--output", default="lifecycle.json")
+    run_parser.add_argument("--compare", metavar="BASELINE")
+    run_parser.add_argument("--tolerance", type=float, default=0.2)
+
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        return _report(comparison.compare(
+            _load(args.baseline), _load(args.current), args.tolerance
+        ))
+
+    report = asyncio.run(run(
+        scale=args.scale, seed=args.seed, iterations=args.iterations,
+        with_cache=args.with_cache
+    ))
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"report saved to {args.output}")
+    if args.compare:
+        return _report(comparison.compare(
+            _load(args.compare), report, args.tolerance
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# compare.py
+"""Compare a benchmark report with a baseline.
+
+Query counts are exact, so any increase is a regression. Throughput,
+latencies and peak memory vary between runs and only count as a
+regression past ``tolerance`` (0.2 means 20% worse).
+"""
+from typing import List
+
+# (metric, True when higher is better)
+TIMED_METRICS = [
+    ("throughput_per_second", True),
+    ("p50_ms", False),
+    ("p99_ms", False),
+    ("peak_memory_bytes", False),
+]
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.2) -> List[str]:
+    """_summary_
+    List the regressions of current against baseline.
+    Raises:
+        ValueError: the reports were run on different datasets
+    Returns:
+        list: one message per regression, empty when there is none
+    """
+    if baseline["dataset"] != current["dataset"]:
+        raise ValueError(
+            f"different datasets: {baseline['dataset']} and {current['dataset']}"
+        )
+    regressions = []
+    for path, before in baseline["results"].items():
+        after = current["results"].get(path)
+        if after is None:
+            regressions.append(f"{path}: missing from the report")
+            continue
+        if after["queries_per_call"] > before["queries_per_call"]:
+            regressions.append(
+                f"{path}: queries per call {before['queries_per_call']} -> "
+                f"{after['queries_per_call']}"
+            )
+        for metric, higher_is_better in TIMED_METRICS:
+            if not before[metric]:
+                continue
+            change = after[metric] / before[metric] - 1
+            if higher_is_better:
+                change = -change
+            if change > tolerance:
+                regressions.append(
+                    f"{path}: {metric} {before[metric]} -> {after[metric]} "
+                    f"({change:.0%} worse)"
+                )
+    return regressions
@@ -0,0 +1,174 @@
+# generators.py
+"""Synthetic data for the lifecycle benchmark.
+
+Every document is derived from a seeded random generator, so two runs with
+the same sizes and seed load the same data. User u is subscribed to the
+consecutive funds u, u + 1, ..., so create_subscription always finds a fund
+the user is free to join. Each
+subscription gets between average - 2 and average + 2 transactions
+alternating created and cancelled; the last one sets its status and the
+last_transaction_at / last_action fields kept on the document.
+"""
+import random
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from app.utils.constants import (
+    FundStatus,
+    SubscriptionNotificationChannel,
+    TransactionAction
+)
+
+COLLECTIONS = ["users", "funds", "subscriptions", "transaction_history"]
+# Offsets around the average number of transactions, summing to 0
+TRANSACTION_SPREAD = (-2, 0, 2, -1, 1)
+START = datetime(2024, 1, 1)
+
+
+@dataclass
+class DatasetSize:
+    users: int = 10_000
+    funds: int = 100
+    subscriptions: int = 100_000
+    transactions: int = 500_000
+
+    def scaled(self, scale: float) -> "DatasetSize":
+        """The funds are a catalog and keep their number; the rest scales."""
+        return DatasetSize(**{
+            name: value if name == "funds" else max(1, int(value * scale))
+            for name, value in asdict(self).items()
+        })
+
+    @property
+    def subscriptions_per_user(self) -> int:
+        return -(-self.subscriptions // self.users)
+
+
+@dataclass
+class Dataset:
+    """_summary_
+    Documents of one benchmark run and the ids the service paths draw from.
+    """
+    users: List[dict]
+    funds: List[dict]
+    subscriptions: List[dict]
+    transactions: List[dict]
+
+    @property
+    def active_subscription_ids(self) -> List[str]:
+        return [
+            subscription["id"] for subscription in self.subscriptions
+            if subscription["status"] == FundStatus.ACTIVE
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "users": len(self.users),
+            "funds": len(self.funds),
+            "subscriptions": len(self.subscriptions),
+            "transactions": len(self.transactions),
+        }
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate(size: DatasetSize, seed: int = 42) -> Dataset:
+    """_summary_
+    Build the documents for the given sizes.
+    Returns:
+        Dataset: users, funds, subscriptions and their transactions
+    """
+    rng = random.Random(seed)
+    funds = [
+        {"id": _uuid(rng), "name": f"Fund {index}", "category": "FPV",
+         "minimum_investment_amount": float(rng.choice([50000, 75000, 125000])),
+         "status": FundStatus.ACTIVE}
+        for index in range(size.funds)
+    ]
+    users = [
+        {"id": _uuid(rng), "name": f"User {index}",
+         "email": f"user{index}@example.com", "phone_number": f"300{index:07d}",
+         # Enough for every subscription the benchmark creates
+         "investment_capital": 1e12}
+        for index in range(size.users)
+    ]
+    # User u holds funds u, u + 1, ... u + per_user - 1, so fund
+    # u + per_user is always free
+    if size.subscriptions_per_user >= size.funds:
+        raise ValueError(
+            "every user needs a fund left to subscribe to: "
+            f"{size.subscriptions_per_user} subscriptions per user for "
+            f"{size.funds} funds"
+        )
+    average = max(1, size.transactions // size.subscriptions)
+    subscriptions = []
+    transactions = []
+    for index in range(size.subscriptions):
+        user_index = index % size.users
+        slot = index // size.users
+        fund = funds[(user_index + slot) % size.funds]
+        subscription_id = _uuid(rng)
+        channel = (
+            SubscriptionNotificationChannel.SMS if index % 4 == 0
+            else SubscriptionNotificationChannel.EMAIL
+        )
+        count = max(1, average + TRANSACTION_SPREAD[index % len(TRANSACTION_SPREAD)])
+        timestamp = START + timedelta(minutes=index)
+        for position in range(count):
+            transactions.append({
+                "id": _uuid(rng),
+                "subscription_id": subscription_id,
+                "action": (
+                    TransactionAction.CREATED if position % 2 == 0
+                    else TransactionAction.CANCELLED
+                ),
+                "notification_channel": channel,
+                "timestamp": timestamp + timedelta(days=position),
+            })
+        last = transactions[-1]
+        subscriptions.append({
+            "id": subscription_id,
+            "user_id": users[user_index]["id"],
+            "fund_id": fund["id"],
+            "status": (
+                FundStatus.ACTIVE if last["action"] == TransactionAction.CREATED
+                else TransactionAction.CANCELLED
+            ),
+            "subscription_notification_channel": channel,
+            "last_transaction_at": last["timestamp"],
+            "last_action": last["action"],
+        })
+    return Dataset(users, funds, subscriptions, transactions)
+
+
+def free_fund(dataset: Dataset, user_index: int) -> str:
+    """_summary_
+    Id of a fund the user has no subscription to.
+    """
+    size = DatasetSize(**dataset.counts())
+    return dataset.funds[
+        (user_index + size.subscriptions_per_user) % size.funds
+    ]["id"]
+
+
+async def load(db, dataset: Dataset, batch_size: int = 10_000):
+    """_summary_
+    Replace the benchmark collections with the dataset.
+    """
+    for name in COLLECTIONS:
+        await db[name].delete_many({})
+    for name, documents in (
+        ("users", dataset.users),
+        ("funds", dataset.funds),
+        ("subscriptions", dataset.subscriptions),
+        ("transaction_history", dataset.transactions),
+    ):
+        for start in range(0, len(documents), batch_size):
+            # The stand-in adds _id to the documents, keep the dataset clean
+            await db[name].insert_many(
+                [dict(document) for document in documents[start:start + batch_size]]
+            )
@@ -0,0 +1,161 @@
+# runner.py
+"""Run the service paths of the subscription lifecycle and measure them.
+
+Each path is called ``iterations`` times in a row on fresh arguments (new
+user-fund pairs to subscribe, distinct active subscriptions to cancel, the
+next page of the listing, different users). Every call is timed and its
+database commands counted with count_queries; one more call runs under
+tracemalloc for its peak memory, kept apart so tracing does not slow the
+timed calls.
+
+The response cache is replaced by a disabled one unless ``with_cache`` is
+set, so the listings measure the queries rather than cache hits. The
+stand-in scans collections instead of using indexes: absolute latencies are
+pessimistic, what matters is their change between runs and the query
+counts, which are exact.
+"""
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+from unittest.mock import patch
+
+from app.models.subscription import Subscription
+from app.services import subscription_service
+from app.utils.database import connect_db
+from app.utils.pagination import DEFAULT_PAGE_SIZE
+from app.utils.query_accounting import count_queries
+from app.utils.response_cache import ResponseCache
+from .generators import Dataset, DatasetSize, free_fund, generate, load
+
+Call = Callable[[], Awaitable]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def measure(calls: List[Call]) -> dict:
+    """_summary_
+    Time every call but the last one, then trace the memory of the last.
+    Returns:
+        dict: throughput, p50/p99 latency, queries per call and peak memory
+    """
+    latencies = []
+    queries = []
+    for call in calls[:-1]:
+        with count_queries() as stats:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+        queries.append(stats.queries)
+    tracemalloc.start()
+    try:
+        await calls[-1]()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "iterations": len(latencies),
+        "throughput_per_second": round(len(latencies) / sum(latencies), 3),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "queries_per_call": round(sum(queries) / len(queries), 3),
+        "max_queries": max(queries),
+        "peak_memory_bytes": peak,
+    }
+
+
+def workloads(dataset: Dataset, iterations: int) -> Dict[str, List[Call]]:
+    """_summary_
+    Build iterations + 1 calls per service path.
+    """
+    calls = iterations + 1
+    if calls > len(dataset.users):
+        raise ValueError(f"at most {len(dataset.users) - 1} iterations")
+    users = dataset.users
+    active = dataset.active_subscription_ids
+    step = max(1, len(active) // calls)
+    page = {"after": None}
+
+    def create(index: int) -> Call:
+        return lambda: subscription_service.create_subscription(Subscription(
+            user_id=users[index]["id"], fund_id=free_fund(dataset, index),
+            status="active"
+        ))
+
+    def cancel(index: int) -> Call:
+        return lambda: subscription_service.cancel_subscription(
+            active[(index * step) % len(active)]
+        )
+
+    async def next_page():
+        listing = await subscription_service.list_subscriptions_with_users(
+            limit=DEFAULT_PAGE_SIZE, after=page["after"]
+        )
+        page["after"] = listing.next_cursor
+
+    def transactions(index: int) -> Call:
+        # A stride coprime with most sizes spreads the users over the data
+        return lambda: subscription_service.get_user_transactions(
+            users[(index * 7919) % len(users)]["id"]
+        )
+
+    return {
+        "create_subscription": [create(index) for index in range(calls)],
+        "cancel_subscription": [cancel(index) for index in range(calls)],
+        "list_subscriptions_with_users": [next_page] * calls,
+        "get_user_transactions": [transactions(index) for index in range(calls)],
+    }
+
+
+async def run(
+    scale: float = 1.0,
+    seed: int = 42,
+    iterations: int = 10,
+    with_cache: bool = False,
+    log: Callable[[str], None] = print
+) -> dict:
+    """_summary_
+    Seed the stand-in and measure every service path.
+    Returns:
+        dict: the report saved as a baseline
+    """
+    size = DatasetSize().scaled(scale)
+    started = time.perf_counter()
+    dataset = generate(size, seed)
+    await load(connect_db(), dataset)
+    seed_seconds = time.perf_counter() - started
+    log(f"seeded {dataset.counts()} in {seed_seconds:.1f}s")
+
+    results = {}
+    cache = subscription_service.response_cache if with_cache else ResponseCache(None)
+    with patch.object(subscription_service, "response_cache", cache):
+        for path, calls in workloads(dataset, iterations).items():
+            results[path] = await measure(calls)
+            log(
+                f"{path:<30} {results[path]['throughput_per_second']:>9.1f}/s "
+                f"p50 {results[path]['p50_ms']:>9.2f}ms "
+                f"p99 {results[path]['p99_ms']:>9.2f}ms "
+                f"{results[path]['queries_per_call']:>5.1f} queries"
+            )
+    return {
+        "benchmark": "subscription_lifecycle",
+        "created_at": datetime.utcnow().isoformat(),
+        "scale": scale,
+        "seed": seed,
+        "with_cache": with_cache,
+        "dataset": dataset.counts(),
+        "seed_seconds": round(seed_seconds, 3),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            # Kilobytes on Linux
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "results": results,
+    }
@@ -0,0 +1,7 @@
+"""HTTP load test of the whole application.
+
+Drives the FastAPI app through httpx.AsyncClient, either in-process over
+ASGITransport (with the lifespan run and the in-memory stand-in seeded by
+benchmarks.lifecycle) or against a running server such as a local uvicorn.
+See ``python -m benchmarks.load --help``.
+"""
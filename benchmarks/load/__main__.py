@@ -0,0 +1,139 @@
+# __main__.py
+"""Usage:
+    python -m benchmarks.load [--url http://127.0.0.1:8000]
+        [--mix browse=50,subscribe=20,cancel=10,transactions=20]
+        [--rate 200 [--arrivals poisson|uniform] | --concurrency 32]
+        [--duration 30] [--output load.json]
+
+Without --url the app runs in-process over ASGITransport, on the in-memory
+stand-in seeded at --scale of the lifecycle dataset; the load generator then
+shares the event loop with the app, so use it to compare changes rather
+than to size a deployment. With --url the target must already hold users
+and funds, for example a local ``uvicorn app.main:app --workers 4``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from .harness import Recorder, closed_loop, open_loop
+from .scenarios import DEFAULT_MIX, Targets, Workload, discover_targets, parse_mix
+
+
+async def _drive(client: httpx.AsyncClient, targets: Targets, args) -> dict:
+    rng = random.Random(args.seed)
+    workload = Workload(targets, args.mix, rng)
+    recorder = Recorder()
+    started = time.perf_counter()
+    if args.rate:
+        await open_loop(
+            workload, client, recorder, args.rate, args.duration,
+            poisson=args.arrivals == "poisson",
+            max_in_flight=args.max_in_flight, rng=rng
+        )
+    else:
+        await closed_loop(workload, client, recorder, args.concurrency, args.duration)
+    report = recorder.report(time.perf_counter() - started)
+    report["config"] = {
+        "target": args.url or "in-process",
+        "mix": args.mix,
+        "mode": "open" if args.rate else "closed",
+        "rate": args.rate,
+        "arrivals": args.arrivals if args.rate else None,
+        "concurrency": None if args.rate else args.concurrency,
+        "duration": args.duration,
+        "seed": args.seed,
+    }
+    return report
+
+
+def _limits(args) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+
+
+async def run_remote(args) -> dict:
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=_limits(args), timeout=args.timeout
+    ) as client:
+        return await _drive(client, await discover_targets(client), args)
+
+
+async def run_in_process(args) -> dict:
+    # Importing the lifecycle benchmark points the app at the stand-in
+    from benchmarks.lifecycle.generators import DatasetSize, generate, load
+    from app.main import app
+    from app.utils.database import connect_db
+
+    dataset = generate(DatasetSize().scaled(args.scale), args.seed)
+    await load(connect_db(), dataset)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://load-test",
+            limits=_limits(args),
+            timeout=args.timeout
+        ) as client:
+            targets = Targets(
+                [user["id"] for user in dataset.users],
+                [fund["id"] for fund in dataset.funds],
+                dataset.active_subscription_ids
+            )
+            return await _drive(client, targets, args)
+
+
+def _print(report: dict):
+    print(
+        f"{'scenario':<14}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>8}{'rejected':>9}{'dropped':>8}"
+    )
+    for name, summary in [*report["scenarios"].items(), ("total", report["total"])]:
+        print(
+            f"{name:<14}{summary['requests']:>9}"
+            f"{summary['throughput_per_second']:>9.1f}"
+            f"{summary.get('p50_ms', 0):>9.1f}{summary.get('p90_ms', 0):>9.1f}"
+            f"{summary.get('p99_ms', 0):>9.1f}{summary['errors']:>8}"
+            f"{summary['rejected']:>9}{summary['dropped']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--url", help="running server; in-process when omitted")
+    parser.add_argument(
+        "--scale", type=float, default=0.01,
+        help="in-process dataset, as a fraction of the lifecycle benchmark's"
+    )
+    parser.add_argument(
+        "--mix", type=parse_mix,
+        default=DEFAULT_MIX, help="weights, e.g. browse=50,subscribe=20"
+    )
+    parser.add_argument("--rate", type=float, help="open loop: arrivals per second")
+    parser.add_argument(
+        "--arrivals", choices=["poisson", "uniform"], default="poisson"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16,
+        help="closed loop clients, when --rate is not given"
+    )
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+    _print(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
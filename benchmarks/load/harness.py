@@ -0,0 +1,149 @@
+# harness.py
+"""Request generation and latency accounting.
+
+Open loop (``rate``): requests start on an arrival schedule, Poisson or
+evenly spaced, whether or not earlier ones have finished, like independent
+clients. Latency is measured from the scheduled start, so time spent
+queued behind a slow server counts. Arrivals finding ``max_in_flight``
+requests pending are dropped and reported.
+
+Closed loop (``concurrency``): that many clients each send their next
+request as soon as the previous one answers.
+"""
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+
+from .scenarios import Workload
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _is_error(status) -> bool:
+    # Exceptions are recorded by name, server failures by their 5xx code
+    return not isinstance(status, int) or status >= 500
+
+
+class Recorder:
+    """_summary_
+    Latency and outcome of every request, by scenario.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, object]]] = defaultdict(list)
+        self.dropped: Counter = Counter()
+
+    def record(self, name: str, seconds: float, status):
+        self.samples[name].append((seconds, status))
+
+    def drop(self, name: str):
+        self.dropped[name] += 1
+
+    @staticmethod
+    def _summary(samples: list, dropped: int, duration: float) -> dict:
+        latencies = [seconds for seconds, _ in samples]
+        statuses = Counter(str(status) for _, status in samples)
+        errors = sum(_is_error(status) for _, status in samples)
+        rejected = sum(
+            isinstance(status, int) and 400 <= status < 500 for _, status in samples
+        )
+        summary = {
+            "requests": len(samples),
+            "throughput_per_second": round(len(samples) / duration, 3),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0,
+            "rejected": rejected,
+            "dropped": dropped,
+            "statuses": dict(statuses),
+        }
+        if latencies:
+            summary.update({
+                "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+                "p90_ms": round(_percentile(latencies, 0.9) * 1000, 3),
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+                "max_ms": round(max(latencies) * 1000, 3),
+            })
+        return summary
+
+    def report(self, duration: float) -> dict:
+        every = [sample for samples in self.samples.values() for sample in samples]
+        return {
+            "duration_seconds": round(duration, 3),
+            "total": self._summary(every, sum(self.dropped.values()), duration),
+            "scenarios": {
+                name: self._summary(samples, self.dropped[name], duration)
+                for name, samples in sorted(self.samples.items())
+            },
+        }
+
+
+async def _request(
+    workload: Workload,
+    name: str,
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    started: float
+):
+    try:
+        status = (await workload.run(name, client)).status_code
+    except Exception as e:
+        status = type(e).__name__
+    recorder.record(name, time.perf_counter() - started, status)
+
+
+async def open_loop(
+    workload: Workload,
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    rate: float,
+    duration: float,
+    poisson: bool = True,
+    max_in_flight: int = 1000,
+    rng: random.Random = None
+):
+    rng = rng or random.Random()
+    pending = set()
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += rng.expovariate(rate) if poisson else 1 / rate
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = workload.choose()
+        if len(pending) >= max_in_flight:
+            recorder.drop(name)
+            continue
+        task = asyncio.create_task(
+            _request(workload, name, client, recorder, scheduled)
+        )
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    await asyncio.gather(*pending)
+
+
+async def closed_loop(
+    workload: Workload,
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    concurrency: int,
+    duration: float
+):
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await _request(
+                workload, workload.choose(), client, recorder, time.perf_counter()
+            )
+
+    await asyncio.gather(*[user() for _ in range(concurrency)])
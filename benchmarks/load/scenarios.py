@@ -0,0 +1,119 @@
+# scenarios.py
+"""Operations of the workload mix, one HTTP request each.
+
+- ``browse``: a page of funds or one fund.
+- ``subscribe``: a random user to a random fund. A user already subscribed
+  to the fund gets a 400, counted as rejected rather than as an error.
+- ``cancel``: a subscription created earlier in the run, or else one that
+  was active when the test started.
+- ``transactions``: the transactions of a random user.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import httpx
+
+SCENARIOS = ["browse", "subscribe", "cancel", "transactions"]
+DEFAULT_MIX = {"browse": 50, "subscribe": 20, "cancel": 10, "transactions": 20}
+DISCOVERY_PAGE_SIZE = 1000
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """_summary_
+    Parse "browse=50,subscribe=20" into weights per scenario.
+    Raises:
+        ValueError: unknown scenario or no positive weight
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario {name!r}, expected one of {SCENARIOS}")
+        mix[name] = float(weight)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("the mix needs a scenario with a positive weight")
+    return mix
+
+
+@dataclass
+class Targets:
+    """_summary_
+    Ids the scenarios draw from, and the subscriptions they created.
+    """
+    user_ids: List[str]
+    fund_ids: List[str]
+    subscription_ids: List[str]
+    created: List[str] = field(default_factory=list)
+
+
+async def discover_targets(client: httpx.AsyncClient) -> Targets:
+    """_summary_
+    Read up to DISCOVERY_PAGE_SIZE users, funds and active subscriptions from
+    a running server.
+    Raises:
+        RuntimeError: the server has no users or no funds
+    """
+    params = {"limit": DISCOVERY_PAGE_SIZE}
+    users = (await client.get("/users/", params=params)).json()
+    funds = (await client.get("/funds/", params=params)).json()
+    subscriptions = (await client.get("/subscriptions/", params=params)).json()
+    if not users or not funds:
+        raise RuntimeError("the target has no users or funds to load-test with")
+    return Targets(
+        [user["id"] for user in users],
+        [fund["id"] for fund in funds],
+        [
+            item["subscription"]["id"] for item in subscriptions
+            if item["subscription"].get("status") == "active"
+        ]
+    )
+
+
+class Workload:
+    """_summary_
+    Pick scenarios by weight and send their request.
+    Args:
+        targets (Targets): ids to use
+        mix (dict): weight per scenario
+        rng (random.Random): source of the choices, seeded for reproducibility
+    """
+
+    def __init__(self, targets: Targets, mix: Dict[str, float], rng: random.Random):
+        self.targets = targets
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.rng = rng
+
+    def choose(self) -> str:
+        return self.rng.choices(self.names, self.weights)[0]
+
+    async def browse(self, client: httpx.AsyncClient) -> httpx.Response:
+        if self.rng.random() < 0.5:
+            return await client.get("/funds/")
+        return await client.get(f"/funds/{self.rng.choice(self.targets.fund_ids)}")
+
+    async def subscribe(self, client: httpx.AsyncClient) -> httpx.Response:
+        response = await client.post("/subscriptions/", json={
+            "user_id": self.rng.choice(self.targets.user_ids),
+            "fund_id": self.rng.choice(self.targets.fund_ids),
+            "status": "active",
+        })
+        if response.status_code == 200:
+            self.targets.created.append(response.json()["subscription_id"])
+        return response
+
+    async def cancel(self, client: httpx.AsyncClient) -> httpx.Response:
+        pool = self.targets.created or self.targets.subscription_ids
+        if not pool:
+            return await self.subscribe(client)
+        subscription_id = pool.pop(self.rng.randrange(len(pool)))
+        return await client.post(f"/subscriptions/cancel/{subscription_id}")
+
+    async def transactions(self, client: httpx.AsyncClient) -> httpx.Response:
+        user_id = self.rng.choice(self.targets.user_ids)
+        return await client.get(f"/subscriptions/{user_id}/transactions")
+
+    async def run(self, name: str, client: httpx.AsyncClient) -> httpx.Response:
+        return await getattr(self, name)(client)
@@ -0,0 +1,143 @@
+# round_trips.py
+"""Count the database round trips of list_subscriptions_with_users.
+
+Runs the listing against the in-process stand-in for growing numbers of
+subscriptions and prints the commands sent for each size. Each size is read
+as a single page holding every row. The number of queries, round trips
+other than the getMore batches of a large cursor, must stay flat: a value
+that grows with the data is an N+1 regression, and the command exits with 1
+when it does or when a listing misses rows.
+
+Usage:
+    python -m benchmarks.round_trips [--sizes 10 100 1000]
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Always benchmark against the in-process stand-in, never a real cluster
+os.environ["CONNECTION_URL"] = "mongomock://benchmarks"
+os.environ["CONNECTION_DATABASE"] = "benchmarks"
+
+from app.services import subscription_service  # noqa: E402
+from app.utils.constants import FundStatus, TransactionAction  # noqa: E402
+from app.utils.database import connect_db, get_client  # noqa: E402
+
+COLLECTIONS = ["users", "funds", "subscriptions", "transaction_history"]
+
+
+class RoundTripCounter:
+    """Command listener recording the name of every command sent."""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands = []
+
+
+async def seed(db, subscriptions: int, users: int = 50, funds: int = 5):
+    """_summary_
+    Replace the benchmark data with the given number of subscriptions, each
+    with a creation transaction, spread over users and funds.
+    """
+    for name in COLLECTIONS:
+        await db[name].delete_many({})
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    fund_ids = [str(uuid.uuid4()) for _ in range(funds)]
+    await db.users.insert_many([
+        {"id": user_id, "name": f"User {index}", "email": f"user{index}@example.com",
+         "investment_capital": 500000.0}
+        for index, user_id in enumerate(user_ids)
+    ])
+    await db.funds.insert_many([
+        {"id": fund_id, "name": f"Fund {index}", "category": "FPV",
+         "minimum_investment_amount": 75000.0, "status": FundStatus.ACTIVE}
+        for index, fund_id in enumerate(fund_ids)
+    ])
+    start = datetime(2024, 1, 1)
+    subscription_documents = [
+        {"id": str(uuid.uuid4()), "status": FundStatus.ACTIVE,
+         "user_id": user_ids[index % users], "fund_id": fund_ids[index % funds],
+         "last_transaction_at": start + timedelta(minutes=index),
+         "last_action": TransactionAction.CREATED}
+        for index in range(subscriptions)
+    ]
+    await db.subscriptions.insert_many(subscription_documents)
+    await db.transaction_history.insert_many([
+        {"id": str(uuid.uuid4()), "subscription_id": document["id"],
+         "action": TransactionAction.CREATED, "notification_channel": "email",
+         "timestamp": start + timedelta(minutes=index)}
+        for index, document in enumerate(subscription_documents)
+    ])
+
+
+async def measure(sizes) -> list:
+    db = connect_db()
+    counter = RoundTripCounter()
+    get_client().event_listeners.append(counter)
+    results = []
+    for size in sizes:
+        await seed(db, size)
+        # The seed writes behind the cache's back, drop the previous listing
+        await subscription_service.response_cache.clear()
+        counter.reset()
+        start = time.perf_counter()
+        # One page holding every row; the default page would cap the listing
+        listing = await subscription_service.list_subscriptions_with_users(
+            limit=size
+        )
+        elapsed = time.perf_counter() - start
+        results.append({
+            "subscriptions": size,
+            "rows": len(listing),
+            "round_trips": len(counter.commands),
+            "queries": sum(command != "getMore" for command in counter.commands),
+            "commands": list(counter.commands),
+            "seconds": round(elapsed, 4),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.round_trips")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    results = asyncio.run(measure(args.sizes))
+    print(
+        f"{'subscriptions':>13}  {'rows':>6}  {'queries':>7}  "
+        f"{'round trips':>11}  {'seconds':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['subscriptions']:>13}  {result['rows']:>6}  "
+            f"{result['queries']:>7}  {result['round_trips']:>11}  "
+            f"{result['seconds']:>8}"
+        )
+    incomplete = [
+        result["subscriptions"] for result in results
+        if result["rows"] != result["subscriptions"]
+    ]
+    if incomplete:
+        print(f"Listings missing rows for sizes {incomplete}")
+    growing = len({result["queries"] for result in results}) > 1
+    if growing:
+        print("Queries grow with the data")
+    if incomplete or growing:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# smtp_throughput.py
+"""Compare email throughput with and without the SMTP session pool.
+
+Sends the same messages to a local aiosmtpd server three ways: one
+connection per message (what EmailNotification used to do), the pool with
+one message per call, and the pool's batch API. ``--latency`` delays every
+SMTP command on the server side to stand in for the network round trips
+to a remote relay. The local server has no TLS or authentication, so opening
+a connection also waits ``--handshake-round-trips`` latencies (greeting,
+STARTTLS, TLS handshake, AUTH: 5 by default), in both modes alike.
+
+Usage:
+    python -m benchmarks.smtp_throughput [--messages 200] [--latency 0.005]
+"""
+import argparse
+import asyncio
+import smtplib
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiosmtpd.controller import Controller
+
+from app.utils.notification.smtp_pool import SMTPPool, build_message
+
+SENDER = "noreply@example.com"
+
+
+class SlowHandler:
+    """Accepts every message, waiting `latency` seconds on each command."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.latency)
+        envelope.mail_from = address
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.latency)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def slow_connect(handshake: float):
+    def connect(host: str, port: int, timeout: float = 30.0) -> smtplib.SMTP:
+        time.sleep(handshake)
+        return smtplib.SMTP(host, port, timeout=timeout)
+    return connect
+
+
+def send_unpooled(connect, port: int, to: str):
+    server = connect("127.0.0.1", port)
+    server.sendmail(SENDER, to, build_message(SENDER, to, "Hi", "Body").as_string())
+    server.quit()
+
+
+def measure(name: str, messages: int, work) -> dict:
+    started = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - started
+    return {"mode": name, "seconds": elapsed, "messages_per_second": messages / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--handshake-round-trips", type=int, default=5)
+    args = parser.parse_args()
+
+    port = free_port()
+    controller = Controller(SlowHandler(args.latency), hostname="127.0.0.1", port=port)
+    controller.start()
+    recipients = [f"user{index}@example.com" for index in range(args.messages)]
+    connect = slow_connect(args.latency * args.handshake_round_trips)
+    pool = SMTPPool("127.0.0.1", port, username=SENDER, starttls=False,
+                    size=args.threads, connect=connect)
+    try:
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = [
+                measure("connection per message", args.messages, lambda: list(
+                    executor.map(
+                        lambda to: send_unpooled(connect, port, to), recipients
+                    )
+                )),
+                measure("pooled sessions", args.messages, lambda: list(
+                    executor.map(lambda to: pool.send(to, "Hi", "Body"), recipients)
+                )),
+            ]
+        batches = [
+            [(to, "Hi", "Body") for to in recipients[start::args.threads]]
+            for start in range(args.threads)
+        ]
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results.append(measure("pooled batches", args.messages, lambda: list(
+                executor.map(pool.send_many, batches)
+            )))
+    finally:
+        pool.close()
+        controller.stop()
+
+    baseline = results[0]["messages_per_second"]
+    for result in results:
+        print(
+            f"{result['mode']:<24} {result['messages_per_second']:8.1f} msg/s "
+            f"({result['messages_per_second'] / baseline:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
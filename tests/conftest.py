@@ -0,0 +1,21 @@
+# tests/conftest.py
+import asyncio
+import os
+
+# Run the suite against the in-process stand-in instead of a real cluster
+os.environ.setdefault("CONNECTION_URL", "mongomock://localhost")
+os.environ.setdefault("CONNECTION_DATABASE", "investment_funds_test")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Caches are process-wide, every test starts with them empty
+    from app.repositories.cached_fund_repository import fund_cache
+    from app.repositories.cached_user_repository import user_cache
+    from app.utils.response_cache import response_cache
+    fund_cache.clear()
+    user_cache.clear()
+    asyncio.run(response_cache.clear())
+    yield
@@ -0,0 +1,73 @@
+# tests/mocks.py
+from unittest.mock import AsyncMock, MagicMock
+
+# Collection methods that are coroutines on pymongo's AsyncCollection
+AWAITABLE_METHODS = {
+    "aggregate",
+    "bulk_write",
+    "count_documents",
+    "create_index",
+    "create_indexes",
+    "delete_many",
+    "delete_one",
+    "distinct",
+    "find_one",
+    "find_one_and_update",
+    "index_information",
+    "insert_many",
+    "insert_one",
+    "list_indexes",
+    "replace_one",
+    "update_many",
+    "update_one",
+}
+
+
+class AsyncCursorMock:
+    """Async cursor over a fixed list of documents."""
+
+    def __init__(self, documents=None):
+        self.documents = list(documents or [])
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, *args, **kwargs):
+        return self
+
+    def limit(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        return self
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def to_list(self, length=None):
+        return list(self.documents[:length] if length else self.documents)
+
+
+class AsyncDatabaseMock(MagicMock):
+    """MagicMock standing in for an AsyncDatabase.
+
+    Awaitable collection methods are AsyncMocks, so tests keep configuring
+    them through return_value and side_effect. ``find`` returns an
+    AsyncCursorMock that yields nothing unless the test provides one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if kwargs.get("name") == "find":
+            self.return_value = AsyncCursorMock()
+
+    def _get_child_mock(self, **kwargs):
+        if kwargs.get("name") in AWAITABLE_METHODS:
+            method = AsyncMock(**kwargs)
+            method.return_value = MagicMock()
+            return method
+        return AsyncDatabaseMock(**kwargs)
@@ -0,0 +1,28 @@
+# tests/query_budget.py
+"""Query budgets: fail a test when code or an endpoint runs more database
+commands than allowed, so an N+1 regression breaks CI."""
+from contextlib import contextmanager
+
+from app.utils.query_accounting import QUERIES_HEADER, count_queries
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Assert that the block runs at most max_queries commands."""
+    with count_queries() as stats:
+        yield stats
+    assert stats.queries <= max_queries, (
+        f"{stats.queries} queries over a budget of {max_queries}: "
+        f"{stats.commands}"
+    )
+
+
+def assert_query_budget(response, max_queries: int):
+    """Assert that the request behind response ran at most max_queries
+    commands, as reported by its X-DB-Queries header."""
+    queries = int(response.headers[QUERIES_HEADER])
+    assert queries <= max_queries, (
+        f"{response.request.method} {response.request.url} ran {queries} "
+        f"queries over a budget of {max_queries}"
+    )
+    return queries
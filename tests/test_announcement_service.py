@@ -0,0 +1,246 @@
+# tests/test_announcement_service.py
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.migrations.indexes import ensure_indexes
+from app.models.announcement import Announcement
+from app.services import announcement_service
+from app.services.announcement_service import (
+    get_announcement,
+    run_announcement,
+    start_announcement,
+    start_announcements,
+    stop_announcements
+)
+from app.utils.constants import AnnouncementStatus
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.notification.fanout import FanoutSender, RateLimiter
+from app.utils.notification.notification_base import NotificationBase
+
+
+class RecordingChannel(NotificationBase):
+    def __init__(self, fail_after: int = None):
+        self.sent = []
+        self.bodies = []
+        self.fail_after = fail_after
+
+    def send_notification(self, to: str, subject: str, body: str):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise ConnectionError("relay down")
+        self.sent.append(to)
+        self.bodies.append(body)
+
+
+class FlakySender(FanoutSender):
+    """Fails the batch number `fail_on` once, before sending anything."""
+
+    def __init__(self, fail_on: int, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on = fail_on
+        self.calls = 0
+
+    async def send(self, messages):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise ConnectionError("relay down")
+        return await super().send(messages)
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        name = event.command_name
+        self.commands.append((name, event.command.get(name)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class TestAnnouncementService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.counter = CommandCounter()
+        self.db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[self.counter]
+        )["test"]
+        patcher = patch("app.services.announcement_service.db", new=self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        await ensure_indexes(self.db, ["subscriptions", "announcement_jobs"])
+        await self.db.funds.insert_one({"id": "fund123", "name": "Fund A"})
+        await self.db.users.insert_many([
+            {"id": f"user{index}", "name": f"User {index}",
+             "email": f"user{index}@example.com", "phone_number": f"300{index}"}
+            for index in range(250)
+        ] + [{"id": "no-contact", "name": "No contact"}])
+        await self.db.subscriptions.insert_many([
+            {"id": f"sub{index}", "user_id": f"user{index}", "fund_id": "fund123",
+             "status": "active",
+             "subscription_notification_channel": "sms" if index % 5 == 0 else "email"}
+            for index in range(250)
+        ] + [
+            {"id": "other", "user_id": "user0", "fund_id": "fund456",
+             "status": "active"},
+            {"id": "cancelled", "user_id": "user1", "fund_id": "fund123",
+             "status": "cancelled"},
+            {"id": "no-contact", "user_id": "no-contact", "fund_id": "fund123",
+             "status": "active"},
+        ])
+        self.channels = {"email": RecordingChannel(), "sms": RecordingChannel()}
+        self.counter.commands.clear()
+
+    def sender(self, **kwargs) -> FanoutSender:
+        return FanoutSender(get_channel=self.channels.__getitem__, **kwargs)
+
+    async def _job(self) -> str:
+        with patch("app.services.announcement_service._schedule"):
+            job = await start_announcement(
+                "fund123", Announcement(subject="Cambio", body="El fondo cambia")
+            )
+        return job["id"]
+
+    async def test_sends_to_every_active_subscriber_by_channel(self):
+        job_id = await self._job()
+
+        job = await run_announcement(job_id, self.sender(), batch_size=100)
+
+        self.assertEqual(job["status"], AnnouncementStatus.COMPLETED)
+        self.assertEqual((job["sent"], job["failed"], job["skipped"]), (250, 0, 1))
+        self.assertEqual(len(self.channels["sms"].sent), 50)
+        self.assertEqual(len(self.channels["email"].sent), 200)
+        self.assertIn("3005", self.channels["sms"].sent)
+        self.assertEqual(
+            self.channels["sms"].bodies[0], "Fund A: Cambio. El fondo cambia"
+        )
+        # Three batches of subscribers and one last empty read
+        subscription_reads = [
+            command for command in self.counter.commands
+            if command == ("find", "subscriptions")
+        ]
+        self.assertEqual(len(subscription_reads), 4)
+
+    async def test_resumes_after_the_checkpoint(self):
+        job_id = await self._job()
+        # Interrupted after its first batch was sent, with no retry left
+        with patch.object(
+            FanoutSender, "send", side_effect=[(80, 0), RuntimeError]
+        ), patch.object(announcement_service, "ANNOUNCEMENT_MAX_ATTEMPTS", 1):
+            self.assertIsNone(
+                await run_announcement(job_id, self.sender(), batch_size=100)
+            )
+        interrupted = await get_announcement(job_id)
+        await self.db.announcement_jobs.update_one(
+            {"id": job_id}, {"$set": {"locked_until": None}}
+        )
+
+        job = await run_announcement(job_id, self.sender(), batch_size=100)
+
+        self.assertEqual(interrupted["status"], AnnouncementStatus.RUNNING)
+        self.assertEqual(interrupted["sent"], 80)
+        self.assertEqual(job["sent"], 80 + 150)
+        self.assertEqual(
+            len(self.channels["email"].sent) + len(self.channels["sms"].sent), 150
+        )
+
+    @patch.object(announcement_service, "ANNOUNCEMENT_RETRY_DELAY_SECONDS", 0)
+    async def test_failed_batch_is_retried_without_a_restart(self):
+        job_id = await self._job()
+        sender = FlakySender(2, get_channel=self.channels.__getitem__)
+
+        job = await run_announcement(job_id, sender, batch_size=100)
+
+        self.assertEqual(job["status"], AnnouncementStatus.COMPLETED)
+        self.assertEqual(job["sent"], 250)
+        self.assertEqual(
+            len(self.channels["email"].sent) + len(self.channels["sms"].sent), 250
+        )
+
+    async def test_run_whose_lease_was_taken_over_stops(self):
+        job_id = await self._job()
+        db = self.db
+
+        class TakenOverSender(FanoutSender):
+            async def send(self, messages):
+                # Another worker claims the job while this batch is sent
+                await db.announcement_jobs.update_one(
+                    {"id": job_id}, {"$set": {"lease_owner": "other"}}
+                )
+                return await super().send(messages)
+
+        sender = TakenOverSender(get_channel=self.channels.__getitem__)
+
+        self.assertIsNone(await run_announcement(job_id, sender, batch_size=100))
+        job = await self.db.announcement_jobs.find_one({"id": job_id})
+        self.assertIsNone(job["checkpoint"])
+        self.assertEqual(job["sent"], 0)
+        self.assertEqual(job["status"], AnnouncementStatus.RUNNING)
+
+    @patch.object(announcement_service, "ANNOUNCEMENT_RESUME_INTERVAL_SECONDS", 0)
+    async def test_expired_jobs_are_resumed_periodically(self):
+        with patch(
+            "app.services.announcement_service.resume_announcements",
+            new=AsyncMock(side_effect=[ConnectionError, 0, 0])
+        ) as resume:
+            start_announcements()
+            while resume.await_count < 3:
+                await asyncio.sleep(0)
+            await stop_announcements()
+
+        self.assertEqual(resume.await_count, 3)
+
+    async def test_job_held_by_another_worker_is_not_run(self):
+        job_id = await self._job()
+        await announcement_service._claim(job_id)
+
+        self.assertIsNone(await run_announcement(job_id, self.sender()))
+        self.assertEqual(self.channels["email"].sent, [])
+
+    async def test_failed_sends_are_counted(self):
+        self.channels["sms"] = RecordingChannel(fail_after=10)
+        job_id = await self._job()
+
+        job = await run_announcement(job_id, self.sender(), batch_size=100)
+
+        self.assertEqual((job["sent"], job["failed"]), (210, 40))
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_spreads_acquisitions_over_time(self):
+        now = [0.0]
+        waits = []
+
+        async def sleep(seconds):
+            waits.append(seconds)
+
+        limiter = RateLimiter(10, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            await limiter.acquire(5)
+
+        self.assertEqual(waits, [0.5, 1.0])
+
+    async def test_unlimited(self):
+        limiter = RateLimiter(0, sleep=None)
+
+        await asyncio.gather(*[limiter.acquire(100) for _ in range(3)])
+
+
+def test_announcement_routes():
+    client = TestClient(app)
+
+    missing = client.post(
+        "/funds/missing/announcements", json={"subject": "Hola", "body": "Texto"}
+    )
+    unknown = client.get("/funds/announcements/missing")
+
+    assert missing.status_code == 404
+    assert unknown.status_code == 404
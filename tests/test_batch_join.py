@@ -0,0 +1,73 @@
+# tests/test_batch_join.py
+import pytest
+
+from app.utils.batch_join import fetch_by_keys, join_related
+from app.utils.in_memory_database import InMemoryAsyncClient
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture
+def counter():
+    return CommandCounter()
+
+
+@pytest.fixture
+async def db(counter):
+    database = InMemoryAsyncClient(
+        "mongomock://localhost", event_listeners=[counter]
+    )["test"]
+    await database.funds.insert_many([
+        {"id": "fund123", "name": "Fund A"},
+        {"id": "fund456", "name": "Fund B"},
+    ])
+    counter.commands.clear()
+    return database
+
+
+async def test_fetch_by_keys(db, counter):
+    funds = await fetch_by_keys(db.funds, ["fund123", "fund456", "fund123", None])
+
+    assert set(funds) == {"fund123", "fund456"}
+    assert isinstance(funds["fund123"]["_id"], str)
+    assert counter.commands == ["find"]
+
+
+async def test_fetch_by_keys_without_keys_skips_the_query(db, counter):
+    assert await fetch_by_keys(db.funds, [None]) == {}
+    assert counter.commands == []
+
+
+async def test_join_related_with_one_query(db, counter):
+    rows = [{"fund_id": "fund123"}, {"fund_id": "fund456"}, {"fund_id": "other"}]
+
+    await join_related(rows, db.funds, "fund_id", "fund")
+
+    assert rows[0]["fund"]["name"] == "Fund A"
+    assert rows[1]["fund"]["name"] == "Fund B"
+    assert "fund" not in rows[2]
+    assert counter.commands == ["find"]
+
+
+async def test_join_related_uses_known_documents(db, counter):
+    rows = [{"fund_id": "fund123"}]
+    known = {"fund123": {"id": "fund123", "name": "Cached"}}
+
+    await join_related(
+        rows, db.funds, lambda row: row["fund_id"], "fund", known=known
+    )
+
+    assert rows[0]["fund"]["name"] == "Cached"
+    assert counter.commands == []
@@ -0,0 +1,91 @@
+# tests/test_cache.py
+from app.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_and_set():
+    cache = TTLCache()
+    cache.set("fund123", {"name": "Fund A"})
+
+    assert cache.get("fund123") == {"name": "Fund A"}
+    assert cache.get("fund456") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_values_are_copied():
+    cache = TTLCache()
+    fund = {"name": "Fund A"}
+    cache.set("fund123", fund)
+    fund["name"] = "Changed"
+    cache.get("fund123")["name"] = "Changed"
+
+    assert cache.get("fund123") == {"name": "Fund A"}
+
+
+def test_entries_expire():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set("fund123", {"name": "Fund A"})
+
+    clock.now = 9.9
+    assert cache.get("fund123") == {"name": "Fund A"}
+    clock.now = 10
+    assert cache.get("fund123") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+async def test_get_or_load():
+    cache = TTLCache()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return {"name": "Fund A"}
+
+    assert await cache.get_or_load("fund123", load) == {"name": "Fund A"}
+    assert await cache.get_or_load("fund123", load) == {"name": "Fund A"}
+    assert len(calls) == 1
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+async def test_get_or_load_does_not_cache_none():
+    cache = TTLCache()
+
+    async def load():
+        return None
+
+    assert await cache.get_or_load("missing", load) is None
+    assert "missing" not in cache
+
+
+def test_older_versions_do_not_replace_newer_ones():
+    cache = TTLCache()
+
+    assert cache.set("user123", {"investment_capital": 100}, version=2)
+    assert not cache.set("user123", {"investment_capital": 500}, version=1)
+    assert cache.set("user123", {"investment_capital": 50}, version=3)
+
+    assert cache.get("user123") == {"investment_capital": 50}
+    assert cache.version("user123") == 3
@@ -0,0 +1,71 @@
+# tests/test_cached_fund_repository.py
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+
+from app.models.fund import Fund
+from app.repositories.cached_fund_repository import CachedFundRepository
+from app.repositories.fund_repository import FundRepository
+from app.services.fund_service import FundService
+from app.utils.cache import TTLCache
+from app.utils.pagination import Page
+
+
+@pytest.fixture
+def mock_repository():
+    return MagicMock(spec=FundRepository)
+
+
+@pytest.fixture
+def repository(mock_repository):
+    return CachedFundRepository(mock_repository, cache=TTLCache())
+
+
+async def test_get_fund_is_read_once(repository, mock_repository):
+    mock_repository.get_fund.return_value = {"id": "fund123", "name": "Fund A"}
+
+    first = await repository.get_fund("fund123")
+    second = await repository.get_fund("fund123")
+
+    assert first == second == {"id": "fund123", "name": "Fund A"}
+    mock_repository.get_fund.assert_called_once_with("fund123")
+    assert repository.cache.stats()["hits"] == 1
+
+
+async def test_missing_fund_is_not_cached(repository, mock_repository):
+    mock_repository.get_fund.side_effect = HTTPException(
+        status_code=404, detail="Fund not found"
+    )
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await repository.get_fund("fund123")
+
+    assert mock_repository.get_fund.call_count == 2
+
+
+async def test_list_funds_keeps_the_cursor(repository, mock_repository):
+    mock_repository.list_funds.return_value = Page(
+        [{"id": "fund123"}], next_cursor="cursor"
+    )
+
+    await repository.list_funds(limit=1)
+    page = await repository.list_funds(limit=1)
+
+    assert page == [{"id": "fund123"}]
+    assert page.next_cursor == "cursor"
+    mock_repository.list_funds.assert_called_once_with(limit=1, after=None)
+
+
+async def test_create_fund_invalidates_the_pages(repository, mock_repository):
+    mock_repository.list_funds.return_value = Page([{"id": "fund123"}])
+    mock_repository.create_fund.return_value = "fund456"
+    service = FundService(repository=repository)
+
+    await service.list_funds()
+    await service.create_fund(
+        Fund(name="Fund B", minimum_investment_amount=1000, category="FPV")
+    )
+    await service.list_funds()
+
+    assert mock_repository.list_funds.call_count == 2
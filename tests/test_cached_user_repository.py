@@ -0,0 +1,152 @@
+# tests/test_cached_user_repository.py
+import contextlib
+import json
+
+import pytest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repositories.cached_user_repository import CachedUserRepository
+from app.repositories.mongo_user_repository import MongoUserRepository
+from app.utils.cache import TTLCache
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.streaming import NDJSON_MEDIA_TYPE
+from tests.test_subscription_service import DB_TARGETS
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture
+def counter():
+    return CommandCounter()
+
+
+@pytest.fixture
+async def db(counter):
+    database = InMemoryAsyncClient(
+        "mongomock://localhost", event_listeners=[counter]
+    )["test"]
+    await database.users.insert_many([
+        {"id": "user123", "name": "John Doe", "investment_capital": 100000},
+        {"id": "user456", "name": "Jane Doe", "investment_capital": 100000},
+    ])
+    counter.commands.clear()
+    with patch('app.repositories.mongo_user_repository.db', new=database):
+        yield database
+
+
+@pytest.fixture
+def repository():
+    return CachedUserRepository(MongoUserRepository(), cache=TTLCache())
+
+
+async def test_get_user_is_read_once(db, counter, repository):
+    first = await repository.get_user("user123")
+    second = await repository.get_user("user123")
+
+    assert first["name"] == second["name"] == "John Doe"
+    assert isinstance(first["_id"], str)
+    assert counter.commands == ["find"]
+
+
+async def test_missing_user_is_not_cached(db, counter, repository):
+    assert await repository.get_user("missing") is None
+    assert await repository.get_user("missing") is None
+    assert counter.commands == ["find", "find"]
+
+
+async def test_debit_writes_the_user_through(db, counter, repository):
+    await repository.get_user("user123")
+
+    debited = await repository.debit_capital("user123", 75000)
+    cached = await repository.get_user("user123")
+
+    assert debited["investment_capital"] == 25000
+    assert debited["version"] == 1
+    assert cached["investment_capital"] == 25000
+    assert counter.commands == ["find", "findAndModify"]
+
+
+async def test_stale_entry_does_not_authorize_a_debit(db, repository):
+    await repository.get_user("user123")
+    # Spent by another process, the cached copy still shows 100000
+    await db.users.update_one(
+        {"id": "user123"}, {"$set": {"investment_capital": 1000}}
+    )
+
+    assert await repository.debit_capital("user123", 75000) is None
+    assert "user123" not in repository.cache
+    user = await db.users.find_one({"id": "user123"})
+    assert user["investment_capital"] == 1000
+
+
+async def test_older_copy_does_not_replace_a_newer_one(db, repository):
+    before = await repository.get_user("user123")
+    await repository.debit_capital("user123", 1000)
+    await repository.debit_capital("user123", 1000)
+
+    # A write that finished late, holding version 0
+    repository._store(before)
+
+    cached = await repository.get_user("user123")
+    assert cached["investment_capital"] == 98000
+    assert cached["version"] == 2
+
+
+async def test_bulk_writes_evict_the_users(db, repository):
+    await repository.get_user("user123")
+    await repository.get_user("user456")
+
+    debited = await repository.debit_capital_many(
+        {"user123": 75000, "user456": 200000}
+    )
+    await repository.credit_capital_many({"user456": 5000})
+
+    assert debited == {"user123"}
+    assert len(repository.cache) == 0
+    assert (await repository.get_user("user123"))["investment_capital"] == 25000
+    assert (await repository.get_user("user456"))["investment_capital"] == 105000
+
+
+async def test_responses_do_not_show_the_version(db):
+    await db.funds.insert_one(
+        {"id": "fund123", "name": "Fund A", "minimum_investment_amount": 10000}
+    )
+    targets = (*DB_TARGETS, 'app.services.user_service.db')
+    with contextlib.ExitStack() as stack:
+        for target in targets:
+            stack.enter_context(patch(target, new=db))
+        client = TestClient(app)
+        # Bumps the version of user123
+        created = client.post("/subscriptions/", json={
+            "user_id": "user123", "fund_id": "fund123", "status": "active"
+        })
+        users = client.get("/users/").json()
+        streamed = client.get("/users/", headers={"Accept": NDJSON_MEDIA_TYPE})
+        subscriptions = client.get("/subscriptions/user/user123").json()
+        transactions = client.get("/subscriptions/user123/transactions").json()
+
+    assert created.status_code == 200
+    assert (await db.users.find_one({"id": "user123"}))["version"] == 1
+    shown = [
+        *users,
+        *[json.loads(line) for line in streamed.text.splitlines()],
+        subscriptions[0]["user"],
+        transactions[0]["user"],
+    ]
+    for user in shown:
+        assert set(user) - {"_id"} == {"id", "name", "investment_capital"}
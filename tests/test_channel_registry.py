@@ -0,0 +1,116 @@
+# tests/test_channel_registry.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.notification.channel_registry import ChannelRegistry
+from app.utils.notification.notification_base import NotificationBase
+from app.utils.notification.notification_factory import (
+    NotificationFactory,
+    channel_registry
+)
+
+
+class FakeChannel(NotificationBase):
+    built = 0
+
+    def __init__(self):
+        FakeChannel.built += 1
+        self.closed = False
+
+    def send_notification(self, to: str, subject: str, body: str):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def reset_built():
+    FakeChannel.built = 0
+
+
+def test_channel_is_built_once():
+    registry = ChannelRegistry({"email": FakeChannel})
+
+    assert registry.get("email") is registry.get("email")
+    assert FakeChannel.built == 1
+
+
+def test_concurrent_first_use_builds_one_channel():
+    barrier = threading.Barrier(8)
+
+    def build():
+        # Slow enough for the other threads to arrive meanwhile
+        time.sleep(0.01)
+        return FakeChannel()
+
+    registry = ChannelRegistry({"email": build})
+
+    def get(_):
+        barrier.wait()
+        return registry.get("email")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        channels = list(executor.map(get, range(8)))
+
+    assert FakeChannel.built == 1
+    assert all(channel is channels[0] for channel in channels)
+
+
+def test_reload_closes_and_rebuilds():
+    registry = ChannelRegistry({"email": FakeChannel})
+    first = registry.get("email")
+
+    registry.reload()
+    second = registry.get("email")
+
+    assert first.closed
+    assert second is not first
+    assert not second.closed
+
+
+def test_shutdown_closes_the_channels():
+    registry = ChannelRegistry({"email": FakeChannel, "sms": FakeChannel})
+    channels = [registry.get("email"), registry.get("sms")]
+
+    registry.shutdown()
+
+    assert all(channel.closed for channel in channels)
+
+
+def test_unsupported_method():
+    with pytest.raises(ValueError):
+        ChannelRegistry({}).get("fax")
+
+
+def test_factory_builds_the_sms_client_once():
+    channel_registry.reload()
+    with patch("app.utils.notification.sms_notification.boto3.client") as client:
+        first = NotificationFactory.get_notification("sms")
+        second = NotificationFactory.get_notification("sms")
+        channel_registry.reload()
+
+    assert first is second
+    client.assert_called_once()
+    client.return_value.close.assert_called_once()
+
+
+def test_reload_drops_the_smtp_pool_of_the_old_credentials():
+    settings = {
+        "SMTP_SERVER": "smtp.example.com", "SMTP_PORT": "587",
+        "SMTP_USERNAME": "funds@example.com", "SMTP_PASSWORD": "old",
+    }
+    channel_registry.reload()
+    with patch.dict("os.environ", settings):
+        first = NotificationFactory.get_notification("email")
+    with patch.dict("os.environ", {**settings, "SMTP_PASSWORD": "new"}):
+        channel_registry.reload()
+        second = NotificationFactory.get_notification("email")
+    channel_registry.reload()
+
+    assert second.pool is not first.pool
+    assert second.pool.password == "new"
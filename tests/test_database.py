@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.utils import database
+from app.utils.in_memory_database import InMemoryAsyncClient
+
+
+@patch.dict("os.environ", {"CONNECTION_URL": "mongodb://localhost:27017"})
+class TestDatabase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self._previous_client = database._client
+        database._client = None
+
+    def tearDown(self):
+        database._client = self._previous_client
+
+    @patch.dict("os.environ", {
+        "MONGO_MAX_POOL_SIZE": "25",
+        "MONGO_MIN_POOL_SIZE": "5",
+        "MONGO_CONNECT_TIMEOUT_MS": "2000",
+        "MONGO_COMPRESSORS": "zlib"
+    })
+    def test_get_client_options_from_environment(self):
+        options = database.get_client_options()
+
+        self.assertEqual(options["maxPoolSize"], 25)
+        self.assertEqual(options["minPoolSize"], 5)
+        self.assertEqual(options["connectTimeoutMS"], 2000)
+        self.assertEqual(options["compressors"], "zlib")
+        self.assertNotIn("socketTimeoutMS", options)
+
+    @patch('app.utils.database.AsyncMongoClient')
+    def test_get_client_is_shared(self, mock_client):
+        first = database.get_client()
+        second = database.get_client()
+
+        self.assertIs(first, second)
+        mock_client.assert_called_once()
+
+    @patch.dict("os.environ", {"CONNECTION_DATABASE": "funds"})
+    @patch('app.utils.database.AsyncMongoClient')
+    def test_connect_db_borrows_shared_client(self, mock_client):
+        database.connect_db()
+        database.connect_db()
+
+        mock_client.assert_called_once()
+        mock_client.return_value.__getitem__.assert_called_with("funds")
+
+    @patch('app.utils.database.AsyncMongoClient')
+    async def test_close_client(self, mock_client):
+        mock_client.return_value.close = AsyncMock()
+        database.get_client()
+        await database.close_client()
+
+        mock_client.return_value.close.assert_awaited_once()
+
+    @patch.dict("os.environ", {"CONNECTION_DATABASE": "funds"})
+    @patch('app.utils.database.AsyncMongoClient')
+    async def test_closed_client_is_replaced(self, mock_client):
+        mock_client.side_effect = lambda *args, **kwargs: MagicMock(close=AsyncMock())
+        db = database.shared_db()
+        first = database.get_client()
+        await database.close_client()
+
+        db.users
+        second = database.get_client()
+
+        self.assertIsNot(first, second)
+        first.__getitem__.assert_not_called()
+        second.__getitem__.assert_called_with("funds")
+
+    @patch.dict("os.environ", {"CONNECTION_URL": "mongomock://localhost"})
+    def test_get_client_in_memory(self):
+        client = database.get_client()
+
+        self.assertIsInstance(client, InMemoryAsyncClient)
+
+
+if __name__ == '__main__':
+    unittest.main()
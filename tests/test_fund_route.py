@@ -4,7 +4,10 @@ from fastapi.testclient import TestClient
 from app.main import app
 from unittest.mock import patch, MagicMock
 from app.repositories.fund_repository import FundRepository
+from app.repositories.cached_fund_repository import CachedFundRepository
 from app.services.fund_service import FundService
+from app.utils.cache import TTLCache
+from app.utils.pagination import Page
 
 client = TestClient(app)
 
@@ -12,7 +15,11 @@ client = TestClient(app)
 # Configurar un repositorio simulado
 @pytest.fixture
 def mock_repository():
-    return MagicMock(spec=FundRepository)
+    repository = MagicMock(spec=FundRepository)
+    # Nothing cached, ETags are computed from the content
+    repository.fund_etag.return_value = None
+    repository.page_etag.return_value = None
+    return repository
 
 
 # Parchear el servicio para que use el repositorio simulado
@@ -97,3 +104,39 @@ def test_list_funds_empty(mock_repository):
     response = client.get("/funds/")
     assert response.status_code == 200
     assert response.json() == []
+
+
+def test_get_fund_not_modified_from_cache(mock_repository):
+    mock_repository.get_fund.return_value = {"id": "1", "name": "Fund A"}
+    cached_service = FundService(
+        repository=CachedFundRepository(mock_repository, cache=TTLCache())
+    )
+
+    with patch('app.routers.fund.fund_service', new=cached_service):
+        first = client.get("/funds/1")
+        second = client.get(
+            "/funds/1", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+    mock_repository.get_fund.assert_called_once_with("1")
+
+
+def test_list_funds_etag_changes_with_content(mock_repository):
+    mock_repository.list_funds.return_value = Page([{"id": "1"}], next_cursor="abc")
+    first = client.get("/funds/")
+
+    mock_repository.list_funds.return_value = Page([{"id": "1"}, {"id": "2"}])
+    second = client.get("/funds/", headers={"If-None-Match": first.headers["ETag"]})
+    third = client.get(
+        "/funds/", headers={"If-None-Match": f'W/{second.headers["ETag"]}, "other"'}
+    )
+
+    assert first.headers["X-Next-Cursor"] == "abc"
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert third.status_code == 304
@@ -17,11 +17,11 @@ def fund_service(mock_repository):
     return FundService(repository=mock_repository)
 
 
-def test_create_fund(fund_service, mock_repository):
+async def test_create_fund(fund_service, mock_repository):
     fund = Fund(name="test", minimum_investment_amount=100000, category="FPV")
     mock_repository.create_fund.return_value = "1"
 
-    response = fund_service.create_fund(fund)
+    response = await fund_service.create_fund(fund)
 
     assert response == {
         "message": FundSuccessMessage.SUCCESS_FUND_CREATED,
@@ -30,7 +30,7 @@ def test_create_fund(fund_service, mock_repository):
     mock_repository.create_fund.assert_called_once_with(fund)
 
 
-def test_get_fund(fund_service, mock_repository):
+async def test_get_fund(fund_service, mock_repository):
     fund_id = "1"
     mock_repository.get_fund.return_value = {
         "id": fund_id,
@@ -39,7 +39,7 @@ def test_get_fund(fund_service, mock_repository):
         "category": "FPV"
     }
 
-    response = fund_service.get_fund(fund_id)
+    response = await fund_service.get_fund(fund_id)
 
     assert response == {
         "id": fund_id,
@@ -50,7 +50,7 @@ def test_get_fund(fund_service, mock_repository):
     mock_repository.get_fund.assert_called_once_with(fund_id)
 
 
-def test_list_funds(fund_service, mock_repository):
+async def test_list_funds(fund_service, mock_repository):
     mock_repository.list_funds.return_value = [
         {
             "id": "1",
@@ -60,7 +60,7 @@ def test_list_funds(fund_service, mock_repository):
         }
     ]
 
-    response = fund_service.list_funds()
+    response = await fund_service.list_funds()
 
     assert response == [
         {
@@ -73,7 +73,7 @@ def test_list_funds(fund_service, mock_repository):
     mock_repository.list_funds.assert_called_once()
 
 
-def test_create_fund_Http_exception_error_v3(fund_service, mock_repository):
+async def test_create_fund_Http_exception_error_v3(fund_service, mock_repository):
     fund = Fund(
         name="test",
         minimum_investment_amount=100000,
@@ -85,7 +85,7 @@ def test_create_fund_Http_exception_error_v3(fund_service, mock_repository):
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        fund_service.create_fund(fund)
+        await fund_service.create_fund(fund)
 
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "Bad Request"
@@ -0,0 +1,103 @@
+# tests/test_in_memory_database.py
+import pytest
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.in_memory_database import InMemoryAsyncClient
+
+
+class RecordingListener:
+    def __init__(self):
+        self.started_events = []
+        self.succeeded_events = []
+        self.failed_events = []
+
+    def started(self, event):
+        self.started_events.append(event)
+
+    def succeeded(self, event):
+        self.succeeded_events.append(event)
+
+    def failed(self, event):
+        self.failed_events.append(event)
+
+
+@pytest.fixture
+def listener():
+    return RecordingListener()
+
+
+@pytest.fixture
+def db(listener):
+    client = InMemoryAsyncClient(
+        "mongomock://localhost", event_listeners=[listener]
+    )
+    return client["test"]
+
+
+async def test_insert_and_find_one(db, listener):
+    await db.users.insert_one({"id": "user123", "name": "John Doe"})
+
+    user = await db.users.find_one({"id": "user123"})
+
+    assert user["name"] == "John Doe"
+    assert [event.command_name for event in listener.succeeded_events] == [
+        "insert", "find"
+    ]
+
+
+async def test_find_returns_batches_as_get_more(db, listener):
+    await db.funds.insert_many([{"id": str(number)} for number in range(25)])
+    listener.succeeded_events.clear()
+
+    funds = await db.funds.find().sort("id", 1).batch_size(10).to_list()
+
+    assert len(funds) == 25
+    assert [event.command_name for event in listener.succeeded_events] == [
+        "find", "getMore", "getMore"
+    ]
+    first_batch = listener.succeeded_events[0].reply["cursor"]["firstBatch"]
+    assert len(first_batch) == 10
+
+
+async def test_aggregate(db):
+    await db.transaction_history.insert_many([
+        {"subscription_id": "sub123", "action": "created"},
+        {"subscription_id": "sub123", "action": "cancelled"},
+    ])
+
+    cursor = await db.transaction_history.aggregate([
+        {"$group": {"_id": "$subscription_id", "count": {"$sum": 1}}}
+    ])
+
+    assert await cursor.to_list() == [{"_id": "sub123", "count": 2}]
+
+
+async def test_failed_command_is_published(db, listener):
+    await db.users.create_index("id", unique=True)
+    await db.users.insert_one({"id": "user123"})
+
+    with pytest.raises(DuplicateKeyError):
+        await db.users.insert_one({"id": "user123"})
+
+    assert listener.failed_events[0].command_name == "insert"
+
+
+async def test_create_indexes_keeps_partial_filter(db):
+    await db.subscriptions.create_indexes([
+        IndexModel(
+            [("user_id", ASCENDING), ("fund_id", ASCENDING)], unique=True,
+            partialFilterExpression={"status": "active"}
+        )
+    ])
+    await db.subscriptions.insert_one(
+        {"user_id": "user123", "fund_id": "fund123", "status": "cancelled"}
+    )
+    await db.subscriptions.insert_one(
+        {"user_id": "user123", "fund_id": "fund123", "status": "active"}
+    )
+
+    with pytest.raises(DuplicateKeyError):
+        await db.subscriptions.insert_one(
+            {"user_id": "user123", "fund_id": "fund123", "status": "active"}
+        )
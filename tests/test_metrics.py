@@ -0,0 +1,84 @@
+# tests/test_metrics.py
+import unittest
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.metrics import (
+    CommandMetrics,
+    record_notification_batch,
+    registry,
+    track_notification
+)
+
+
+def sample(name: str, **labels) -> float:
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_timed_by_route_template():
+    client = TestClient(app)
+    labels = {"method": "GET", "route": "/funds/{fund_id}", "status": "404"}
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    client.get("/funds/missing-1")
+    client.get("/funds/missing-2")
+    client.get("/no/such/path")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert sample(
+        "http_request_duration_seconds_count",
+        method="GET", route="unmatched", status="404"
+    ) >= 1
+    assert sample(
+        "http_requests_in_progress", method="GET", route="/funds/{fund_id}"
+    ) == 0
+    assert 'mongodb_command_duration_seconds_count{collection="funds"' in (
+        response.text
+    )
+    assert sample("threadpool_threads") > 0
+
+
+class TestCommandMetrics(unittest.IsolatedAsyncioTestCase):
+
+    async def test_commands_are_timed_by_collection_and_command(self):
+        db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[CommandMetrics()]
+        )["metrics_test"]
+        labels = {"collection": "metrics_items", "command": "insert"}
+        before = sample("mongodb_command_duration_seconds_count", **labels)
+        failures = sample("mongodb_command_failures_total", **labels)
+
+        await db.metrics_items.create_index("key", unique=True)
+        await db.metrics_items.insert_one({"key": 1})
+        with self.assertRaises(Exception):
+            await db.metrics_items.insert_one({"key": 1})
+
+        self.assertEqual(
+            sample("mongodb_command_duration_seconds_count", **labels), before + 2
+        )
+        self.assertEqual(
+            sample("mongodb_command_failures_total", **labels), failures + 1
+        )
+
+
+def test_notifications_are_counted_by_channel():
+    before = sample("notification_send_duration_seconds_count", channel="test")
+    failures = sample("notification_failures_total", channel="test")
+
+    with track_notification("test"):
+        pass
+    with pytest.raises(ConnectionError):
+        with track_notification("test"):
+            raise ConnectionError("relay down")
+    record_notification_batch("test", 0.3, [None, ValueError("refused"), None])
+
+    assert sample("notification_send_duration_seconds_count", channel="test") == (
+        before + 5
+    )
+    assert sample("notification_failures_total", channel="test") == failures + 2
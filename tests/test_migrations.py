@@ -0,0 +1,172 @@
+# tests/test_migrations.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.migrations.indexes import INDEXES, check_indexes
+from app.migrations.migrations import (
+    MIGRATIONS,
+    MIGRATIONS_COLLECTION,
+    MigrationError,
+    apply_migrations,
+    migration_status
+)
+from app.utils.in_memory_database import InMemoryAsyncClient
+
+
+@pytest.fixture
+def db():
+    return InMemoryAsyncClient("mongomock://localhost")["test"]
+
+
+async def test_apply_migrations_creates_declared_indexes(db):
+    applied = await apply_migrations(db)
+
+    assert applied == [migration.version for migration in MIGRATIONS]
+    for collection_name, indexes in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for index in indexes:
+            assert index.document["name"] in existing
+
+
+async def test_apply_migrations_is_idempotent(db):
+    await apply_migrations(db)
+
+    assert await apply_migrations(db) == []
+    records = await db[MIGRATIONS_COLLECTION].find({}).to_list()
+    assert all(record["status"] == "applied" for record in records)
+
+
+async def test_migration_status(db):
+    pending = await migration_status(db)
+    await apply_migrations(db)
+    applied = await migration_status(db)
+
+    assert {item["status"] for item in pending} == {"pending"}
+    assert {item["status"] for item in applied} == {"applied"}
+
+
+async def test_check_indexes_reports_missing_and_undeclared(db):
+    await apply_migrations(db)
+    await db.users.drop_index("users_id_unique")
+    await db.users.create_index("email", name="users_email")
+
+    report = await check_indexes(db)
+
+    assert report["users"]["missing"] == ["users_id_unique"]
+    assert report["users"]["undeclared"] == ["users_email"]
+    assert report["funds"]["missing"] == []
+
+
+async def test_backfill_last_transaction(db):
+    await db.subscriptions.insert_many([
+        {"id": "sub123", "status": "cancelled"},
+        {"id": "sub456", "status": "active", "user_id": "user123",
+         "fund_id": "fund123", "last_transaction_at": datetime(2024, 1, 1),
+         "last_action": "created"},
+        {"id": "sub789", "status": "active", "user_id": "user123",
+         "fund_id": "fund456"},
+    ])
+    await db.transaction_history.insert_many([
+        {"subscription_id": "sub123", "action": "created",
+         "timestamp": datetime(2023, 1, 1)},
+        {"subscription_id": "sub123", "action": "cancelled",
+         "timestamp": datetime(2023, 1, 2)},
+        {"subscription_id": "sub456", "action": "created",
+         "timestamp": datetime(2023, 1, 1)},
+    ])
+
+    await apply_migrations(db)
+
+    subscriptions = {
+        subscription["id"]: subscription
+        async for subscription in db.subscriptions.find({})
+    }
+    assert subscriptions["sub123"]["last_transaction_at"] == datetime(2023, 1, 2)
+    assert subscriptions["sub123"]["last_action"] == "cancelled"
+    # Already set, left alone
+    assert subscriptions["sub456"]["last_transaction_at"] == datetime(2024, 1, 1)
+    assert "last_transaction_at" not in subscriptions["sub789"]
+
+
+async def test_empty_pending_debits_are_removed(db):
+    await db.users.insert_many([
+        {"id": "user123", "pending_debits": []},
+        {"id": "user456", "pending_debits": ["batch"]},
+    ])
+
+    await apply_migrations(db)
+
+    users = {user["id"]: user async for user in db.users.find({})}
+    assert "pending_debits" not in users["user123"]
+    assert users["user456"]["pending_debits"] == ["batch"]
+
+
+async def test_running_migration_blocks_later_versions(db):
+    await db[MIGRATIONS_COLLECTION].insert_one(
+        {"_id": 1, "status": "running", "started_at": datetime.utcnow()}
+    )
+
+    with pytest.raises(MigrationError, match="Migration 1 is being applied"):
+        await apply_migrations(db, wait=0)
+
+    assert await db[MIGRATIONS_COLLECTION].count_documents({}) == 1
+
+
+async def test_waits_for_migration_running_elsewhere(db, monkeypatch):
+    monkeypatch.setattr(
+        "app.migrations.migrations.MIGRATION_POLL_SECONDS", 0.01
+    )
+    await db[MIGRATIONS_COLLECTION].insert_one(
+        {"_id": 1, "status": "running", "started_at": datetime.utcnow()}
+    )
+
+    async def finish_elsewhere():
+        await asyncio.sleep(0.05)
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": 1}, {"$set": {"status": "applied"}}
+        )
+
+    finishing = asyncio.ensure_future(finish_elsewhere())
+    applied = await apply_migrations(db, wait=5)
+    await finishing
+
+    assert applied == [2, 3]
+
+
+async def test_stale_running_claim_is_taken_over(db):
+    await db[MIGRATIONS_COLLECTION].insert_one({
+        "_id": 1,
+        "status": "running",
+        "started_at": datetime.utcnow() - timedelta(hours=1)
+    })
+
+    applied = await apply_migrations(db, wait=0, lease=60)
+
+    assert applied == [1, 2, 3]
+    record = await db[MIGRATIONS_COLLECTION].find_one({"_id": 1})
+    assert record["status"] == "applied"
+    assert "retaken_at" in record
+
+
+async def test_duplicate_active_subscriptions_stop_migrations(db):
+    await db.subscriptions.insert_many([
+        {"id": "sub123", "status": "active", "user_id": "user123",
+         "fund_id": "fund123"},
+        {"id": "sub456", "status": "active", "user_id": "user123",
+         "fund_id": "fund123"},
+        {"id": "sub789", "status": "cancelled", "user_id": "user456",
+         "fund_id": "fund123"},
+        {"id": "sub790", "status": "active", "user_id": "user456",
+         "fund_id": "fund123"},
+    ])
+
+    with pytest.raises(MigrationError) as error:
+        await apply_migrations(db)
+
+    message = str(error.value)
+    assert "user user123 / fund fund123: subscriptions sub123, sub456" in message
+    assert "user456" not in message
+    # Migration 1 is released so a retry after the cleanup applies it
+    assert await db[MIGRATIONS_COLLECTION].find_one({"_id": 1}) is None
@@ -0,0 +1,92 @@
+# tests/test_notification_dispatcher.py
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.notification.dispatcher import NotificationDispatcher
+from app.utils.notification.notification_base import (
+    NotificationBase,
+    NotificationError
+)
+
+
+class FakeChannel(NotificationBase):
+    """Records the messages, failing the first `failures` sends."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.sent = []
+
+    def send_notification(self, to: str, subject: str, body: str):
+        if self.failures:
+            self.failures -= 1
+            raise NotificationError("SMTP unavailable")
+        self.sent.append((to, subject, body))
+
+
+def dispatcher_for(channel: FakeChannel) -> NotificationDispatcher:
+    return NotificationDispatcher(get_channel=lambda method: channel)
+
+
+class TestNotificationDispatcher(unittest.IsolatedAsyncioTestCase):
+
+    async def test_deliver_sends_through_the_channel(self):
+        channel = FakeChannel()
+        dispatcher = dispatcher_for(channel)
+
+        await dispatcher.deliver("email", "john@example.com", "Hi", "Body")
+
+        self.assertEqual(channel.sent, [("john@example.com", "Hi", "Body")])
+        stats = dispatcher.stats()
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual(stats["send_latency_seconds"]["count"], 1)
+
+    async def test_deliver_raises_and_counts_failures(self):
+        dispatcher = dispatcher_for(FakeChannel(failures=1))
+
+        with self.assertRaises(NotificationError):
+            await dispatcher.deliver("sms", "3001234567", "Hi", "Body")
+
+        self.assertEqual(dispatcher.stats()["failed"], 1)
+
+
+NOTIFICATION_ROUTES = [
+    "/notifications/metrics",
+    "/notifications/dead-letters",
+    "/notifications/outbox",
+]
+
+
+@patch.dict("os.environ", {"ADMIN_TOKEN": "secret"})
+def test_notification_routes_require_the_admin_token():
+    with TestClient(app) as client:
+        for route in NOTIFICATION_ROUTES:
+            anonymous = client.get(route)
+            refused = client.get(route, headers={"Authorization": "Bearer wrong"})
+
+            assert anonymous.status_code == 401
+            assert refused.status_code == 401
+
+
+def test_notification_routes_are_off_without_a_token():
+    with TestClient(app) as client:
+        for route in NOTIFICATION_ROUTES:
+            assert client.get(route).status_code == 404
+
+
+@patch.dict("os.environ", {"ADMIN_TOKEN": "secret"})
+def test_metrics_route_reports_the_outbox():
+    headers = {"Authorization": "Bearer secret"}
+    with TestClient(app) as client:
+        metrics = client.get("/notifications/metrics", headers=headers)
+        dead_letters = client.get("/notifications/dead-letters", headers=headers)
+
+    assert metrics.status_code == 200
+    assert metrics.json()["outbox"]["running"] is True
+    assert set(metrics.json()["outbox"]["entries"]) == {
+        "pending", "sending", "sent", "failed"
+    }
+    assert dead_letters.status_code == 200
+    assert dead_letters.json() == []
@@ -0,0 +1,151 @@
+# tests/test_notification_outbox.py
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from app.migrations.indexes import ensure_indexes
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.notification.notification_base import NotificationError
+from app.utils.notification.outbox import OutboxStatus, OutboxWorker, outbox_entry
+
+
+class TestOutboxWorker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.db = InMemoryAsyncClient("mongomock://localhost")["test"]
+        await ensure_indexes(self.db, ["notification_outbox"])
+        self.collection = self.db.notification_outbox
+        self.sent = []
+        self.failures = 0
+
+    async def deliver(self, method, to, subject, body):
+        if self.failures:
+            self.failures -= 1
+            raise NotificationError("SMTP unavailable")
+        self.sent.append(to)
+
+    def worker(self, **kwargs) -> OutboxWorker:
+        return OutboxWorker(self.collection, deliver=self.deliver, **kwargs)
+
+    async def _add(self, count: int):
+        await self.collection.insert_many([
+            outbox_entry("email", f"user{index}@example.com", "Hi", "Body")
+            for index in range(count)
+        ])
+
+    async def _statuses(self):
+        return [
+            entry["status"] async for entry in self.collection.find().sort("_id", 1)
+        ]
+
+    async def test_process_batch_sends_and_marks_entries(self):
+        await self._add(5)
+        worker = self.worker(batch_size=3)
+
+        first = await worker.process_batch()
+        second = await worker.process_batch()
+        third = await worker.process_batch()
+
+        self.assertEqual((first, second, third), (3, 2, 0))
+        self.assertEqual(len(self.sent), 5)
+        self.assertEqual(await self._statuses(), [OutboxStatus.SENT] * 5)
+        entry = await self.collection.find_one()
+        self.assertNotIn("claim_id", entry)
+        self.assertIsNotNone(entry["sent_at"])
+
+    async def test_failure_backs_off_then_gives_up(self):
+        await self._add(1)
+        self.failures = 10
+        worker = self.worker(max_attempts=2, retry_delay=30)
+
+        await worker.process_batch()
+        entry = await self.collection.find_one()
+        self.assertEqual(entry["status"], OutboxStatus.PENDING)
+        self.assertEqual(entry["attempts"], 1)
+        self.assertEqual(entry["last_error"], "SMTP unavailable")
+        self.assertGreater(
+            entry["next_attempt_at"], datetime.utcnow() + timedelta(seconds=25)
+        )
+        # Not due yet
+        self.assertEqual(await worker.process_batch(), 0)
+
+        await self.collection.update_one(
+            {}, {"$set": {"next_attempt_at": datetime.utcnow()}}
+        )
+        await worker.process_batch()
+
+        self.assertEqual(await self._statuses(), [OutboxStatus.FAILED])
+        self.assertEqual(worker.dead, 1)
+        failed, = await worker.failed_entries()
+        self.assertEqual(failed["to"], "user0@example.com")
+        self.assertEqual(failed["attempts"], 2)
+        self.assertEqual(failed["last_error"], "SMTP unavailable")
+        stats = await worker.stats()
+        self.assertEqual(stats["entries"][OutboxStatus.FAILED], 1)
+        self.assertEqual(stats["attempts"][OutboxStatus.FAILED], 2)
+
+    async def test_claimed_entries_are_not_claimed_twice(self):
+        await self._add(2)
+        first = await self.worker().claim()
+        second = await self.worker().claim()
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(second, [])
+
+    async def test_expired_lease_is_claimed_again(self):
+        await self._add(1)
+        await self.worker(lease=60).claim()
+        # The worker holding the claim died and its lease ran out
+        await self.collection.update_one(
+            {}, {"$set": {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+        await self.worker().process_batch()
+
+        entry = await self.collection.find_one()
+        self.assertEqual(entry["status"], OutboxStatus.SENT)
+        self.assertEqual(entry["attempts"], 2)
+
+    async def test_running_worker_is_woken_by_new_entries(self):
+        worker = self.worker(poll_interval=60)
+        worker.start()
+        await asyncio.sleep(0)
+
+        await self._add(2)
+        worker.wake()
+        for _ in range(100):
+            if len(self.sent) == 2:
+                break
+            await asyncio.sleep(0.01)
+        stats = await worker.stats()
+        await worker.stop()
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(stats["entries"][OutboxStatus.SENT], 2)
+        self.assertTrue(stats["running"])
+        self.assertFalse(worker.running)
+
+    async def test_worker_survives_an_unexpected_error(self):
+        worker = self.worker(poll_interval=0.01)
+        process_batch = worker.process_batch
+        calls = []
+
+        async def failing_once():
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError("unexpected")
+            return await process_batch()
+
+        worker.process_batch = failing_once
+        await self._add(1)
+        with self.assertLogs("app.utils.notification.outbox", "ERROR"):
+            worker.start()
+            for _ in range(100):
+                if self.sent:
+                    break
+                await asyncio.sleep(0.01)
+        running = worker.running and not worker._task.done()
+        await worker.stop()
+
+        self.assertTrue(running)
+        self.assertEqual(self.sent, ["user0@example.com"])
@@ -0,0 +1,106 @@
+# tests/test_notification_templates.py
+import os
+import tempfile
+import unittest
+
+from jinja2 import TemplatesNotFound, UndefinedError
+
+from app.utils.constants import NotificationEvent, SubscriptionNotificationChannel
+from app.utils.notification.templates import NotificationTemplates
+
+USER = {"name": "Ana"}
+FUND = {"name": "FPV_BTG_PACTUAL_RECAUDADORA"}
+
+
+class TestNotificationTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.templates = NotificationTemplates()
+
+    def test_renders_the_subject_and_body_in_spanish_by_default(self):
+        message = self.templates.render(
+            NotificationEvent.SUBSCRIPTION_CREATED,
+            SubscriptionNotificationChannel.EMAIL,
+            user=USER, fund=FUND
+        )
+
+        self.assertEqual(
+            message.subject, "Suscripción a FPV_BTG_PACTUAL_RECAUDADORA confirmada"
+        )
+        self.assertTrue(message.body.startswith("Hola Ana,"))
+
+    def test_locale_falls_back_to_its_language_then_the_default(self):
+        english = self.templates.render(
+            NotificationEvent.SUBSCRIPTION_CANCELLED,
+            SubscriptionNotificationChannel.EMAIL, "en-US", user=USER, fund=FUND
+        )
+        unknown = self.templates.render(
+            NotificationEvent.SUBSCRIPTION_CANCELLED,
+            SubscriptionNotificationChannel.EMAIL, "pt", user=USER, fund=FUND
+        )
+
+        self.assertTrue(english.body.startswith("Dear Ana,"))
+        self.assertTrue(unknown.body.startswith("Hola Ana,"))
+
+    def test_sms_is_cut_to_the_maximum_length(self):
+        templates = NotificationTemplates(sms_max_length=40)
+
+        message = templates.render(
+            NotificationEvent.ANNOUNCEMENT, SubscriptionNotificationChannel.SMS,
+            user=USER, fund=FUND, subject="Cambio", body="texto " * 50
+        )
+
+        self.assertEqual(message.subject, "")
+        self.assertLessEqual(len(message.body), 40)
+        self.assertTrue(message.body.endswith("..."))
+
+    def test_templates_are_compiled_once_per_event_locale_and_channel(self):
+        for index in range(1000):
+            self.templates.render(
+                NotificationEvent.SUBSCRIPTION_CREATED,
+                SubscriptionNotificationChannel.SMS,
+                "es" if index % 2 else None,
+                user={"name": f"User {index}"}, fund=FUND
+            )
+
+        self.assertEqual(self.templates.compilations, 1)
+
+    def test_missing_variables_and_templates_raise(self):
+        with self.assertRaises(UndefinedError):
+            self.templates.render(
+                NotificationEvent.SUBSCRIPTION_CREATED,
+                SubscriptionNotificationChannel.EMAIL, user=USER
+            )
+        with self.assertRaises(TemplatesNotFound):
+            self.templates.render("unknown", SubscriptionNotificationChannel.EMAIL)
+
+    def test_locales_are_normalized_to_the_template_folders(self):
+        for index in range(200):
+            self.templates.render(
+                NotificationEvent.SUBSCRIPTION_CREATED,
+                SubscriptionNotificationChannel.SMS,
+                f"xx-{index}", user=USER, fund=FUND
+            )
+        english = self.templates.render(
+            NotificationEvent.SUBSCRIPTION_CREATED,
+            SubscriptionNotificationChannel.EMAIL, "EN_gb", user=USER, fund=FUND
+        )
+
+        self.assertEqual(self.templates.resolve_locale("es-CO"), "es")
+        self.assertEqual(self.templates.resolve_locale("../en"), "es")
+        self.assertTrue(english.body.startswith("Dear Ana,"))
+        self.assertEqual(len(self.templates._compiled), 2)
+
+    def test_broken_locale_falls_back_to_the_default_one(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for locale, body in (("es", "Hola {{ user.name }}"),
+                                 ("en", "Dear {{ user.first_name }}")):
+                os.mkdir(os.path.join(directory, locale))
+                with open(os.path.join(directory, locale, "greeting.sms.j2"), "w") as f:
+                    f.write("{% block body %}" + body + "{% endblock %}")
+            templates = NotificationTemplates(directory)
+
+            with self.assertLogs("app.utils.notification.templates", "ERROR"):
+                message = templates.render("greeting", "sms", "en", user=USER)
+
+        self.assertEqual(message.body, "Hola Ana")
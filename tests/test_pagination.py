@@ -0,0 +1,132 @@
+# tests/test_pagination.py
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.main import app
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.pagination import decode_cursor, encode_cursor, fetch_page
+
+client = TestClient(app)
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture
+def counter():
+    return CommandCounter()
+
+
+@pytest.fixture
+async def db(counter):
+    database = InMemoryAsyncClient(
+        "mongomock://localhost", event_listeners=[counter]
+    )["test"]
+    await database.users.insert_many([
+        {"id": f"user{index}", "name": f"User {index}", "email": "user@example.com"}
+        for index in range(7)
+    ])
+    counter.commands.clear()
+    return database
+
+
+def test_cursor_round_trip():
+    object_id = ObjectId()
+
+    assert decode_cursor(encode_cursor(object_id)) == object_id
+
+
+def test_invalid_cursor():
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor("not-a-cursor")
+
+    assert excinfo.value.status_code == 400
+
+
+async def test_fetch_page_walks_the_collection(db, counter):
+    pages = []
+    after = None
+    while True:
+        page = await fetch_page(db.users, limit=3, after=after)
+        pages.append([user["id"] for user in page])
+        after = page.next_cursor
+        if not after:
+            break
+
+    assert pages == [
+        ["user0", "user1", "user2"],
+        ["user3", "user4", "user5"],
+        ["user6"],
+    ]
+    # One query per page, however deep
+    assert counter.commands == ["find", "find", "find"]
+
+
+async def test_fetch_page_with_filter(db):
+    page = await fetch_page(db.users, {"id": {"$in": ["user1", "user5"]}}, limit=1)
+
+    assert [user["id"] for user in page] == ["user1"]
+    assert page.next_cursor is not None
+
+
+def test_get_all_users_paginates(db):
+    with patch('app.services.user_service.db', new=db):
+        first = client.get("/users/", params={"limit": 5})
+        second = client.get(
+            "/users/",
+            params={"limit": 5, "after": first.headers["X-Next-Cursor"]}
+        )
+
+    assert first.status_code == 200
+    assert len(first.json()) == 5
+    assert "_id" not in first.json()[0]
+    assert 'rel="next"' in first.headers["Link"]
+    assert [user["id"] for user in second.json()] == ["user5", "user6"]
+    assert "X-Next-Cursor" not in second.headers
+
+
+def test_get_all_users_invalid_cursor(db):
+    with patch('app.services.user_service.db', new=db):
+        response = client.get("/users/", params={"after": "%%%"})
+
+    assert response.status_code == 400
+
+
+async def test_fetch_page_without_limit_reads_everything(db):
+    page = await fetch_page(db.users, limit=None)
+
+    assert len(page) == 7
+    assert page.next_cursor is None
+
+
+@patch("app.utils.pagination.DEFAULT_PAGE_SIZE", 3)
+def test_get_all_users_without_paging_parameters_returns_every_user(db):
+    with patch('app.services.user_service.db', new=db):
+        everything = client.get("/users/")
+        first = client.get("/users/", params={"limit": 3})
+        second = client.get(
+            "/users/", params={"after": first.headers["X-Next-Cursor"]}
+        )
+
+    # Clients that do not read the paging headers get the whole list
+    assert everything.status_code == 200
+    assert [user["id"] for user in everything.json()] == [
+        f"user{index}" for index in range(7)
+    ]
+    assert "X-Next-Cursor" not in everything.headers
+    # Only after: a page of the default size
+    assert [user["id"] for user in second.json()] == ["user3", "user4", "user5"]
@@ -0,0 +1,106 @@
+# tests/test_query_accounting.py
+import asyncio
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.subscription import Subscription
+from app.services.subscription_service import (
+    create_subscriptions_bulk,
+    list_subscriptions_with_users
+)
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.query_accounting import query_accounting
+from app.utils.response_cache import ResponseCache
+from tests.query_budget import assert_query_budget, query_budget
+from tests.test_subscription_service import DB_TARGETS
+
+
+class TestQueryAccounting(unittest.TestCase):
+
+    def setUp(self):
+        self.db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[query_accounting]
+        )["test"]
+        for patcher in [patch(target, new=self.db) for target in DB_TARGETS]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        asyncio.run(self._seed())
+        self.client = TestClient(app)
+
+    async def _seed(self):
+        await self.db.users.insert_many([
+            {"id": f"user{index}", "name": f"User {index}",
+             "email": f"user{index}@example.com", "investment_capital": 100000}
+            for index in range(40)
+        ])
+        await self.db.funds.insert_many([
+            {"id": "fund123", "name": "Fund A", "minimum_investment_amount": 10000},
+            {"id": "fund456", "name": "Fund B", "minimum_investment_amount": 20000},
+        ])
+        await create_subscriptions_bulk([
+            Subscription(user_id=f"user{index}", fund_id=fund_id, status="active")
+            for index in range(40) for fund_id in ("fund123", "fund456")
+        ])
+
+    def test_headers_report_the_queries_of_the_request(self):
+        response = self.client.get("/subscriptions/user/user0")
+
+        self.assertEqual(response.status_code, 200)
+        queries = int(response.headers["X-DB-Queries"])
+        self.assertGreater(queries, 0)
+        self.assertRegex(
+            response.headers["Server-Timing"],
+            rf'^db;dur=[0-9.]+;desc="{queries} queries"$'
+        )
+
+    def test_requests_are_logged_as_json(self):
+        with self.assertLogs("app.db.queries", logging.INFO) as logs:
+            response = self.client.get("/subscriptions/user/user0")
+
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry["path"], "/subscriptions/user/user0")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["db_queries"], int(response.headers["X-DB-Queries"]))
+        self.assertGreater(entry["db_documents"], 0)
+
+    def test_subscription_listings_stay_within_their_budget(self):
+        # The budgets do not depend on the page size: a query per row
+        # would go over them
+        for limit in (5, 80):
+            assert_query_budget(self.client.get(f"/subscriptions/?limit={limit}"), 3)
+        assert_query_budget(self.client.get("/subscriptions/user/user1"), 3)
+        assert_query_budget(self.client.get("/subscriptions/user2/transactions"), 4)
+
+    def test_subscription_creation_stays_within_its_budget(self):
+        asyncio.run(self.db.users.insert_one({
+            "id": "user40", "name": "User 40", "email": "user40@example.com",
+            "investment_capital": 100000
+        }))
+
+        response = self.client.post("/subscriptions/", json={
+            "user_id": "user40", "fund_id": "fund123", "status": "active"
+        })
+
+        self.assertEqual(response.status_code, 200)
+        # Debit, subscription, then the transaction and the outbox entry
+        # written concurrently: 3 round trips in sequence, 4 commands, plus
+        # the fund when the catalog cache is cold
+        self.assertEqual(assert_query_budget(response, 5), 5)
+
+    def test_query_budget_fails_over_the_limit(self):
+        async def list_twice():
+            with query_budget(3):
+                await list_subscriptions_with_users(limit=80)
+            with query_budget(1):
+                await list_subscriptions_with_users(limit=40, after=None)
+
+        with patch(
+            "app.services.subscription_service.response_cache", ResponseCache(None)
+        ):
+            with self.assertRaises(AssertionError):
+                asyncio.run(list_twice())
@@ -0,0 +1,184 @@
+# tests/test_response_cache.py
+import asyncio
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.response_cache import (
+    MemoryBackend,
+    MongoBackend,
+    ResponseCache,
+    create_response_cache
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def backends():
+    db = InMemoryAsyncClient("mongomock://localhost")["test"]
+    return [MemoryBackend(), MongoBackend(db.response_cache)]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.mark.parametrize("backend", backends(), ids=["memory", "mongo"])
+def test_cached_loads_once(backend):
+    cache = ResponseCache(backend)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return [{"id": "sub1"}]
+
+    async def scenario():
+        first = await cache.cached("subscriptions:100:", ["subscriptions"], load)
+        second = await cache.cached("subscriptions:100:", ["subscriptions"], load)
+        return first, second, await cache.stats()
+
+    first, second, stats = run(scenario())
+
+    assert first == second == [{"id": "sub1"}]
+    assert len(loads) == 1
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["entries"] == 1
+    assert stats["bytes"] == len('[{"id": "sub1"}]')
+
+
+@pytest.mark.parametrize("backend", backends(), ids=["memory", "mongo"])
+def test_invalidate_drops_only_the_scope(backend):
+    cache = ResponseCache(backend)
+
+    async def load():
+        return {"loaded": True}
+
+    async def scenario():
+        await cache.cached("user:u1:transactions", ["user:u1"], load)
+        await cache.cached("user:u2:transactions", ["user:u2"], load)
+        await cache.invalidate("user:u1")
+        return (
+            await backend.get("user:u1:transactions", ["user:u1"]),
+            await backend.get("user:u2:transactions", ["user:u2"])
+        )
+
+    assert run(scenario()) == (
+        (None, {"user:u1": 1}), ('{"loaded": true}', {"user:u2": 0})
+    )
+
+
+def test_response_loaded_during_invalidation_is_not_stored():
+    cache = ResponseCache(MemoryBackend())
+
+    async def load():
+        # A write lands while the listing is being read
+        await cache.invalidate("subscriptions")
+        return ["stale"]
+
+    async def scenario():
+        content = await cache.cached("subscriptions:100:", ["subscriptions"], load)
+        return content, await cache.stats()
+
+    content, stats = run(scenario())
+
+    assert content == ["stale"]
+    assert stats["entries"] == 0
+
+
+def test_invalidation_by_another_worker_during_a_load_is_honoured():
+    db = InMemoryAsyncClient("mongomock://localhost")["test"]
+    # Two workers, each with its own ResponseCache over the shared collection
+    reader = ResponseCache(MongoBackend(db.response_cache))
+    writer = ResponseCache(MongoBackend(db.response_cache))
+    loads = []
+
+    async def load():
+        loads.append(1)
+        if len(loads) == 1:
+            # The other worker writes while this one reads the listing
+            await writer.invalidate("subscriptions")
+            return ["stale"]
+        return ["fresh"]
+
+    async def scenario():
+        first = await reader.cached("subscriptions:100:", ["subscriptions"], load)
+        from_writer = await writer.cached(
+            "subscriptions:100:", ["subscriptions"], load
+        )
+        from_reader = await reader.cached(
+            "subscriptions:100:", ["subscriptions"], load
+        )
+        return first, from_writer, from_reader
+
+    first, from_writer, from_reader = run(scenario())
+
+    assert first == ["stale"]
+    assert from_writer == from_reader == ["fresh"]
+    assert len(loads) == 2
+
+
+def test_memory_backend_expires_and_evicts():
+    clock = FakeClock()
+    backend = MemoryBackend(max_entries=2, max_bytes=10, clock=clock)
+
+    async def scenario():
+        await backend.set("a", '"1"', {"s": 0}, ttl=10)
+        await backend.set("b", '"2"', {"s": 0}, ttl=10)
+        await backend.get("a")
+        await backend.set("c", '"3"', {"s": 0}, ttl=10)
+        evicted, _ = await backend.get("b")
+        await backend.set("d", '"too long"', {"s": 0}, ttl=10)
+        size = await backend.size()
+        clock.now = 10
+        expired, _ = await backend.get("d")
+        return evicted, size, expired
+
+    evicted, size, expired = run(scenario())
+
+    # b was the least recently used, then d pushed the size over 10 bytes
+    assert evicted is None
+    assert size == (1, 10)
+    assert expired is None
+
+
+def test_disabled_cache_always_loads():
+    cache = ResponseCache(None)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return []
+
+    async def scenario():
+        await cache.cached("subscriptions:100:", ["subscriptions"], load)
+        await cache.cached("subscriptions:100:", ["subscriptions"], load)
+        await cache.invalidate("subscriptions")
+        return await cache.stats()
+
+    stats = run(scenario())
+
+    assert len(loads) == 2
+    assert stats["backend"] is None
+
+
+def test_memory_backend_warns_with_several_workers(caplog):
+    with patch.dict("os.environ", {"RESPONSE_CACHE_BACKEND": "memory"}):
+        with patch.dict("os.environ", {"WEB_CONCURRENCY": "4"}), \
+                caplog.at_level(logging.WARNING, "app.utils.response_cache"):
+            create_response_cache()
+        assert "WEB_CONCURRENCY=4" in caplog.text
+        caplog.clear()
+
+        with patch.dict("os.environ", {"WEB_CONCURRENCY": "1"}):
+            create_response_cache()
+        assert caplog.text == ""
@@ -0,0 +1,142 @@
+# tests/test_slow_queries.py
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.migrations.indexes import ensure_indexes
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.query_accounting import count_queries, query_accounting
+from app.utils.slow_queries import SlowQueryLog, summarize_plan
+
+
+class TestSlowQueryLog(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.log = SlowQueryLog(threshold_ms=0, sample_rate=1.0)
+        client = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[self.log, query_accounting]
+        )
+        self.log.bind(client)
+        self.db = client["test"]
+        await ensure_indexes(self.db, ["subscriptions"])
+        await self.db.subscriptions.insert_many([
+            {"id": f"sub{index}", "user_id": f"user{index % 3}",
+             "fund_id": f"fund{index}", "status": "active"}
+            for index in range(10)
+        ])
+        self.log.clear()
+
+    async def _explained(self):
+        await asyncio.gather(*list(self.log._explains))
+        return self.log.list()
+
+    async def test_indexed_lookup_uses_its_index(self):
+        await self.db.subscriptions.find_one({"id": "sub1"})
+
+        entry, = await self._explained()
+
+        self.assertEqual(entry["collection"], "subscriptions")
+        self.assertEqual(entry["command"], "find")
+        self.assertEqual(entry["filter"], {"id": "?"})
+        self.assertEqual(entry["plan"], {
+            "stages": ["FETCH", "IXSCAN"],
+            "indexes": ["subscriptions_id_unique"],
+            "collscan": False,
+        })
+
+    async def test_collection_scans_are_flagged_and_logged(self):
+        with self.assertLogs("app.utils.slow_queries", "WARNING") as logs:
+            await self.db.subscriptions.find(
+                {"status": {"$in": ["active", "cancelled"]}}
+            ).sort("created_at", -1).to_list(None)
+            entry, = await self._explained()
+
+        self.assertEqual(entry["filter"], {"status": {"$in": ["?"]}})
+        self.assertEqual(entry["sort"], {"created_at": -1})
+        self.assertTrue(entry["plan"]["collscan"])
+        self.assertIn("COLLSCAN on test.subscriptions", logs.output[0])
+        self.assertEqual(self.log.list(collscan=True), [entry])
+        self.assertEqual(self.log.list(collscan=False), [])
+
+    async def test_explains_are_not_counted_in_the_caller_queries(self):
+        with count_queries() as stats:
+            await self.db.subscriptions.find_one({"id": "sub1"})
+            entry, = await self._explained()
+
+        self.assertIsNotNone(entry["plan"])
+        self.assertEqual(stats.commands, {"find": 1})
+
+    async def test_plan_is_reused_for_the_same_query_shape(self):
+        await self.db.subscriptions.find_one({"user_id": "user1"})
+        await self._explained()
+
+        await self.db.subscriptions.find_one({"user_id": "user2"})
+
+        newest, oldest = self.log.list()
+        self.assertEqual(self.log._explains, set())
+        self.assertEqual(newest["plan"], oldest["plan"])
+        self.assertEqual(newest["plan"]["indexes"], ["subscriptions_user_fund_status"])
+
+    async def test_only_slow_commands_are_kept_in_a_bounded_buffer(self):
+        self.log.threshold_ms = 10_000
+        await self.db.subscriptions.find_one({"id": "sub1"})
+        self.assertEqual(self.log.list(), [])
+
+        log = SlowQueryLog(threshold_ms=0, size=2, sample_rate=0)
+        client = InMemoryAsyncClient("mongomock://localhost", event_listeners=[log])
+        for index in range(5):
+            await client["test"].items.insert_one({"index": index})
+
+        self.assertEqual(len(log.list()), 2)
+        self.assertEqual(log.recorded, 5)
+        self.assertIsNone(log.list()[0]["plan"])
+
+
+class TestSummarizePlan(unittest.TestCase):
+
+    def test_slot_based_plan(self):
+        plan = summarize_plan({"queryPlanner": {"winningPlan": {"queryPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "users_id_unique"},
+        }}}})
+
+        self.assertEqual(plan["indexes"], ["users_id_unique"])
+        self.assertFalse(plan["collscan"])
+
+    def test_aggregation_plan(self):
+        plan = summarize_plan({"stages": [
+            {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+            {"$group": {}},
+        ]})
+
+        self.assertTrue(plan["collscan"])
+
+
+def test_slow_queries_routes_are_off_without_a_token():
+    client = TestClient(app)
+
+    assert client.get("/admin/slow-queries").status_code == 404
+    assert client.delete("/admin/slow-queries").status_code == 404
+
+
+@patch.dict("os.environ", {"ADMIN_TOKEN": "secret"})
+def test_slow_queries_routes_require_the_admin_token():
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer secret"}
+
+    refused = client.get(
+        "/admin/slow-queries", headers={"Authorization": "Bearer wrong"}
+    )
+    listed = client.get(
+        "/admin/slow-queries", params={"collscan": "true"}, headers=headers
+    )
+    cleared = client.delete("/admin/slow-queries", headers=headers)
+
+    assert refused.status_code == 401
+    assert client.delete("/admin/slow-queries").status_code == 401
+    assert listed.status_code == 200
+    assert set(listed.json()) == {"threshold_ms", "sample_rate", "recorded", "entries"}
+    assert cleared.status_code == 204
@@ -0,0 +1,170 @@
+# tests/test_smtp_pool.py
+import smtplib
+import socket
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from aiosmtpd.controller import Controller
+
+from app.utils.notification.email_notification import EmailNotification
+from app.utils.notification.notification_base import NotificationError
+from app.utils.notification.smtp_pool import SMTPPool
+
+SENDER = "noreply@example.com"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    """Local SMTP stand-in keeping the recipients of every message."""
+
+    def __init__(self):
+        self.recipients = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("refused"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.recipients.extend(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+
+class TestSMTPPool(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.port = free_port()
+        self.controller = Controller(
+            self.handler, hostname="127.0.0.1", port=self.port
+        )
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def pool(self, **kwargs) -> SMTPPool:
+        pool = SMTPPool(
+            "127.0.0.1", self.port, username=SENDER, starttls=False, **kwargs
+        )
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_sends_reuse_one_session(self):
+        pool = self.pool()
+
+        for index in range(10):
+            pool.send(f"user{index}@example.com", "Hi", "Body")
+
+        self.assertEqual(len(self.handler.recipients), 10)
+        self.assertEqual(pool.stats()["connections"], 1)
+        self.assertEqual(self.handler.sessions, 1)
+
+    def test_concurrent_sends_are_bounded_by_the_pool_size(self):
+        pool = self.pool(size=2)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(
+                lambda index: pool.send(f"user{index}@example.com", "Hi", "Body"),
+                range(40)
+            ))
+
+        self.assertEqual(len(self.handler.recipients), 40)
+        self.assertLessEqual(pool.stats()["connections"], 2)
+
+    def test_send_many_keeps_going_after_a_refused_message(self):
+        pool = self.pool()
+
+        errors = pool.send_many([
+            ("user0@example.com", "Hi", "Body"),
+            ("refused@example.com", "Hi", "Body"),
+            ("user2@example.com", "Hi", "Body"),
+        ])
+
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], smtplib.SMTPRecipientsRefused)
+        self.assertIsNone(errors[2])
+        self.assertEqual(
+            self.handler.recipients, ["user0@example.com", "user2@example.com"]
+        )
+        self.assertEqual(pool.stats()["connections"], 1)
+
+    def test_broken_session_is_replaced(self):
+        pool = self.pool()
+        pool.send("user0@example.com", "Hi", "Body")
+        # The server dropped the idle connection
+        with pool.session() as server:
+            server.sock.shutdown(socket.SHUT_RDWR)
+
+        pool.send("user1@example.com", "Hi", "Body")
+
+        self.assertEqual(len(self.handler.recipients), 2)
+        self.assertEqual(pool.stats()["connections"], 2)
+
+    def test_idle_sessions_are_not_reused_past_the_timeout(self):
+        pool = self.pool(idle_timeout=-1)
+
+        pool.send("user0@example.com", "Hi", "Body")
+        pool.send("user1@example.com", "Hi", "Body")
+
+        self.assertEqual(pool.stats()["connections"], 2)
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_idle_sessions_are_closed_without_a_new_send(self):
+        pool = self.pool(idle_timeout=0.05)
+
+        pool.send("user0@example.com", "Hi", "Body")
+        deadline = time.monotonic() + 5
+        while pool.stats()["open"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(pool.stats()["open"], 0)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+    def test_expired_sessions_are_closed_when_one_is_returned(self):
+        pool = self.pool(idle_timeout=0.05, reap_interval=0)
+        with pool.session(), pool.session():
+            pass
+        time.sleep(0.1)
+
+        # Lends the newest idle session, replaced as expired; returning it
+        # closes the other one
+        pool.send("user0@example.com", "Hi", "Body")
+
+        self.assertEqual(pool.stats()["open"], 1)
+        self.assertEqual(pool.stats()["connections"], 3)
+
+    def test_unreachable_server_fails_every_message_of_a_batch(self):
+        pool = SMTPPool("127.0.0.1", 1, username=SENDER, starttls=False, timeout=1)
+
+        errors = pool.send_many([("user0@example.com", "Hi", "Body")] * 2)
+
+        self.assertTrue(all(isinstance(error, OSError) for error in errors))
+        self.assertEqual(pool.stats()["open"], 0)
+
+    def test_email_notification_batches_over_the_pool(self):
+        notification = EmailNotification(
+            "127.0.0.1", 0, SENDER, None, pool=self.pool()
+        )
+
+        errors = notification.send_notifications([
+            ("user0@example.com", "Hi", "Body"),
+            ("refused@example.com", "Hi", "Body"),
+        ])
+        with self.assertRaises(NotificationError):
+            notification.send_notification("refused@example.com", "Hi", "Body")
+
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], NotificationError)
+        self.assertEqual(self.handler.recipients, ["user0@example.com"])
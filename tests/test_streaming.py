@@ -0,0 +1,94 @@
+# tests/test_streaming.py
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.in_memory_database import InMemoryAsyncClient
+from app.utils.streaming import NDJSON_MEDIA_TYPE, iterate_batches
+
+client = TestClient(app)
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture
+def counter():
+    return CommandCounter()
+
+
+@pytest.fixture
+async def db(counter):
+    database = InMemoryAsyncClient(
+        "mongomock://localhost", event_listeners=[counter]
+    )["test"]
+    await database.users.insert_many([
+        {"id": f"user{index}", "name": f"User {index}", "email": "user@example.com"}
+        for index in range(5)
+    ])
+    await database.funds.insert_one({"id": "fund123", "name": "Fund A"})
+    await database.subscriptions.insert_many([
+        {"id": f"sub{index}", "status": "active",
+         "user_id": f"user{index}", "fund_id": "fund123"}
+        for index in range(5)
+    ])
+    counter.commands.clear()
+    return database
+
+
+def test_stream_users_as_ndjson(db):
+    with patch('app.services.user_service.db', new=db):
+        response = client.get("/users/", headers={"Accept": NDJSON_MEDIA_TYPE})
+
+    lines = response.text.splitlines()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE)
+    assert [json.loads(line)["id"] for line in lines] == [
+        f"user{index}" for index in range(5)
+    ]
+
+
+def test_stream_funds_as_json_array(db):
+    with patch('app.repositories.mongo_fund_repository.db', new=db):
+        response = client.get("/funds/", params={"stream": "true"})
+
+    assert response.status_code == 200
+    assert [fund["name"] for fund in response.json()] == ["Fund A"]
+
+
+def test_stream_subscriptions_joins_per_batch(db, counter):
+    with patch('app.services.subscription_service.db', new=db), \
+            patch('app.services.subscription_service.STREAM_BATCH_SIZE', 2):
+        response = client.get(
+            "/subscriptions/", headers={"Accept": NDJSON_MEDIA_TYPE}
+        )
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 5
+    assert rows[4]["subscription"]["user"]["name"] == "User 4"
+    assert rows[0]["subscription"]["fund"]["name"] == "Fund A"
+    # One find and two getMore, then users, funds and transactions per batch
+    assert counter.commands.count("getMore") == 2
+    assert counter.commands.count("aggregate") == 3
+
+
+async def test_iterate_batches(db):
+    cursor = db.users.find().sort("_id", 1)
+
+    sizes = [len(batch) async for batch in iterate_batches(cursor, 2)]
+
+    assert sizes == [2, 2, 1]
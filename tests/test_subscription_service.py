@@ -1,10 +1,14 @@
+import asyncio
+import contextlib
+import functools
 from datetime import datetime
 import sys
 import os
 import unittest
 from unittest.mock import patch
 from fastapi import HTTPException
-from pymongo.errors import PyMongoError
+from fastapi.testclient import TestClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import pytest
 
 from app.utils.constants import (
@@ -16,21 +20,56 @@ from app.utils.constants import (
 
 from app.services.subscription_service import (
     create_subscription,
+    create_subscriptions_bulk,
     cancel_subscription,
+    cancel_subscriptions_bulk,
     get_user_transactions,
+    list_subscriptions_by_user,
     list_subscriptions_with_users
 )
 
+from app.main import app
+from app.services import subscription_service
+from app.migrations.indexes import ensure_indexes
 from app.models.subscription import Subscription
+from app.utils.in_memory_database import (
+    InMemoryAsyncClient,
+    InMemoryAsyncCollection
+)
+from app.utils.response_cache import MemoryBackend, MongoBackend, ResponseCache
+from tests.mocks import AsyncCursorMock, AsyncDatabaseMock
 
 # Add the app directory to the sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 
+# The real notification writer, for tests of classes that patch it out
+SEND_NOTIFICATION = subscription_service._send_subscription_notification
+
+# Modules reading the database, patched together with the same mock or stand-in
+DB_TARGETS = (
+    'app.services.subscription_service.db',
+    'app.repositories.mongo_user_repository.db',
+)
+
 
-class TestSubscriptionService(unittest.TestCase):
+def patch_db(test):
+    """Run test with one AsyncDatabaseMock patched in every DB_TARGETS module,
+    passed as the first argument after self."""
+    @functools.wraps(test)
+    async def wrapper(self, *args):
+        mock_db = AsyncDatabaseMock()
+        with contextlib.ExitStack() as stack:
+            for target in DB_TARGETS:
+                stack.enter_context(patch(target, new=mock_db))
+            return await test(self, mock_db, *args)
+    return wrapper
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_success(self, mock_db):
+
+class TestSubscriptionService(unittest.IsolatedAsyncioTestCase):
+
+    @patch('app.services.subscription_service._send_subscription_notification')
+    @patch_db
+    async def test_create_subscription_success(self, mock_db, mock_notification):
         mock_db.users.find_one.return_value = {
             "id": "user123",
             "name": "John Doe",
@@ -43,22 +82,34 @@ class TestSubscriptionService(unittest.TestCase):
             "minimum_investment_amount": 5000
         }
 
-        mock_db.users.update_one.return_value = True
+        mock_db.users.find_one_and_update.return_value = {
+            "id": "user123",
+            "name": "John Doe",
+            "email": "john.doe@example.com",
+            "investment_capital": 5000
+        }
         mock_db.subscriptions.insert_one.return_value = None
-        mock_db.subscriptions.find_one.return_value = None
 
         subscription = Subscription(
             user_id="user123",
             fund_id="fund123",
             status="active"
         )
-        response = create_subscription(subscription)
+        response = await create_subscription(subscription)
 
         self.assertEqual(response["detail"], SuccessMessage.SUCCESS_SUBSCRIPTION)
         self.assertIn("subscription_id", response)
+        self.assertEqual(response["new_capital_value"], 5000)
+        filter, update = mock_db.users.find_one_and_update.call_args.args
+        self.assertEqual(filter["investment_capital"], {"$gte": 5000})
+        self.assertEqual(
+            update, {"$inc": {"investment_capital": -5000, "version": 1}}
+        )
+        mock_db.users.update_one.assert_not_called()
+        mock_db.subscriptions.find_one.assert_not_called()
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_pymongo_error_PyMongoError_Except(self, mock_db):
+    @patch_db
+    async def test_create_subscription_pymongo_error_PyMongoError_Except(self, mock_db):
         subscription = Subscription(
             user_id="1",
             fund_id="fund123",
@@ -78,18 +129,24 @@ class TestSubscriptionService(unittest.TestCase):
             "minimum_investment_amount": 5000
         }
 
+        mock_db.users.find_one_and_update.return_value = {
+            "id": "1", "investment_capital": 5000, "version": 1
+        }
         mock_db.subscriptions.insert_one.side_effect = PyMongoError("Database error")
         mock_db.subscriptions.find_one.return_value = None
 
         with pytest.raises(HTTPException) as excinfo:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         assert excinfo.value.status_code == 500
         assert DataBaseError.ERROR_DB_CONNECTION in excinfo.value.detail
         mock_db.subscriptions.insert_one.assert_called_once()
+        # The debit is refunded
+        _, refund = mock_db.users.find_one_and_update.call_args.args
+        assert refund["$inc"]["investment_capital"] == 5000
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_error_capital_not_success(self, mock_db):
+    @patch_db
+    async def test_create_subscription_error_capital_not_success(self, mock_db):
         mock_db.users.find_one.return_value = {
             "id": "user123",
             "name": "John Doe",
@@ -101,10 +158,7 @@ class TestSubscriptionService(unittest.TestCase):
             "name": "Fund A",
             "minimum_investment_amount": 20000
         }
-
-        mock_db.users.update_one.return_value = True
-        mock_db.subscriptions.insert_one.return_value = None
-        mock_db.subscriptions.find_one.return_value = None
+        mock_db.users.find_one_and_update.return_value = None
 
         subscription = Subscription(
             user_id="user123",
@@ -112,7 +166,7 @@ class TestSubscriptionService(unittest.TestCase):
             status="active"
         )
         with self.assertRaises(HTTPException) as context:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         self.assertEqual(context.exception.status_code, 400)
         self.assertEqual(
@@ -120,8 +174,8 @@ class TestSubscriptionService(unittest.TestCase):
             str(SubscriptionError.ERROR_NO_AVAILABLE_BALANCE) + " Fund A"
         )
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_error_fund_minimum_investment_amount_is_none(
+    @patch_db
+    async def test_create_subscription_error_fund_minimum_investment_amount_is_none(
         self,
         mock_db
     ):
@@ -146,7 +200,7 @@ class TestSubscriptionService(unittest.TestCase):
             status="active"
         )
         with self.assertRaises(HTTPException) as context:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         self.assertEqual(context.exception.status_code, 400)
         self.assertEqual(
@@ -154,8 +208,8 @@ class TestSubscriptionService(unittest.TestCase):
             SubscriptionError.ERROR_NO_MINIMUM_AMOUNT_TO_INVEST
         )
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_error_subscribtion_exists_with_fund_and_user(
+    @patch_db
+    async def test_create_subscription_error_subscribtion_exists_with_fund_and_user(
         self,
         mock_db
     ):
@@ -167,15 +221,16 @@ class TestSubscriptionService(unittest.TestCase):
         }
         mock_db.funds.find_one.return_value = {
             "id": "fund123",
-            "name": "Fund A"
-        }
-
-        mock_db.users.update_one.return_value = True
-        mock_db.subscriptions.insert_one.return_value = None
-        mock_db.subscriptions.find_one.return_value = {
-            "user_id": "user123",
-            "fund_id": "fund123"
+            "name": "Fund A",
+            "minimum_investment_amount": 5000
         }
+        mock_db.users.find_one_and_update.side_effect = [
+            {"id": "user123", "investment_capital": 3000, "version": 1},
+            {"id": "user123", "investment_capital": 8000, "version": 2},
+        ]
+        mock_db.subscriptions.insert_one.side_effect = DuplicateKeyError(
+            "subscriptions_user_fund_active_unique"
+        )
 
         subscription = Subscription(
             user_id="user123",
@@ -183,16 +238,29 @@ class TestSubscriptionService(unittest.TestCase):
             status="active"
         )
         with self.assertRaises(HTTPException) as context:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         self.assertEqual(context.exception.status_code, 400)
         self.assertEqual(
             context.exception.detail,
             SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND
         )
+        # The debit is given back
+        mock_db.users.find_one_and_update.assert_called_with(
+            {"id": "user123"},
+            {"$inc": {"investment_capital": 5000, "version": 1}},
+            return_document=True
+        )
+        mock_db.transaction_history.insert_one.assert_not_called()
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_user_not_exist(self, mock_db):
+    @patch_db
+    async def test_create_subscription_user_not_exist(self, mock_db):
+        mock_db.funds.find_one.return_value = {
+            "id": "fund123",
+            "name": "Fund A",
+            "minimum_investment_amount": 5000
+        }
+        mock_db.users.find_one_and_update.return_value = None
         mock_db.users.find_one.return_value = None
 
         subscription = Subscription(
@@ -201,7 +269,7 @@ class TestSubscriptionService(unittest.TestCase):
             status="active"
         )
         with self.assertRaises(HTTPException) as context:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         self.assertEqual(context.exception.status_code, 404)
         self.assertEqual(
@@ -209,8 +277,8 @@ class TestSubscriptionService(unittest.TestCase):
             SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
         )
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_fund_not_exist(self, mock_db):
+    @patch_db
+    async def test_create_subscription_fund_not_exist(self, mock_db):
         mock_db.users.find_one.return_value = {"id": "user123"}
         mock_db.funds.find_one.return_value = None
 
@@ -220,7 +288,7 @@ class TestSubscriptionService(unittest.TestCase):
             status="active"
         )
         with self.assertRaises(HTTPException) as context:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         self.assertEqual(context.exception.status_code, 404)
         self.assertEqual(
@@ -228,35 +296,37 @@ class TestSubscriptionService(unittest.TestCase):
             SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
         )
 
-    @patch('app.services.subscription_service.db')
-    def test_cancel_subscription_success(self, mock_db):
+    @patch('app.services.subscription_service._send_subscription_notification')
+    @patch_db
+    async def test_cancel_subscription_success(self, mock_db, mock_notification):
         mock_db.subscriptions.update_one.return_value = None
-        response = cancel_subscription("subscription123")
+        response = await cancel_subscription("subscription123")
         self.assertEqual(
             response["detail"],
             SuccessMessage.SUCCESS_SUBSCRIPTION_CANCELLATION
         )
+        mock_notification.assert_awaited_once()
 
-    @patch('app.services.subscription_service.db')
-    def test_cancel_subscription_not_exist(self, mock_db):
+    @patch_db
+    async def test_cancel_subscription_not_exist(self, mock_db):
         # Simulate that the subscription does not exist
         mock_db.subscriptions.find_one.return_value = None
         with pytest.raises(HTTPException) as excinfo:
-            cancel_subscription("non_existent_subscription_id")
+            await cancel_subscription("non_existent_subscription_id")
 
         assert excinfo.value.status_code == 404
         assert excinfo.value.detail == "Subscription does not exist"
-        mock_db.subscriptions.update_one.assert_not_called()
+        mock_db.subscriptions.find_one_and_update.assert_not_called()
 
-    @patch('app.services.subscription_service.db')
-    def test_cancel_subscription_user_not_exist(self, mock_db):
+    @patch_db
+    async def test_cancel_subscription_user_not_exist(self, mock_db):
         mock_db.subscriptions.find_one.return_value = {
             "user_id": "user123",
             "fund_id": "fund123"
         }  # Simulate that the subscription does not exist
         mock_db.users.find_one.return_value = None
         with pytest.raises(HTTPException) as excinfo:
-            cancel_subscription(
+            await cancel_subscription(
                 SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
             )
 
@@ -264,10 +334,10 @@ class TestSubscriptionService(unittest.TestCase):
         assert excinfo.value.detail == (
             SubscriptionError.ERROR_USER_DOES_NOT_EXIST_TO_SUBSCRIBE_TO_FUND
         )
-        mock_db.subscriptions.update_one.assert_not_called()
+        mock_db.subscriptions.find_one_and_update.assert_not_called()
 
-    @patch('app.services.subscription_service.db')
-    def test_cancel_subscription_fund_not_exist(self, mock_db):
+    @patch_db
+    async def test_cancel_subscription_fund_not_exist(self, mock_db):
         # Simulate that the subscription does not exist
         mock_db.subscriptions.find_one.return_value = {
             "user_id": "user123",
@@ -281,7 +351,7 @@ class TestSubscriptionService(unittest.TestCase):
         }
         mock_db.funds.find_one.return_value = None
         with pytest.raises(HTTPException) as excinfo:
-            cancel_subscription(
+            await cancel_subscription(
                 SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
             )
 
@@ -289,42 +359,73 @@ class TestSubscriptionService(unittest.TestCase):
         assert excinfo.value.detail == (
             SubscriptionError.ERROR_FUND_DOES_NOT_EXIST_TO_SUBSCRIBE
         )
-        mock_db.subscriptions.update_one.assert_not_called()
+        mock_db.subscriptions.find_one_and_update.assert_not_called()
+
+    @patch_db
+    async def test_cancel_subscription_already_cancelled(self, mock_db):
+        mock_db.subscriptions.find_one.return_value = {
+            "id": "sub123",
+            "user_id": "user123",
+            "fund_id": "fund123",
+            "status": TransactionAction.CANCELLED
+        }
+        mock_db.users.find_one.return_value = {
+            "id": "user123",
+            "investment_capital": 10000
+        }
+        mock_db.funds.find_one.return_value = {
+            "id": "fund123",
+            "minimum_investment_amount": 5000
+        }
+        mock_db.subscriptions.find_one_and_update.return_value = None
 
-    @patch('app.services.subscription_service.db')
-    def test_list_subscriptions_with_users(self, mock_db):
-        mock_db.subscriptions.find.return_value = [
+        with pytest.raises(HTTPException) as excinfo:
+            await cancel_subscription("sub123")
+
+        assert excinfo.value.status_code == 400
+        assert excinfo.value.detail == (
+            SubscriptionError.ERROR_SUBSCRIPTION_ALREADY_CANCELLED
+        )
+        mock_db.users.find_one_and_update.assert_not_called()
+        mock_db.transaction_history.insert_one.assert_not_called()
+
+    @patch_db
+    async def test_list_subscriptions_with_users(self, mock_db):
+        mock_db.subscriptions.find.return_value = AsyncCursorMock([
             {
                 "_id": "sub123",
                 "id": "sub123",
                 "user_id": "user123",
                 "fund_id": "fund123"
             }
-        ]
-        mock_db.users.find_one.return_value = {
+        ])
+        mock_db.users.find.return_value = AsyncCursorMock([{
             "_id": "user123",
+            "id": "user123",
             "name": "John Doe"
-        }
-        mock_db.funds.find_one.return_value = {
+        }])
+        mock_db.funds.find.return_value = AsyncCursorMock([{
             "_id": "fund123",
+            "id": "fund123",
             "name": "Fund A"
-        }
-        mock_db.transaction_history.find_one.return_value = {
-            "_id": "trans123",
-            "subscription_id": "sub123",
-            "action": TransactionAction.CREATED,
-            "notification_channel": "email",
+        }])
+        mock_db.transaction_history.aggregate.return_value = AsyncCursorMock([{
+            "_id": "sub123",
             "timestamp": datetime.strptime("2023-01-01T00:00:00Z", "%Y-%m-%dT%H:%M:%SZ")
-        }
+        }])
 
-        response = list_subscriptions_with_users()
+        response = await list_subscriptions_with_users()
 
         self.assertEqual(len(response), 1)
         self.assertEqual(response[0]["subscription"]["user"]["name"], "John Doe")
         self.assertEqual(response[0]["subscription"]["fund"]["name"], "Fund A")
+        self.assertEqual(
+            response[0]["subscription"]["transaction_timestamp"],
+            "2023-01-01 00:00:00"
+        )
 
-    @patch('app.services.subscription_service.db')
-    def test_create_subscription_insufficient_investment_capital(self, mock_db):
+    @patch_db
+    async def test_create_subscription_insufficient_investment_capital(self, mock_db):
         mock_db.users.find_one.return_value = {
             "id": "user123",
             "name": "Fund A",
@@ -335,7 +436,7 @@ class TestSubscriptionService(unittest.TestCase):
             "name": "Fund A",
             "minimum_investment_amount": 1000
         }
-        mock_db.subscriptions.find_one.return_value = None
+        mock_db.users.find_one_and_update.return_value = None
 
         subscription = Subscription(
             user_id="user123",
@@ -343,7 +444,7 @@ class TestSubscriptionService(unittest.TestCase):
             status="active"
         )
         with self.assertRaises(HTTPException) as context:
-            create_subscription(subscription)
+            await create_subscription(subscription)
 
         self.assertEqual(context.exception.status_code, 400)
         self.assertEqual(
@@ -351,8 +452,8 @@ class TestSubscriptionService(unittest.TestCase):
             f"{SubscriptionError.ERROR_NO_AVAILABLE_BALANCE} Fund A"
         )
 
-    @patch('app.services.subscription_service.db')
-    def test_get_user_transactions_success(self, mock_db):
+    @patch_db
+    async def test_get_user_transactions_success(self, mock_db):
         user_id = "user123"
         mock_db.users.find_one.return_value = {
             "id": user_id,
@@ -360,11 +461,11 @@ class TestSubscriptionService(unittest.TestCase):
             "name": "John Doe",
             "email": "john.doe@example.com"
         }
-        mock_db.subscriptions.find.return_value = [
+        mock_db.subscriptions.find.return_value = AsyncCursorMock([
             {"id": "sub123", "user_id": user_id, "fund_id": "fund123"},
             {"id": "sub456", "user_id": user_id, "fund_id": "fund456"}
-        ]
-        mock_db.transaction_history.find.return_value = [
+        ])
+        mock_db.transaction_history.find.return_value = AsyncCursorMock([
             {
                 "_id": "trans123",
                 "subscription_id": "sub123",
@@ -377,20 +478,27 @@ class TestSubscriptionService(unittest.TestCase):
                 "action": TransactionAction.CANCELLED,
                 "timestamp": "2023-01-02T00:00:00Z"
             }
-        ]
-        mock_db.funds.find_one.side_effect = lambda query: {
-            "id": query["id"],
-            "_id": query["id"],
-            "name": f"Fund {query['id'][-3:]}",
-            "category": "Equity"
-        }
+        ])
+        mock_db.funds.find.return_value = AsyncCursorMock([
+            {
+                "id": fund_id,
+                "_id": fund_id,
+                "name": f"Fund {fund_id[-3:]}",
+                "category": "Equity"
+            }
+            for fund_id in ["fund123", "fund456"]
+        ])
 
-        result = get_user_transactions(user_id)
+        result = await get_user_transactions(user_id)
 
         assert len(result) == 2
+        assert result[0]["user"]["name"] == "John Doe"
+        assert result[1]["fund"]["name"] == "Fund 456"
+        mock_db.subscriptions.find_one.assert_not_called()
+        mock_db.funds.find.assert_called_once()
 
-    @patch('app.services.subscription_service.db')
-    def test_get_user_transactions_pymongo_error(self, mock_db):
+    @patch_db
+    async def test_get_user_transactions_pymongo_error(self, mock_db):
         user_id = "user123"
 
         mock_db.users.find_one.return_value = {
@@ -404,19 +512,19 @@ class TestSubscriptionService(unittest.TestCase):
         mock_db.subscriptions.find.side_effect = PyMongoError("Database error")
 
         with pytest.raises(HTTPException) as excinfo:
-            get_user_transactions(user_id)
+            await get_user_transactions(user_id)
 
         assert excinfo.value.status_code == 500
         assert DataBaseError.ERROR_DB_CONNECTION in excinfo.value.detail
 
-    @patch('app.services.subscription_service.db')
-    def test_get_user_transactions_unexpected_error(self, mock_db):
+    @patch_db
+    async def test_get_user_transactions_unexpected_error(self, mock_db):
         user_id = "user123"
 
         mock_db.users.find_one.return_value = None
 
         with pytest.raises(HTTPException) as excinfo:
-            get_user_transactions(user_id)
+            await get_user_transactions(user_id)
 
         assert excinfo.value.status_code == 404
         assert SubscriptionError.ERROR_USER_DOEES_NOT_EXIST in excinfo.value.detail
@@ -424,3 +532,534 @@ class TestSubscriptionService(unittest.TestCase):
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class TestSubscriptionQueries(unittest.IsolatedAsyncioTestCase):
+    """Query counts of the listings against the in-process database."""
+
+    async def asyncSetUp(self):
+        self.counter = CommandCounter()
+        self.db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[self.counter]
+        )["test"]
+        for target in DB_TARGETS:
+            patcher = patch(target, new=self.db)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Subscriptions are inserted directly, measure the uncached listings
+        patcher = patch(
+            "app.services.subscription_service.response_cache", new=ResponseCache(None)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        await self.db.users.insert_one({"id": "user123", "name": "John Doe"})
+        await self.db.funds.insert_one({"id": "fund123", "name": "Fund A"})
+
+    async def _add_subscriptions(self, start: int, end: int, pointer: bool = True):
+        for index in range(start, end):
+            subscription = {
+                "id": f"sub{index}", "user_id": "user123", "fund_id": "fund123"
+            }
+            if pointer:
+                subscription["last_transaction_at"] = datetime(2023, 1, 1, 0, index)
+                subscription["last_action"] = TransactionAction.CREATED
+            await self.db.subscriptions.insert_one(subscription)
+            await self.db.transaction_history.insert_one({
+                "subscription_id": f"sub{index}",
+                "action": TransactionAction.CREATED,
+                "timestamp": datetime(2023, 1, 1, 0, index)
+            })
+        self.counter.commands.clear()
+
+    async def test_list_subscriptions_with_users_round_trips_are_constant(self):
+        await self._add_subscriptions(0, 3)
+        small = await list_subscriptions_with_users()
+        small_round_trips = len(self.counter.commands)
+
+        await self._add_subscriptions(3, 40)
+        large = await list_subscriptions_with_users()
+
+        self.assertEqual(len(small), 3)
+        self.assertEqual(len(large), 40)
+        self.assertEqual(small_round_trips, 3)
+        self.assertEqual(len(self.counter.commands), small_round_trips)
+        self.assertEqual(
+            large[-1]["subscription"]["transaction_timestamp"],
+            "2023-01-01 00:39:00"
+        )
+
+    async def test_list_subscriptions_by_user_round_trips(self):
+        await self._add_subscriptions(0, 30)
+
+        subscriptions = await list_subscriptions_by_user("user123")
+
+        self.assertEqual(len(subscriptions), 30)
+        self.assertEqual(subscriptions[0]["user"]["name"], "John Doe")
+        self.assertEqual(len(self.counter.commands), 3)
+
+    async def test_subscriptions_without_pointer_read_transaction_history(self):
+        await self._add_subscriptions(0, 2, pointer=False)
+        await self._add_subscriptions(2, 4)
+
+        subscriptions = await list_subscriptions_with_users()
+
+        self.assertEqual(
+            self.counter.commands, ["find", "find", "find", "aggregate"]
+        )
+        self.assertEqual(
+            [row["subscription"]["transaction_timestamp"] for row in subscriptions],
+            [f"2023-01-01 00:0{index}:00" for index in range(4)]
+        )
+
+    async def test_get_user_transactions_round_trips(self):
+        await self._add_subscriptions(0, 30)
+
+        transactions = await get_user_transactions("user123")
+
+        self.assertEqual(len(transactions), 30)
+        self.assertEqual(transactions[-1]["fund"]["name"], "Fund A")
+        self.assertEqual(transactions[-1]["user"]["name"], "John Doe")
+        self.assertEqual(
+            self.counter.commands,
+            ["find", "find", "find", "find"]
+        )
+
+
+class TestSubscriptionWrites(unittest.IsolatedAsyncioTestCase):
+    """Balance and duplicate guarantees of the writes against the in-process
+    database."""
+
+    async def asyncSetUp(self):
+        self.counter = CommandCounter()
+        self.db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[self.counter]
+        )["test"]
+        for patcher in (
+            *[patch(target, new=self.db) for target in DB_TARGETS],
+            patch('app.services.subscription_service._send_subscription_notification')
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        await ensure_indexes(self.db, ["subscriptions"])
+        await self.db.users.insert_one({
+            "id": "user123", "name": "John Doe", "investment_capital": 100000
+        })
+        await self.db.funds.insert_many([
+            {"id": "fund123", "name": "Fund A", "minimum_investment_amount": 75000},
+            {"id": "fund456", "name": "Fund B", "minimum_investment_amount": 50000},
+        ])
+        self.counter.commands.clear()
+
+    async def _capital(self):
+        user = await self.db.users.find_one({"id": "user123"})
+        return user["investment_capital"]
+
+    async def test_create_subscription_round_trips(self):
+        response = await create_subscription(
+            Subscription(user_id="user123", fund_id="fund123", status="active")
+        )
+        commands = list(self.counter.commands)
+
+        self.assertEqual(response["new_capital_value"], 25000)
+        subscription = await self.db.subscriptions.find_one(
+            {"id": response["subscription_id"]}
+        )
+        transaction = await self.db.transaction_history.find_one(
+            {"subscription_id": response["subscription_id"]}
+        )
+        self.assertEqual(subscription["last_action"], TransactionAction.CREATED)
+        self.assertEqual(
+            subscription["last_transaction_at"], transaction["timestamp"]
+        )
+        self.assertEqual(commands, ["find", "findAndModify", "insert", "insert"])
+
+    async def test_failed_transaction_log_does_not_fail_the_subscription(self):
+        insert_one = InMemoryAsyncCollection.insert_one
+
+        async def history_down(collection, document, **kwargs):
+            if collection.name == "transaction_history":
+                raise PyMongoError("connection closed")
+            return await insert_one(collection, document, **kwargs)
+
+        with patch.object(
+            InMemoryAsyncCollection, "insert_one", new=history_down
+        ), patch(
+            "app.services.subscription_service._invalidate_views"
+        ) as invalidate_views, self.assertLogs(
+            "app.services.subscription_service", "ERROR"
+        ):
+            response = await create_subscription(
+                Subscription(user_id="user123", fund_id="fund123", status="active")
+            )
+
+        self.assertEqual(response["detail"], SuccessMessage.SUCCESS_SUBSCRIPTION)
+        self.assertEqual(await self._capital(), 25000)
+        self.assertEqual(await self.db.subscriptions.count_documents({}), 1)
+        invalidate_views.assert_awaited_once_with("user123")
+
+    async def test_unrenderable_notification_does_not_fail_the_subscription(self):
+        # The templates greet the user by name
+        await self.db.users.insert_one({
+            "id": "nameless", "email": "nameless@example.com",
+            "investment_capital": 100000
+        })
+
+        with patch.object(
+            subscription_service, "_send_subscription_notification",
+            new=SEND_NOTIFICATION
+        ), self.assertLogs("app.services.subscription_service", "ERROR") as logs:
+            response = await create_subscription(
+                Subscription(user_id="nameless", fund_id="fund123", status="active")
+            )
+
+        # Skipped by the renderer, not failed and caught after the commit
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("not rendered", logs.records[0].getMessage())
+        self.assertEqual(response["detail"], SuccessMessage.SUCCESS_SUBSCRIPTION)
+        self.assertEqual(response["new_capital_value"], 25000)
+        self.assertEqual(await self.db.subscriptions.count_documents({}), 1)
+        self.assertEqual(await self.db.notification_outbox.count_documents({}), 0)
+
+    async def test_funds_and_users_are_read_through_the_caches(self):
+        response = await create_subscription(
+            Subscription(user_id="user123", fund_id="fund123", status="active")
+        )
+        self.counter.commands.clear()
+
+        await cancel_subscription(response["subscription_id"])
+
+        # Only the subscription is read: the fund is cached and the user was
+        # written to the cache by the debit
+        self.assertEqual(
+            self.counter.commands,
+            ["find", "findAndModify", "findAndModify", "insert"]
+        )
+
+    async def test_concurrent_subscriptions_do_not_overspend(self):
+        results = await asyncio.gather(
+            create_subscription(
+                Subscription(user_id="user123", fund_id="fund123", status="active")
+            ),
+            create_subscription(
+                Subscription(user_id="user123", fund_id="fund456", status="active")
+            ),
+            return_exceptions=True
+        )
+
+        failures = [result for result in results if isinstance(result, Exception)]
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0].status_code, 400)
+        self.assertGreaterEqual(await self._capital(), 0)
+        self.assertEqual(await self.db.subscriptions.count_documents({}), 1)
+
+    async def test_duplicate_subscription_is_refunded(self):
+        await create_subscription(
+            Subscription(user_id="user123", fund_id="fund456", status="active")
+        )
+
+        with self.assertRaises(HTTPException) as context:
+            await create_subscription(
+                Subscription(user_id="user123", fund_id="fund456", status="active")
+            )
+
+        self.assertEqual(
+            context.exception.detail,
+            SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND
+        )
+        self.assertEqual(await self._capital(), 50000)
+
+    async def test_cancel_subscription_refunds_once(self):
+        response = await create_subscription(
+            Subscription(user_id="user123", fund_id="fund123", status="active")
+        )
+        subscription_id = response["subscription_id"]
+
+        cancelled = await cancel_subscription(subscription_id)
+        with self.assertRaises(HTTPException) as context:
+            await cancel_subscription(subscription_id)
+
+        self.assertEqual(cancelled["new_capital_value"], 100000)
+        subscription = await self.db.subscriptions.find_one({"id": subscription_id})
+        self.assertEqual(subscription["last_action"], TransactionAction.CANCELLED)
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(await self._capital(), 100000)
+        # The fund can be subscribed again once cancelled
+        await create_subscription(
+            Subscription(user_id="user123", fund_id="fund123", status="active")
+        )
+
+
+class TestSubscriptionBulk(unittest.IsolatedAsyncioTestCase):
+    """Bulk creation and cancellation against the in-process database."""
+
+    async def asyncSetUp(self):
+        self.counter = CommandCounter()
+        self.db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[self.counter]
+        )["test"]
+        for patcher in (
+            *[patch(target, new=self.db) for target in DB_TARGETS],
+            patch('app.services.subscription_service._send_subscription_notification')
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        await ensure_indexes(self.db, ["subscriptions"])
+        await self.db.users.insert_many([
+            {"id": f"user{index}", "name": f"User {index}",
+             "email": f"user{index}@example.com", "investment_capital": 100000}
+            for index in range(60)
+        ])
+        await self.db.funds.insert_many([
+            {"id": "fund123", "name": "Fund A", "minimum_investment_amount": 75000},
+            {"id": "fund456", "name": "Fund B", "minimum_investment_amount": 20000},
+        ])
+        self.counter.commands.clear()
+
+    async def _capital(self, user_id: str):
+        user = await self.db.users.find_one({"id": user_id})
+        return user["investment_capital"]
+
+    async def test_unrenderable_notification_does_not_fail_the_subscription(self):
+        # The templates greet the user by name
+        await self.db.users.insert_one({
+            "id": "nameless", "email": "nameless@example.com",
+            "investment_capital": 100000
+        })
+
+        with self.assertLogs("app.services.subscription_service", "ERROR") as logs:
+            response = await create_subscriptions_bulk([
+                Subscription(user_id="nameless", fund_id="fund123", status="active"),
+                Subscription(user_id="user1", fund_id="fund123", status="active"),
+            ])
+
+        self.assertIn("not rendered", logs.records[0].getMessage())
+        self.assertEqual(response["succeeded"], 2)
+        self.assertEqual(await self._capital("nameless"), 25000)
+        self.assertEqual(await self.db.notification_outbox.count_documents({}), 1)
+
+    async def test_create_subscriptions_bulk_results(self):
+        response = await create_subscriptions_bulk([
+            Subscription(user_id="user0", fund_id="fund123", status="active"),
+            Subscription(user_id="missing", fund_id="fund123", status="active"),
+            Subscription(user_id="user0", fund_id="missing", status="active"),
+            Subscription(user_id="user0", fund_id="fund456", status="active"),
+            # Already subscribed earlier in the same batch
+            Subscription(user_id="user0", fund_id="fund456", status="active"),
+            # 75000 + 20000 already taken from the 100000
+            Subscription(user_id="user1", fund_id="fund123", status="active"),
+            Subscription(user_id="user1", fund_id="fund123", status="active"),
+        ])
+
+        self.assertEqual(
+            [result["status_code"] for result in response["results"]],
+            [200, 404, 404, 200, 400, 200, 400]
+        )
+        self.assertEqual(response["succeeded"], 3)
+        self.assertEqual(response["failed"], 4)
+        self.assertEqual(
+            response["results"][4]["detail"],
+            SubscriptionError.ERROR_USER_ALREADY_SUBSCRIBED_TO_FUND
+        )
+        self.assertEqual(await self._capital("user0"), 5000)
+        self.assertEqual(await self._capital("user1"), 25000)
+        self.assertEqual(await self.db.subscriptions.count_documents({}), 3)
+        self.assertEqual(await self.db.transaction_history.count_documents({}), 3)
+        self.assertEqual(await self.db.notification_outbox.count_documents({}), 3)
+        # No bookkeeping left on the users
+        async for user in self.db.users.find({}):
+            self.assertNotIn("pending_debits", user)
+
+    async def test_create_subscriptions_bulk_round_trips_are_constant(self):
+        await create_subscriptions_bulk([
+            Subscription(user_id=f"user{index}", fund_id="fund123", status="active")
+            for index in range(5)
+        ])
+        small = list(self.counter.commands)
+        self.counter.commands.clear()
+
+        response = await create_subscriptions_bulk([
+            Subscription(user_id=f"user{index}", fund_id="fund456", status="active")
+            for index in range(5, 60)
+        ])
+
+        self.assertEqual(response["succeeded"], 55)
+        self.assertEqual(self.counter.commands, small)
+        self.assertEqual(
+            small,
+            ["find", "find", "find", "update", "update", "insert", "insert", "insert"]
+        )
+        self.assertEqual(await self.db.notification_outbox.count_documents({}), 60)
+
+    async def test_debit_of_a_changed_balance_fails_only_that_user(self):
+        # The balance of user1 drops between the read and the debit
+        fetch_by_keys = subscription_service.fetch_by_keys
+
+        async def fetch_then_spend(collection, keys, field="id"):
+            documents = await fetch_by_keys(collection, keys, field)
+            if collection.name == "users":
+                await self.db.users.update_one(
+                    {"id": "user1"}, {"$set": {"investment_capital": 1000}}
+                )
+            return documents
+
+        with patch(
+            'app.services.subscription_service.fetch_by_keys', fetch_then_spend
+        ):
+            response = await create_subscriptions_bulk([
+                Subscription(user_id="user0", fund_id="fund123", status="active"),
+                Subscription(user_id="user1", fund_id="fund123", status="active"),
+            ])
+
+        self.assertEqual(
+            [result["status_code"] for result in response["results"]], [200, 400]
+        )
+        self.assertEqual(await self._capital("user0"), 25000)
+        self.assertEqual(await self._capital("user1"), 1000)
+        self.assertEqual(await self.db.subscriptions.count_documents({}), 1)
+
+    async def test_create_subscriptions_bulk_too_large(self):
+        with patch('app.services.subscription_service.MAX_BULK_SIZE', 2):
+            with self.assertRaises(HTTPException) as context:
+                await create_subscriptions_bulk([
+                    Subscription(user_id="user0", fund_id="fund123", status="active")
+                ] * 3)
+
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(self.counter.commands, [])
+
+    async def test_cancel_subscriptions_bulk(self):
+        created = await create_subscriptions_bulk([
+            Subscription(user_id="user0", fund_id="fund123", status="active"),
+            Subscription(user_id="user0", fund_id="fund456", status="active"),
+            Subscription(user_id="user1", fund_id="fund456", status="active"),
+        ])
+        ids = [result["subscription_id"] for result in created["results"]]
+        await cancel_subscription(ids[2])
+        await self.db.notification_outbox.delete_many({})
+        self.counter.commands.clear()
+
+        response = await cancel_subscriptions_bulk(
+            [ids[0], "missing", ids[1], ids[0], ids[2]]
+        )
+        commands = list(self.counter.commands)
+
+        self.assertEqual(
+            [result["status_code"] for result in response["results"]],
+            [200, 404, 200, 400, 400]
+        )
+        self.assertEqual(await self._capital("user0"), 100000)
+        self.assertEqual(await self._capital("user1"), 100000)
+        self.assertEqual(
+            await self.db.transaction_history.count_documents(
+                {"action": TransactionAction.CANCELLED}
+            ),
+            3
+        )
+        self.assertEqual(
+            commands, ["find", "find", "find", "update", "update", "insert", "insert"]
+        )
+        self.assertEqual(await self.db.notification_outbox.count_documents({}), 2)
+
+    async def test_bulk_routes(self):
+        client = TestClient(app)
+
+        created = client.post("/subscriptions/bulk", json=[
+            {"user_id": "user0", "fund_id": "fund456", "status": "active"}
+        ])
+        subscription_id = created.json()["results"][0]["subscription_id"]
+        cancelled = client.post("/subscriptions/cancel/bulk", json=[subscription_id])
+
+        self.assertEqual(created.status_code, 200)
+        self.assertEqual(cancelled.json()["succeeded"], 1)
+
+
+class TestSubscriptionResponseCache(unittest.IsolatedAsyncioTestCase):
+    """Cached listings and their invalidation by the writes, with the memory
+    backend and the shared backend on the in-process database."""
+
+    async def asyncSetUp(self):
+        self.counter = CommandCounter()
+        self.db = InMemoryAsyncClient(
+            "mongomock://localhost", event_listeners=[self.counter]
+        )["test"]
+        await ensure_indexes(self.db, ["subscriptions", "response_cache"])
+
+    async def _use(self, backend):
+        self.cache = ResponseCache(backend)
+        for patcher in (
+            *[patch(target, new=self.db) for target in DB_TARGETS],
+            patch('app.services.subscription_service.response_cache', new=self.cache),
+            patch('app.services.subscription_service._send_subscription_notification')
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        await self.db.users.insert_many([
+            {"id": f"user{index}", "name": "John Doe", "investment_capital": 100000}
+            for index in range(2)
+        ])
+        await self.db.funds.insert_one(
+            {"id": "fund123", "name": "Fund A", "minimum_investment_amount": 50000}
+        )
+        await create_subscription(
+            Subscription(user_id="user1", fund_id="fund123", status="active")
+        )
+
+    async def _check_listings(self, hit_commands):
+        await list_subscriptions_with_users()
+        await list_subscriptions_by_user("user1")
+        await get_user_transactions("user1")
+        self.counter.commands.clear()
+
+        listing = await list_subscriptions_with_users()
+        by_user = await list_subscriptions_by_user("user1")
+        transactions = await get_user_transactions("user1")
+        commands = list(self.counter.commands)
+
+        self.assertEqual(len(listing), 1)
+        self.assertEqual(listing.next_cursor, None)
+        self.assertEqual(by_user[0]["user"]["name"], "John Doe")
+        self.assertEqual(transactions[0]["fund"]["name"], "Fund A")
+        self.assertEqual(commands, hit_commands)
+
+        # user0 subscribing drops the full listing, not the views of user1
+        await create_subscription(
+            Subscription(user_id="user0", fund_id="fund123", status="active")
+        )
+        self.assertEqual(len(await list_subscriptions_with_users()), 2)
+        before = (await self.cache.stats())["hits"]
+        await list_subscriptions_by_user("user1")
+        self.assertEqual((await self.cache.stats())["hits"], before + 1)
+
+        # user1 cancelling drops the views of user1
+        await cancel_subscription(by_user[0]["id"])
+        transactions = await get_user_transactions("user1")
+        self.assertEqual(len(transactions), 2)
+        by_user = await list_subscriptions_by_user("user1")
+        self.assertEqual(by_user[0]["status"], TransactionAction.CANCELLED)
+
+        stats = await self.cache.stats()
+        self.assertGreater(stats["hit_ratio"], 0)
+        self.assertGreater(stats["bytes"], 0)
+
+    async def test_memory_backend(self):
+        await self._use(MemoryBackend())
+        await self._check_listings(hit_commands=[])
+
+    async def test_shared_backend(self):
+        # One find on the response_cache collection per listing
+        await self._use(MongoBackend(self.db.response_cache))
+        await self._check_listings(hit_commands=["find"] * 3)
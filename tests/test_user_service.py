@@ -8,16 +8,17 @@ from pymongo.errors import PyMongoError
 import pytest
 
 from app.models.user import User
+from tests.mocks import AsyncCursorMock, AsyncDatabaseMock
 from app.services.user_service import create_user, get_all_users
 
 # Add the app directory to the sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 
 
-class TestUserService(unittest.TestCase):
+class TestUserService(unittest.IsolatedAsyncioTestCase):
 
-    @patch('app.services.user_service.db')
-    def test_create_user_success_with_uuid(self, mock_db):
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_create_user_success_with_uuid(self, mock_db):
         user = User(
             name="John Doe",
             email="john@example.com",
@@ -25,16 +26,16 @@ class TestUserService(unittest.TestCase):
         mock_uuid = "123e4567-e89b-12d3-a456-426614174000"
 
         with patch('uuid.uuid4', return_value=uuid.UUID(mock_uuid)):
-            response = create_user(user)
+            response = await create_user(user)
 
         assert response["message"] == "User created successfully"
         assert response["user_id"] == mock_uuid
 
         mock_db.users.count_documents.return_value = 1
-        assert mock_db.users.count_documents({"id": mock_uuid}) == 1
+        assert await mock_db.users.count_documents({"id": mock_uuid}) == 1
 
-    @patch('app.services.user_service.db')
-    def test_create_user_success_with_uuid_and_investment_capital_is_None(
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_create_user_success_with_uuid_and_investment_capital_is_None(
         self,
         mock_db
     ):
@@ -42,16 +43,16 @@ class TestUserService(unittest.TestCase):
         mock_uuid = "123e4567-e89b-12d3-a456-426614174000"
 
         with patch('uuid.uuid4', return_value=uuid.UUID(mock_uuid)):
-            response = create_user(user)
+            response = await create_user(user)
 
         assert response["message"] == "User created successfully"
         assert response["user_id"] == mock_uuid
 
         mock_db.users.count_documents.return_value = 1
-        assert mock_db.users.count_documents({"id": mock_uuid}) == 1
+        assert await mock_db.users.count_documents({"id": mock_uuid}) == 1
 
-    @patch('app.services.user_service.db')
-    def test_create_user_pymongo_error(self, mock_db):
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_create_user_pymongo_error(self, mock_db):
         user = User(
             name="John Doe",
             email="john@example.com",
@@ -60,13 +61,13 @@ class TestUserService(unittest.TestCase):
 
         with patch('uuid.uuid4', side_effect=PyMongoError("Unexpected error")):
             with pytest.raises(HTTPException) as exc_info:
-                create_user(user)
+                await create_user(user)
 
         assert exc_info.value.status_code == 500
         assert "An error occurred while creating the user" in exc_info.value.detail
 
-    @patch('app.services.user_service.db')
-    def test_create_user_unexpected_error(self, mock_db):
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_create_user_unexpected_error(self, mock_db):
         user = User(
             name="John Doe",
             email="john@example.com",
@@ -75,14 +76,14 @@ class TestUserService(unittest.TestCase):
         mock_db.users.insert_one.side_effect = Exception("Unexpected error")
 
         with pytest.raises(HTTPException) as exc_info:
-            create_user(user)
+            await create_user(user)
 
         assert exc_info.value.status_code == 500
         assert "An unexpected error occurred" in exc_info.value.detail
 
-    @patch('app.services.user_service.db')
-    def test_get_all_users_success(self, mock_db):
-        mock_db.users.find.return_value = [
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_get_all_users_success(self, mock_db):
+        mock_db.users.find.return_value = AsyncCursorMock([
             {
                 "id": "1",
                 "name": "User1",
@@ -95,21 +96,21 @@ class TestUserService(unittest.TestCase):
                 "email": "user2@example.com",
                 "investment_capital": 2000.0
             }
-        ]
+        ])
 
-        response = get_all_users()
+        response = await get_all_users()
 
         self.assertEqual(len(response), 2)
         self.assertEqual(response[0]["name"], "User1")
         self.assertEqual(response[1]["name"], "User2")
         mock_db.users.find.assert_called_once()
 
-    @patch('app.services.user_service.db')
-    def test_get_all_users_db_error(self, mock_db):
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_get_all_users_db_error(self, mock_db):
         mock_db.users.find.side_effect = PyMongoError("Database error")
 
         with self.assertRaises(HTTPException) as context:
-            get_all_users()
+            await get_all_users()
 
         self.assertEqual(context.exception.status_code, 500)
         self.assertIn(
@@ -117,12 +118,12 @@ class TestUserService(unittest.TestCase):
             context.exception.detail
         )
 
-    @patch('app.services.user_service.db')
-    def test_get_all_users_unexpected_error(self, mock_db):
+    @patch('app.services.user_service.db', new_callable=AsyncDatabaseMock)
+    async def test_get_all_users_unexpected_error(self, mock_db):
         mock_db.users.find.side_effect = Exception("Unexpected error")
 
         with self.assertRaises(HTTPException) as context:
-            get_all_users()
+            await get_all_users()
 
         self.assertEqual(context.exception.status_code, 500)
         self.assertIn("An unexpected error occurred", context.exception.detail)